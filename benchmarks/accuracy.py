@@ -0,0 +1,315 @@
+"""
+Golden output harness that records reference F0 tracks and NCCF candidate
+lattices of rapt_with_nccf over the sample corpora, then checks how closely
+another engine (e.g. float32, threaded or process parallel NCCF) tracks
+pitch compared to them, and how much faster it is. Run from the repo root,
+e.g.:
+
+    python -m benchmarks.accuracy record --reference-dir golden
+    python -m benchmarks.accuracy compare --reference-dir golden \\
+        --engine float32 --output float32.json
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import timeit
+
+import numpy
+
+from benchmarks import benchmark
+from pyrapt import pyrapt
+
+
+# RAPT params of the engines that can be compared by name:
+ENGINES = collections.OrderedDict([
+    ('default', {}),
+    ('reference', {'is_vectorized_nccf': False}),
+    ('float32', {'dtype': 'float32'}),
+    ('threads', {'threads': 2}),
+    ('workers', {'workers': 2})])
+
+# default limits an engine has to stay within to pass the comparison:
+TOLERANCES = collections.OrderedDict([
+    # share of frames w/ the same voicing decision as the reference:
+    ('min_voicing_agreement', 0.98),
+    # share of frames voiced in both w/ F0 more than 20% off the reference:
+    ('max_gross_error_rate', 0.01),
+    # mean error in cents of the frames voiced in both w/o a gross error:
+    ('max_fine_error_cents', 5.0),
+    # share of reference NCCF candidates w/ a candidate within a lag of it:
+    ('min_candidate_recall', 0.95),
+    # frames the engine's results have more or fewer of (over all files):
+    ('max_frame_count_diff', 0)])
+
+# F0 ratio past which a frame counts as a gross pitch error:
+GROSS_ERROR_RATIO = 0.2
+
+# name of the file w/ details of a recorded reference run:
+REFERENCE_INFO = 'reference.json'
+
+
+def record_references(paths, reference_dir, engine='default', repeat=1,
+                      **kwargs):
+    """
+    Runs rapt_with_nccf w/ the engine's params (and kwargs) on each wav file
+    in paths, saving its F0 estimates, final NCCF candidates and run time
+    under reference_dir. Returns details of the run, which are saved along
+    w/ them.
+    """
+    params = dict(ENGINES[engine], **kwargs)
+    for path in paths:
+        f0, lattice, seconds = _run_engine(path, params, repeat)
+        reference_path = _get_reference_path(reference_dir, path)
+        if not os.path.isdir(os.path.dirname(reference_path)):
+            os.makedirs(os.path.dirname(reference_path))
+        numpy.savez_compressed(reference_path, f0=f0, seconds=seconds,
+                               **lattice)
+    info = benchmark._get_run_info(repeat, params)
+    info['engine'] = engine
+    info['paths'] = paths
+    with open(os.path.join(reference_dir, REFERENCE_INFO), 'w') as output:
+        json.dump(info, output, indent=2, separators=(',', ': '))
+    return info
+
+
+def compare_engine(reference_dir, paths=None, engine='default', repeat=1,
+                   tolerances=None, **kwargs):
+    """
+    Runs rapt_with_nccf w/ the engine's params (and kwargs) on each wav file
+    w/ a reference in reference_dir (or just the given paths) and compares
+    the results to the references: voicing agreement, gross pitch error
+    rate, fine pitch error in cents & NCCF candidate recall, along w/ the
+    speedup over the reference run time. Returns a dict w/ the metrics per
+    file & overall, and whether they're within tolerances (TOLERANCES by
+    default).
+    """
+    with open(os.path.join(reference_dir, REFERENCE_INFO)) as info_file:
+        reference_info = json.load(info_file)
+    if paths is None:
+        paths = reference_info['paths']
+    if not paths:
+        raise ValueError('No wav files to compare.')
+    tolerances = dict(TOLERANCES, **(tolerances or {}))
+    params = dict(ENGINES[engine], **kwargs)
+    files = []
+    for path in paths:
+        reference = numpy.load(_get_reference_path(reference_dir, path))
+        f0, lattice, seconds = _run_engine(path, params, repeat)
+        counts = _get_accuracy_counts(reference, f0, lattice)
+        counts['reference_seconds'] = float(reference['seconds'])
+        counts['seconds'] = seconds
+        file_results = collections.OrderedDict([('path', path)])
+        file_results.update(_get_metrics(counts))
+        file_results['counts'] = counts
+        files.append(file_results)
+    total_counts = collections.OrderedDict()
+    for name in files[0]['counts']:
+        # _max counts are the largest over the files, the rest add up:
+        combine = max if name.endswith('_max') else sum
+        total_counts[name] = combine(item['counts'][name] for item in files)
+    summary = _get_metrics(total_counts)
+    failures = _get_failures(summary, tolerances)
+    run = benchmark._get_run_info(repeat, params)
+    run['engine'] = engine
+    return collections.OrderedDict([
+        ('run', run), ('reference', reference_info),
+        ('tolerances', tolerances), ('is_passed', not failures),
+        ('failures', failures), ('summary', summary), ('files', files)])
+
+
+def _run_engine(path, params, repeat):
+    # Returns (F0 estimates, NCCF lattice arrays, fastest run time) of
+    # rapt_with_nccf w/ the params on the file:
+    seconds = []
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        nccf_results, f0 = pyrapt.rapt_with_nccf(path, **params)
+        seconds.append(timeit.default_timer() - start)
+    return (numpy.array(f0, dtype=float),
+            _get_lattice_arrays(nccf_results[0]), min(seconds))
+
+
+def _get_lattice_arrays(candidates):
+    """
+    Packs the final NCCF candidates per frame into frames x candidates
+    arrays of lags & correlations, plus the number of candidates per frame.
+    The unvoiced candidate the DP adds to each frame is left out.
+    """
+    lattice = pyrapt._get_lattice(candidates)
+    return {'lattice_counts': lattice.counts, 'lattice_lags': lattice.lags,
+            'lattice_correlations': lattice.correlations}
+
+
+def _get_accuracy_counts(reference, f0, lattice):
+    """
+    Returns the frame & candidate counts the accuracy metrics are worked
+    out from, so they can be summed over files before taking ratios.
+    """
+    reference_f0 = reference['f0']
+    frame_count = min(len(reference_f0), len(f0))
+    reference_f0 = reference_f0[:frame_count]
+    test_f0 = f0[:frame_count]
+    is_reference_voiced = reference_f0 > 0.0
+    is_test_voiced = test_f0 > 0.0
+    is_both_voiced = is_reference_voiced & is_test_voiced
+    ratios = test_f0[is_both_voiced] / reference_f0[is_both_voiced]
+    is_gross_error = numpy.abs(ratios - 1.0) > GROSS_ERROR_RATIO
+    cents = numpy.abs(1200.0 * numpy.log2(ratios[~is_gross_error]))
+    matched_count, candidate_count, correlation_diff = _get_lattice_counts(
+        reference, lattice, frame_count)
+    return collections.OrderedDict([
+        ('frames', frame_count),
+        ('frame_count_diff', abs(len(reference['f0']) - len(f0))),
+        ('voicing_agreed', int(numpy.sum(is_reference_voiced ==
+                                         is_test_voiced))),
+        ('both_voiced', len(ratios)),
+        ('gross_errors', int(numpy.sum(is_gross_error))),
+        ('fine_error_cents_total', float(numpy.sum(cents))),
+        ('fine_error_cents_max', float(numpy.max(cents)) if len(cents)
+         else 0.0),
+        ('reference_candidates', candidate_count),
+        ('matched_candidates', matched_count),
+        ('correlation_diff_max', correlation_diff)])
+
+
+def _get_lattice_counts(reference, lattice, frame_count):
+    # Returns (reference candidates w/ a test candidate within a lag, all
+    # reference candidates, biggest correlation diff between candidates at
+    # the same lag) over the first frame_count frames:
+    matched_count = 0
+    candidate_count = 0
+    correlation_diff = 0.0
+    for frame_idx in xrange(frame_count):
+        reference_count = reference['lattice_counts'][frame_idx]
+        test_count = lattice['lattice_counts'][frame_idx]
+        reference_lags = reference['lattice_lags'][frame_idx,
+                                                   :reference_count]
+        test_lags = lattice['lattice_lags'][frame_idx, :test_count]
+        candidate_count += reference_count
+        if reference_count == 0 or test_count == 0:
+            continue
+        lag_diffs = numpy.abs(reference_lags[:, numpy.newaxis] -
+                              test_lags[numpy.newaxis, :])
+        matched_count += int(numpy.sum(numpy.min(lag_diffs, axis=1) <= 1))
+        reference_idx, test_idx = numpy.nonzero(lag_diffs == 0)
+        if len(reference_idx):
+            correlation_diff = max(correlation_diff, float(numpy.max(
+                numpy.abs(reference['lattice_correlations'][
+                    frame_idx, reference_idx] -
+                    lattice['lattice_correlations'][frame_idx, test_idx]))))
+    return (matched_count, int(candidate_count), correlation_diff)
+
+
+def _get_metrics(counts):
+    return collections.OrderedDict([
+        ('voicing_agreement', _get_ratio(counts['voicing_agreed'],
+                                         counts['frames'])),
+        ('gross_error_rate', _get_ratio(counts['gross_errors'],
+                                        counts['both_voiced'], 0.0)),
+        ('fine_error_cents', _get_ratio(counts['fine_error_cents_total'],
+                                        counts['both_voiced'] -
+                                        counts['gross_errors'], 0.0)),
+        ('fine_error_cents_max', counts['fine_error_cents_max']),
+        ('candidate_recall', _get_ratio(counts['matched_candidates'],
+                                        counts['reference_candidates'])),
+        ('correlation_diff_max', counts['correlation_diff_max']),
+        ('frame_count_diff', counts['frame_count_diff']),
+        ('speedup', _get_ratio(counts['reference_seconds'],
+                               counts['seconds']))])
+
+
+def _get_ratio(numerator, denominator, default=1.0):
+    if not denominator:
+        return default
+    return float(numerator) / denominator
+
+
+def _get_failures(metrics, tolerances):
+    # names of the tolerances the metrics are outside of
+    failures = []
+    for name, limit in tolerances.items():
+        metric = metrics[name[len('min_'):]]
+        if ((name.startswith('min_') and metric < limit) or
+                (name.startswith('max_') and metric > limit)):
+            failures.append(name)
+    return failures
+
+
+def _get_reference_path(reference_dir, path):
+    # references mirror the wav file paths (relative to the current dir)
+    relative_path = os.path.normpath(os.path.relpath(path))
+    if relative_path.startswith(os.pardir):
+        relative_path = os.path.abspath(path).lstrip(os.sep)
+    return os.path.join(reference_dir, relative_path + '.npz')
+
+
+def _print_results(results):
+    summary = results['summary']
+    print('%s engine vs %s reference, %d files:' % (
+        results['run']['engine'], results['reference']['engine'],
+        len(results['files'])))
+    print('voicing agreement %.4f, gross error rate %.4f, fine error %.2f '
+          'cents (max %.2f)' % (summary['voicing_agreement'],
+                                summary['gross_error_rate'],
+                                summary['fine_error_cents'],
+                                summary['fine_error_cents_max']))
+    print('candidate recall %.4f, max correlation diff %.2e, speedup %.2fx'
+          % (summary['candidate_recall'], summary['correlation_diff_max'],
+             summary['speedup']))
+    if results['is_passed']:
+        print('PASSED')
+    else:
+        print('FAILED: %s' % ', '.join(results['failures']))
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description='Records reference rapt results or compares an engine '
+        'to them')
+    parser.add_argument('action', choices=['record', 'compare'])
+    parser.add_argument('corpora', nargs='*',
+                        help='directories of wav files (default for record: '
+                        '%s, for compare: every recorded file)' %
+                        ' '.join(benchmark.CORPORA))
+    parser.add_argument('--reference-dir', default='golden',
+                        help='directory of the references (default: '
+                        '%(default)s)')
+    parser.add_argument('--engine', default='default', choices=ENGINES.keys(),
+                        help='RAPT params to run w/ (default: %(default)s)')
+    parser.add_argument('--params', default='{}',
+                        help='JSON object of more RAPT params to run w/')
+    parser.add_argument('--tolerances', default='{}',
+                        help='JSON object of tolerances to use in place of '
+                        'the defaults, e.g. {"max_gross_error_rate": 0.02}')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per file, keeping the fastest time '
+                        '(default: %(default)s)')
+    parser.add_argument('--output',
+                        help='JSON file to write the comparison to')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _get_args()
+    params = json.loads(args.params)
+    if args.action == 'record':
+        paths = benchmark.get_wav_paths(args.corpora or benchmark.CORPORA)
+        record_references(paths, args.reference_dir, args.engine,
+                          args.repeat, **params)
+        print('Recorded references for %d files in %s' %
+              (len(paths), args.reference_dir))
+        sys.exit()
+    paths = None
+    if args.corpora:
+        paths = benchmark.get_wav_paths(args.corpora)
+    results = compare_engine(args.reference_dir, paths, args.engine,
+                             args.repeat, json.loads(args.tolerances),
+                             **params)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, separators=(',', ': '))
+    _print_results(results)
+    sys.exit(0 if results['is_passed'] else 1)
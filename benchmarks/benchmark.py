@@ -0,0 +1,232 @@
+"""
+Benchmark suite that times each stage of rapt over the bundled sample
+corpora and writes the timings to a JSON file, so runs on different commits
+can be compared. Run from the repo root, e.g.:
+
+    python -m benchmarks.benchmark --output before.json
+    python -m benchmarks.benchmark --output after.json --baseline before.json
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy
+import scipy
+
+from pyrapt import pyrapt
+from pyrapt import raptstats
+from pyrapt.version import version
+
+
+# directories benchmarked by default, relative to the repo root:
+CORPORA = ('newsamples', 'selectedexamples', 'sinosplice_samples')
+
+# stages of rapt timed separately (see raptstats), in the order they run.
+# setup is the sample rate dependent setup (RaptPlan) & per recording
+# params (RMS):
+STAGES = ('load', 'setup', 'downsample', 'first_pass', 'second_pass', 'dp')
+
+PERCENTILES = (50, 90, 99)
+
+
+def run_benchmark(paths, repeat=1, **kwargs):
+    """
+    Times each stage of rapt on each wav file in paths, repeat times per
+    file (the fastest time of each stage is kept), w/ kwargs as the RAPT
+    params. The threads param isn't supported, since threaded NCCF runs
+    the two passes at once. Returns a dict w/ the timings & work counters
+    per file, a summary per stage and overall, and details of the run.
+    """
+    if kwargs.get('threads', 1) > 1:
+        raise ValueError('Stages can only be timed w/o NCCF threads.')
+    files = []
+    for path in paths:
+        runs = [_time_stages(path, kwargs) for i in xrange(repeat)]
+        files.append(_get_file_results(path, runs))
+    return collections.OrderedDict([
+        ('run', _get_run_info(repeat, kwargs)),
+        ('summary', _get_summary(files)),
+        ('stages', _get_stage_summary(files)), ('files', files)])
+
+
+def get_wav_paths(directories):
+    """
+    Returns the paths of the wav files in directories & their subdirectories
+    (or of the files themselves, if given), sorted so each run goes thru them
+    in the same order.
+    """
+    paths = []
+    for directory in directories:
+        if os.path.isfile(directory):
+            paths.append(directory)
+        for root, dirs, filenames in os.walk(directory):
+            paths.extend(os.path.join(root, filename)
+                         for filename in filenames
+                         if filename.lower().endswith('.wav'))
+    return sorted(paths)
+
+
+def _time_stages(path, kwargs):
+    # Returns (sample rate, sample count, frames, RaptStats) for a run of
+    # rapt on the file:
+    stats = raptstats.RaptStats()
+    frame_count = len(pyrapt.rapt(path, stats=stats, **kwargs))
+    sample_rate, audio_sample = pyrapt._read_audio(path)
+    return (sample_rate, len(audio_sample), frame_count, stats)
+
+
+def _get_file_results(path, runs):
+    sample_rate, sample_count, frame_count = runs[0][:3]
+    seconds = collections.OrderedDict(
+        (stage, min(run[3].timings.get(stage, 0.0) for run in runs))
+        for stage in STAGES)
+    total = sum(seconds.values())
+    duration = float(sample_count) / sample_rate
+    return collections.OrderedDict([
+        ('path', path), ('sample_rate', sample_rate),
+        ('duration', duration), ('frames', frame_count),
+        ('seconds', seconds), ('total', total),
+        ('frames_per_sec', frame_count / total),
+        ('real_time_factor', total / duration),
+        ('counters', runs[0][3].counters)])
+
+
+def _get_stage_summary(files):
+    # per stage: total seconds over all files, its share of the total time,
+    # frames/sec thru the stage & percentiles of the seconds per file
+    total = sum(item['total'] for item in files)
+    frame_count = sum(item['frames'] for item in files)
+    summary = collections.OrderedDict()
+    for stage in STAGES:
+        per_file = [item['seconds'][stage] for item in files]
+        seconds = sum(per_file)
+        stage_summary = collections.OrderedDict([
+            ('seconds', seconds), ('share', seconds / total),
+            ('frames_per_sec', frame_count / seconds if seconds else None)])
+        stage_summary.update(_get_percentiles('seconds', per_file))
+        summary[stage] = stage_summary
+    return summary
+
+
+def _get_summary(files):
+    total = sum(item['total'] for item in files)
+    duration = sum(item['duration'] for item in files)
+    frame_count = sum(item['frames'] for item in files)
+    summary = collections.OrderedDict([
+        ('files', len(files)), ('duration', duration),
+        ('frames', frame_count), ('seconds', total),
+        ('frames_per_sec', frame_count / total),
+        ('real_time_factor', total / duration)])
+    summary.update(_get_percentiles('seconds',
+                                    [item['total'] for item in files]))
+    summary.update(_get_percentiles('real_time_factor',
+                                    [item['real_time_factor']
+                                     for item in files]))
+    # work counters of rapt (see raptstats) summed over the files:
+    counters = collections.OrderedDict()
+    for item in files:
+        for counter, value in item['counters'].items():
+            counters[counter] = counters.get(counter, 0) + value
+    summary['counters'] = counters
+    return summary
+
+
+def _get_percentiles(name, values):
+    return [('%s_p%d' % (name, percentile),
+             float(numpy.percentile(values, percentile)))
+            for percentile in PERCENTILES]
+
+
+def _get_run_info(repeat, kwargs):
+    return collections.OrderedDict([
+        ('commit', _get_commit()), ('version', version.number),
+        ('date', datetime.datetime.utcnow().isoformat()),
+        ('python', platform.python_version()),
+        ('numpy', numpy.__version__), ('scipy', scipy.__version__),
+        ('machine', platform.platform()), ('repeat', repeat),
+        ('params', kwargs)])
+
+
+def _get_commit():
+    # git commit of the benchmarked tree, None outside of a git checkout
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                           stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results, baseline=None):
+    print('%-12s %10s %7s %12s %10s %10s' %
+          ('stage', 'seconds', 'share', 'frames/sec', 'p50 (ms)', 'p99 (ms)'))
+    for stage, summary in results['stages'].items():
+        print('%-12s %10.3f %6.1f%% %12s %10.2f %10.2f%s' % (
+            stage, summary['seconds'], 100.0 * summary['share'],
+            '%.0f' % summary['frames_per_sec']
+            if summary['frames_per_sec'] else '-',
+            1000.0 * summary['seconds_p50'], 1000.0 * summary['seconds_p99'],
+            _get_speedup(summary['seconds'], baseline, stage)))
+    summary = results['summary']
+    print('%d files, %.1f seconds of audio, %d frames in %.3f seconds%s' % (
+        summary['files'], summary['duration'], summary['frames'],
+        summary['seconds'], _get_speedup(summary['seconds'], baseline)))
+    print('%.0f frames/sec, real-time factor %.4f (p50 %.4f, p99 %.4f)' % (
+        summary['frames_per_sec'], summary['real_time_factor'],
+        summary['real_time_factor_p50'], summary['real_time_factor_p99']))
+
+
+def _get_speedup(seconds, baseline, stage=None):
+    # speedup vs the same stage (or the whole run) in a baseline run
+    if baseline is None:
+        return ''
+    if stage is None:
+        baseline_seconds = baseline['summary']['seconds']
+    else:
+        baseline_seconds = baseline['stages'].get(stage, {}).get('seconds')
+    if not baseline_seconds or not seconds:
+        return ''
+    return ' (%.2fx vs baseline)' % (baseline_seconds / seconds)
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description='Times each stage of rapt over sample recordings')
+    parser.add_argument('corpora', nargs='*', default=list(CORPORA),
+                        help='directories of wav files to benchmark '
+                        '(default: %s)' % ' '.join(CORPORA))
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON file to write the results to '
+                        '(default: %(default)s)')
+    parser.add_argument('--baseline',
+                        help='JSON results of an earlier run to compare to')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per file, keeping the fastest time of '
+                        'each stage (default: %(default)s)')
+    parser.add_argument('--max-files', type=int, default=None,
+                        help='only benchmark the first this many files')
+    parser.add_argument('--dtype', default='float64',
+                        help='float type for NCCF (default: %(default)s)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _get_args()
+    paths = get_wav_paths(args.corpora)[:args.max_files]
+    if not paths:
+        sys.exit('No wav files found in %s' % ', '.join(args.corpora))
+    results = run_benchmark(paths, args.repeat, dtype=args.dtype)
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2, separators=(',', ': '))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    _print_results(results, baseline)
+    print('Results written to %s' % args.output)
@@ -0,0 +1,59 @@
+"""
+Simple object that stores the NCCF candidates of each frame in arrays.
+"""
+
+
+class CandidateLattice:
+    """
+    Simple object that stores the (lag, correlation) candidates NCCF marks
+    for each frame in frames x candidates arrays, w/ the number of
+    candidates of each frame in counts. A frame's candidates are in order of
+    increasing lag, and the entries past its count are 0. The unvoiced
+    candidate the DP adds to every frame is not stored. Lattices are not
+    modified once built (their arrays are read only), so they can be cached
+    and shared.
+
+    Indexing a lattice (or iterating over it) gives each frame's candidates
+    as a list of (lag, correlation) tuples, like the NCCF results used to be.
+    """
+
+    def __init__(self, lags, correlations, counts, first_frame=0):
+        # frames x candidates arrays of the lags & correlations:
+        self.lags = lags
+        self.correlations = correlations
+
+        # number of candidates per frame:
+        self.counts = counts
+
+        # frame the first row is for, for lattices of a block of frames
+        # (e.g. the frames of one thread's share of NCCF):
+        self.first_frame = first_frame
+
+        for values in (lags, correlations, counts):
+            values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, frame_idx):
+        count = self.counts[frame_idx]
+        return zip(self.lags[frame_idx, :count].tolist(),
+                   self.correlations[frame_idx, :count].tolist())
+
+    def __iter__(self):
+        return (self[frame_idx] for frame_idx in xrange(len(self)))
+
+    def get_frames(self, first, last, first_frame=None):
+        """
+        Returns a lattice of rows [first, last) of this one (w/o copying
+        them), for frames starting at first_frame (by default where the rows
+        are in this lattice's frames).
+        """
+        if first_frame is None:
+            first_frame = self.first_frame + first
+        return CandidateLattice(self.lags[first:last],
+                                self.correlations[first:last],
+                                self.counts[first:last], first_frame)
+
+    def tolist(self):
+        return list(self)
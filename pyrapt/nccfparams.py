@@ -22,3 +22,6 @@ class Nccfparams:
 
         # Value of "M-1" in NCCF equation
         self.max_frame_count = None
+
+        # prefix sums over the audio used to look up window sums/energies
+        self.energy_index = None
@@ -0,0 +1,140 @@
+"""
+Simple object that stores the F0 estimates of rapt in arrays, w/ a compact
+binary format to save them in.
+"""
+
+import struct
+
+import numpy
+
+# binary format: a header w/ the magic bytes, format version, flags, frame
+# count, time of the first frame & frame step (padded to 32 bytes so the
+# arrays after it stay aligned), then the little-endian float64 F0 of each
+# frame, followed by their correlations if the track has them
+_MAGIC = 'PTRK'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHIdd4x')
+_HAS_CORRELATIONS = 1
+_DTYPE = numpy.dtype('<f8')
+
+
+class PitchTrack:
+    """
+    Simple object that stores the F0 estimate of each frame (0.0 for
+    unvoiced frames) in a contiguous float64 array, along w/ arrays of the
+    voicing decision & time in seconds (from the start of the audio) of
+    each frame, and optionally the correlation of the NCCF candidate the
+    DP chose for it. Tracks are not modified once built (their arrays are
+    read only).
+
+    tolist() gives the F0 estimates as the list rapt returns, tobytes() &
+    save() write the binary format frombytes() & load() read back, and
+    get_buffers() exports that format w/o copying the arrays.
+    """
+
+    def __init__(self, f0, first_time=0.0, frame_step=0.01,
+                 correlations=None):
+        # F0 estimate per frame, in Hz:
+        self.f0 = numpy.ascontiguousarray(f0, dtype=_DTYPE)
+
+        # whether each frame is voiced (has an F0 estimate):
+        self.voicing = self.f0 > 0.0
+
+        # start of each frame, in seconds, and the step between frames:
+        self.first_time = float(first_time)
+        self.frame_step = float(frame_step)
+        self.times = (self.first_time +
+                      numpy.arange(len(self.f0)) * self.frame_step)
+
+        # correlation of the chosen candidate per frame (0.0 if unvoiced),
+        # or None if the track doesn't have them:
+        self.correlations = correlations
+        if correlations is not None:
+            self.correlations = numpy.ascontiguousarray(correlations,
+                                                        dtype=_DTYPE)
+            if len(self.correlations) != len(self.f0):
+                raise ValueError('A pitch track needs a correlation per '
+                                 'frame.')
+
+        for values in (self.f0, self.voicing, self.times, self.correlations):
+            if values is not None:
+                values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.f0)
+
+    def tolist(self):
+        return self.f0.tolist()
+
+    def get_buffers(self):
+        """
+        Returns the binary format of the track as a list of the header bytes
+        and memoryviews of its arrays, which can be written out in turn w/o
+        copying the arrays into one string first.
+        """
+        flags = 0
+        arrays = [self.f0]
+        if self.correlations is not None:
+            flags |= _HAS_CORRELATIONS
+            arrays.append(self.correlations)
+        header = _HEADER.pack(_MAGIC, _VERSION, flags, len(self.f0),
+                              self.first_time, self.frame_step)
+        return [header] + [memoryview(values) for values in arrays]
+
+    def tobytes(self):
+        return ''.join(str(bytearray(data)) for data in self.get_buffers())
+
+    def save(self, path):
+        with open(path, 'wb') as track_file:
+            for data in self.get_buffers():
+                track_file.write(data)
+
+
+def frombytes(data):
+    """
+    Reads a track from its binary format (see PitchTrack.tobytes) in a
+    str, bytearray, buffer or memoryview. The arrays of the track are views
+    of the data rather than copies.
+    """
+    if isinstance(data, memoryview):
+        data_bytes = numpy.asarray(data).view(numpy.uint8).reshape(-1)
+    else:
+        data_bytes = numpy.frombuffer(data, dtype=numpy.uint8)
+    frame_count, first_time, frame_step, row_count = _read_header(
+        data_bytes[:_HEADER.size].tostring())
+    rows_end = _HEADER.size + row_count * frame_count * _DTYPE.itemsize
+    if len(data_bytes) < rows_end:
+        raise ValueError('Pitch track data is truncated.')
+    rows = data_bytes[_HEADER.size:rows_end].view(_DTYPE)
+    rows = rows.reshape(row_count, frame_count)
+    return _get_pitch_track(rows, first_time, frame_step)
+
+
+def load(path):
+    # reads a track saved by PitchTrack.save
+    with open(path, 'rb') as track_file:
+        frame_count, first_time, frame_step, row_count = _read_header(
+            track_file.read(_HEADER.size))
+        rows = numpy.fromfile(track_file, dtype=_DTYPE,
+                              count=row_count * frame_count)
+    if len(rows) < row_count * frame_count:
+        raise ValueError('Pitch track file is truncated.')
+    rows = rows.reshape(row_count, frame_count)
+    return _get_pitch_track(rows, first_time, frame_step)
+
+
+def _read_header(header):
+    # (frame count, first time, frame step, number of arrays) of a header
+    if len(header) < _HEADER.size or header[:4] != _MAGIC:
+        raise ValueError('Data is not a pitch track.')
+    magic, version, flags, frame_count, first_time, frame_step = (
+        _HEADER.unpack(header))
+    if version != _VERSION:
+        raise ValueError('Unsupported pitch track version: %d.' % version)
+    row_count = 2 if flags & _HAS_CORRELATIONS else 1
+    return (frame_count, first_time, frame_step, row_count)
+
+
+def _get_pitch_track(rows, first_time, frame_step):
+    correlations = rows[1] if len(rows) > 1 else None
+    return PitchTrack(rows[0], first_time, frame_step, correlations)
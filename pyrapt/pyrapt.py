@@ -3,51 +3,43 @@ This module encapsulates the rapt function, which runs a pitch tracker
 based on David Talkin's Robust Algorithm for Pitch Tracking (RAPT).
 """
 
+import collections
+import copy
+import ctypes
 import math
+import multiprocessing
 import numpy
+import struct
+import threading
+from multiprocessing.pool import ThreadPool
+from numpy.lib.stride_tricks import as_strided
+from scipy import fftpack
 from scipy import signal
 from scipy.io import wavfile
 
+import candidatelattice
+import pitchtrack
 import raptparams
 import nccfparams
+import raptplan
 
 
 def rapt(wavfile_path, **kwargs):
     """
     F0 estimator inspired by RAPT algorithm to determine vocal
-    pitch of an audio sample.
+    pitch of an audio sample. Besides a wav file path, the audio can be a
+    (sample rate, samples) tuple w/ a numpy array or raw 16 bit PCM bytes,
+    a file object, or the contents of a wav file in a bytearray, buffer or
+    memoryview (a str is always taken as a path).
     """
     # Process optional keyword args and build out rapt params
     param = _setup_rapt_params(kwargs)
 
     # TODO: Flesh out docstring, describe args, expected vals in kwargs
-    original_audio = _get_audio_data(wavfile_path)
-
-    if param.is_two_pass_nccf:
-        # downsample audio and run nccf on that first
-        downsampled_audio = _get_downsampled_audio(original_audio,
-                                                   param.maximum_allowed_freq,
-                                                   param.is_run_filter)
-        # calculate parameters for RAPT with input audio
-        _calculate_params(param, original_audio, downsampled_audio)
-        # get f0 candidates using nccf
-        nccf_results = _run_nccf(original_audio, param, downsampled_audio)
-    else:
-        _calculate_params(param, original_audio)
-        nccf_results = _run_nccf(original_audio, param)
-
-    # Dynamic programming - determine voicing state at each period candidate
-    freq_estimate = _get_freq_estimate(nccf_results[0], param,
-                                       original_audio[0])
-
-    # TODO: this is mainly for demo / niceness - don't keep this forever
-    # filter out high freq points
-    for i, item in enumerate(freq_estimate):
-        if item > 500.0:
-            freq_estimate[i] = 0.0
+    original_audio = _get_input(wavfile_path, param)
 
-    # return output of nccf for now
-    return freq_estimate
+    freq_estimate = _run_rapt(original_audio, param)[1]
+    return _get_region_results(freq_estimate, param)
 
 
 def rapt_with_nccf(wavfile_path, **kwargs):
@@ -59,31 +51,166 @@ def rapt_with_nccf(wavfile_path, **kwargs):
     param = _setup_rapt_params(kwargs)
 
     # TODO: Flesh out docstring, describe args, expected vals in kwargs
-    original_audio = _get_audio_data(wavfile_path)
+    original_audio = _get_input(wavfile_path, param)
+
+    nccf_results, freq_estimate = _run_rapt(original_audio, param)
+    # candidates as lists of (lag, correlation) tuples per frame, w/ the
+    # unvoiced candidate the DP scored at the end of each final one:
+    final_candidates = [frame + [(0, 0.0)] for frame in
+                        _get_lattice(nccf_results[0]).tolist()]
+    first_pass = nccf_results[1]
+    if first_pass is not None:
+        first_pass = _get_lattice(first_pass).tolist()
+    nccf_results = (_get_region_results(final_candidates, param),
+                    _get_region_results(first_pass, param))
+    return (nccf_results, _get_region_results(freq_estimate, param))
+
+
+def rapt_track(wavfile_path, **kwargs):
+    """
+    Same as rapt, but returns the F0 estimates as a PitchTrack w/ arrays of
+    the F0, voicing decision, start time & chosen candidate's correlation
+    of each frame (see pitchtrack). Its tolist() is the list rapt returns.
+    """
+    param = _setup_rapt_params(kwargs)
+    original_audio = _get_input(wavfile_path, param)
+    sample_rate = original_audio[0]
+
+    nccf_results = _run_rapt_nccf(original_audio, param)
+    _start_stage(param, 'dp')
+    lattice = _get_lattice(nccf_results[0])
+    candidates = _determine_state_per_frame(lattice, param, sample_rate)
+    freq_estimate = _get_candidate_freqs(candidates, sample_rate)
+    _remove_high_freq_estimates(freq_estimate)
+    correlations = _get_chosen_correlations(lattice, candidates,
+                                            freq_estimate)
+    _stop_stage(param, 'dp')
+
+    first_sample = param.region_start or 0
+    return pitchtrack.PitchTrack(
+        _get_region_results(freq_estimate, param),
+        first_sample / float(sample_rate),
+        param.samples_per_frame / float(sample_rate),
+        _get_region_results(correlations, param))
+
+
+def rapt_sweep(wavfile_path, dp_configs, **kwargs):
+    """
+    Runs rapt w/ several configurations of the parameters that only affect
+    the dynamic programming step (voicing_bias, doubling_cost, lag_weight,
+    freq_weight, transition_cost, amp_mod_transition_cost and
+    spec_mod_transition_cost). dp_configs is a list of dicts of those
+    params, and kwargs are the rest of the RAPT params, shared by every
+    configuration. Downsampling & NCCF run once, and the DP runs for all of
+    the configurations in one pass over the frames. Returns a list w/ the
+    F0 estimates of each configuration.
+    """
+    param = _setup_rapt_params(kwargs)
+    _check_dp_configs(dp_configs)
+    original_audio = _get_input(wavfile_path, param)
+
+    nccf_results = _run_rapt_nccf(original_audio, param)
+    sweep_param = _get_sweep_params(param, dp_configs)
+    _start_stage(param, 'dp')
+    freq_estimates = _get_freq_estimates(nccf_results[0], sweep_param,
+                                         original_audio[0], len(dp_configs))
+    for freq_estimate in freq_estimates:
+        _remove_high_freq_estimates(freq_estimate)
+    _stop_stage(param, 'dp')
+    return [_get_region_results(freq_estimate, param)
+            for freq_estimate in freq_estimates]
+
+
+def _run_rapt(original_audio, param):
+    """
+    Runs NCCF and the DP on the audio, returning a tuple of the NCCF
+    results and the F0 estimates.
+    """
+    nccf_results = _run_rapt_nccf(original_audio, param)
+
+    # Dynamic programming - determine voicing state at each period candidate
+    _start_stage(param, 'dp')
+    freq_estimate = _get_freq_estimate(nccf_results[0], param,
+                                       original_audio[0])
+    _remove_high_freq_estimates(freq_estimate)
+    _stop_stage(param, 'dp')
+
+    return (nccf_results, freq_estimate)
+
+
+def _run_rapt_nccf(original_audio, param):
+    # sample rate dependent setup, shared w/ other calls at the same rate:
+    _start_stage(param, 'setup')
+    param.plan = _get_rapt_plan(original_audio[0], param)
+    _stop_stage(param, 'setup')
 
     if param.is_two_pass_nccf:
+        # downsample audio and run nccf on that first
+        _start_stage(param, 'downsample')
         downsampled_audio = _get_downsampled_audio(original_audio,
                                                    param.maximum_allowed_freq,
-                                                   param.is_run_filter)
+                                                   param.is_run_filter,
+                                                   param.dtype, param.plan)
+        _stop_stage(param, 'downsample')
         # calculate parameters for RAPT with input audio
+        _start_stage(param, 'setup')
         _calculate_params(param, original_audio, downsampled_audio)
+        _stop_stage(param, 'setup')
         # get f0 candidates using nccf
-        nccf_results = _run_nccf(original_audio, param, downsampled_audio)
-    else:
-        _calculate_params(param, original_audio)
-        nccf_results = _run_nccf(original_audio, param)
+        return _run_nccf(original_audio, param, downsampled_audio)
+    _start_stage(param, 'setup')
+    _calculate_params(param, original_audio)
+    _stop_stage(param, 'setup')
+    return _run_nccf(original_audio, param)
 
-    # Dynamic programming - determine voicing state at each period candidate
-    freq_estimate = _get_freq_estimate(nccf_results[0], param,
-                                       original_audio[0])
+
+def _start_stage(param, stage):
+    # stage timings for the params' RaptStats, if there is one
+    if param.stats is not None:
+        param.stats.start(stage)
+
+
+def _stop_stage(param, stage):
+    if param.stats is not None:
+        param.stats.stop(stage)
+
+
+def _remove_high_freq_estimates(freq_estimate):
     # TODO: this is mainly for demo / niceness - don't keep this forever
     # filter out high freq points
     for i, item in enumerate(freq_estimate):
         if item > 500.0:
             freq_estimate[i] = 0.0
 
-    # return output of nccf for now
-    return (nccf_results, freq_estimate)
+
+# params that only affect the DP, so they can vary w/ the same NCCF results
+_DP_PARAM_NAMES = ('voicing_bias', 'doubling_cost', 'lag_weight',
+                   'freq_weight', 'transition_cost', 'amp_mod_transition_cost',
+                   'spec_mod_transition_cost')
+
+
+def _check_dp_configs(dp_configs):
+    for dp_config in dp_configs:
+        for name in dp_config:
+            if name not in _DP_PARAM_NAMES:
+                raise ValueError('%s is not a DP parameter, so it cannot '
+                                 'vary between configurations.' % name)
+
+
+def _get_sweep_params(param, dp_configs):
+    """
+    Returns a copy of the params whose DP params are arrays w/ the value of
+    each configuration along the first axis, shaped to broadcast against
+    the candidates x previous candidates cost matrix of _get_next_cands.
+    """
+    _check_dp_configs(dp_configs)
+    sweep_param = copy.copy(param)
+    for name in _DP_PARAM_NAMES:
+        values = [dp_config.get(name, getattr(param, name))
+                  for dp_config in dp_configs]
+        setattr(sweep_param, name,
+                numpy.array(values, dtype=float).reshape(-1, 1, 1))
+    return sweep_param
 
 
 def _setup_rapt_params(kwargs):
@@ -92,57 +219,465 @@ def _setup_rapt_params(kwargs):
     if kwargs is not None and isinstance(kwargs, dict):
         for key, value in kwargs.items():
             setattr(params, key, value)
+    _check_dtype(params.dtype)
     return params
 
 
+# float types the vectorized calcs can run in (see raptparams.dtype):
+_SUPPORTED_DTYPES = (numpy.dtype(numpy.float32), numpy.dtype(numpy.float64))
+
+
+def _check_dtype(dtype):
+    # lower precision (e.g. float16) or integer types give bad voicing
+    # decisions, so only float32 & float64 are allowed
+    try:
+        is_supported = numpy.dtype(dtype) in _SUPPORTED_DTYPES
+    except TypeError:
+        is_supported = False
+    if not is_supported:
+        raise ValueError('Unsupported dtype: %r. Use float32 or float64.' %
+                         (dtype,))
+
+
 def _calculate_params(param, original_audio, downsampled_audio=None):
     param.original_audio = original_audio
     if downsampled_audio:
         param.sample_rate_ratio = (float(original_audio[0]) /
                                    float(downsampled_audio[0]))
-    param.samples_per_frame = int(round(param.frame_step_size *
-                                        original_audio[0]))
-    param.hanning_window_length = int(round(0.03 * original_audio[0]))
+    plan = param.plan
+    if plan is not None and plan.sample_rate == original_audio[0]:
+        param.samples_per_frame = plan.samples_per_frame
+        param.hanning_window_length = plan.hanning_window_length
+        param.hanning_window_vals = plan.hanning_window_vals
+        param.rms_offset = plan.rms_offset
+    else:
+        _calculate_frame_params(param, original_audio[0],
+                                param.frame_step_size)
+    # prefix sums over the original audio, shared by 2nd pass NCCF & RMS calc
+    param.energy_index = _get_energy_index(original_audio[1])
+    # rms ratio per frame (same frame count as NCCF on the original audio)
+    frame_count = int(round(float(len(original_audio[1])) /
+                            float(param.samples_per_frame)) - 1)
+    param.rms_ratios = _get_rms_ratios(param, frame_count)
+
+
+def _calculate_frame_params(param, sample_rate, frame_step_size):
+    param.samples_per_frame = int(round(frame_step_size * sample_rate))
+    param.hanning_window_length = int(round(0.03 * sample_rate))
     param.hanning_window_vals = numpy.hanning(param.hanning_window_length)
     # offset adjusts window centers to be 20ms apart regardless of frame
     # step size - so the goal here is to find diff btwn frame size & 20ms apart
-    param.rms_offset = int(round((((float(original_audio[0]) / 1000.0) * 20.0) -
+    param.rms_offset = int(round((((float(sample_rate) / 1000.0) * 20.0) -
                            param.samples_per_frame)))
 
 
-def _get_audio_data(wavfile_path):
-    # Read wavfile and convert to mono
-    sample_rate, audio_sample = wavfile.read(wavfile_path)
+# number of RaptPlans kept for reuse, least recently used dropped first
+_PLAN_CACHE_SIZE = 8
 
-    # TODO: investigate whether this type of conversion to mono is suitable:
-    if len(audio_sample.shape) > 1:
-        audio_sample = audio_sample[:, 0]/2.0 + audio_sample[:, 1]/2.0
-        audio_sample = audio_sample.astype(int)
+_plan_cache = collections.OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def _get_rapt_plan(sample_rate, param):
+    """
+    Returns the RaptPlan for the sample rate & parameters, reusing the plan
+    already set on the params or a cached one where possible.
+    """
+    key = _get_plan_key(sample_rate, param)
+    if param.plan is not None and param.plan.key == key:
+        return param.plan
+    with _plan_cache_lock:
+        plan = _plan_cache.pop(key, None)
+        if plan is not None:
+            _plan_cache[key] = plan
+            return plan
+    # build outside the lock so other rates aren't held up meanwhile:
+    plan = _build_rapt_plan(sample_rate, param)
+    with _plan_cache_lock:
+        plan = _plan_cache.pop(key, plan)
+        _plan_cache[key] = plan
+        while len(_plan_cache) > _PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def _get_plan_key(sample_rate, param):
+    return (sample_rate, param.is_two_pass_nccf, param.is_run_filter,
+            numpy.dtype(param.dtype).name, param.maximum_allowed_freq,
+            param.minimum_allowed_freq, param.frame_step_size,
+            param.correlation_window_size)
+
+
+def _build_rapt_plan(sample_rate, param):
+    plan = raptplan.RaptPlan()
+    plan.key = _get_plan_key(sample_rate, param)
+    plan.sample_rate = sample_rate
+    _calculate_frame_params(plan, sample_rate, param.frame_step_size)
+    plan.hanning_window_vals.setflags(write=False)
+    if param.is_two_pass_nccf:
+        plan.downsampling = _get_downsampling(sample_rate,
+                                              param.maximum_allowed_freq,
+                                              param.is_run_filter,
+                                              param.dtype)
+        if plan.downsampling[2] is not None:
+            plan.downsampling[2].setflags(write=False)
+            plan.downsample_rate = (float(sample_rate) /
+                                    plan.downsampling[1])
+        else:
+            plan.downsample_rate = plan.downsampling[0]
+        plan.nccf_params[(plan.downsample_rate, True)] = (
+            _get_nccf_lag_params(plan.downsample_rate, param, True))
+        plan.nccf_params[(sample_rate, False)] = (
+            _get_nccf_lag_params(sample_rate, param, False))
+    else:
+        plan.nccf_params[(sample_rate, True)] = (
+            _get_nccf_lag_params(sample_rate, param, True))
+    return plan
+
+
+# number of samples converted to mono at once
+_AUDIO_BLOCK_SIZE = 65536
 
+
+def _get_input(audio_input, param):
+    # reads the audio input of a rapt call, timed as its load stage
+    _start_stage(param, 'load')
+    original_audio = _get_audio_data(audio_input, param)
+    _stop_stage(param, 'load')
+    return original_audio
+
+
+def _get_audio_data(wavfile_path, param=None):
+    # Read wavfile and convert to mono. The file is memory mapped, so if
+    # the params give a region of interest only the pages covering it (and
+    # the margin its last frames look past it) are read.
+    audio = _read_audio(wavfile_path)
+    sample_scale = None
+    if param is not None:
+        sample_scale = param.sample_scale
+    sample_scale = _get_sample_scale(wavfile_path, audio[1], sample_scale)
+    return _get_input_audio(audio, param, sample_scale)
+
+
+# float wav samples are scaled by this to the range of 16 bit PCM:
+_FLOAT_SAMPLE_SCALE = 32768
+
+
+def _get_sample_scale(audio_input, audio_sample, sample_scale=None):
+    """
+    Returns the factor to scale the samples read from an audio input by
+    (see raptparams.sample_scale): sample_scale if given, else 32768 for
+    float wav samples, else 1. The scale comes from the format of the input
+    rather than its samples, so every part of the audio is scaled alike.
+    """
+    if sample_scale is not None:
+        return sample_scale
+    # tuples are arrays or PCM bytes rather than wav data:
+    if (not isinstance(audio_input, tuple) and
+            numpy.issubdtype(audio_sample.dtype, numpy.floating)):
+        return _FLOAT_SAMPLE_SCALE
+    return 1
+
+
+def _read_audio(audio_input):
+    """
+    Returns a (sample rate, samples) tuple for any of the audio inputs rapt
+    accepts. Wav files are memory mapped, and the samples of wav contents &
+    PCM bytes already in memory are views of them rather than copies.
+    """
+    if isinstance(audio_input, tuple):
+        sample_rate, audio_sample = audio_input
+        if isinstance(audio_sample, (str, bytearray, buffer, memoryview)):
+            pcm_bytes = _get_byte_array(audio_sample)
+            audio_sample = pcm_bytes[:len(pcm_bytes) -
+                                     len(pcm_bytes) % 2].view('<i2')
+        return (sample_rate, audio_sample)
+    if isinstance(audio_input, (bytearray, buffer, memoryview)):
+        return _read_wav_data(audio_input)
+    if hasattr(audio_input, 'read'):
+        return wavfile.read(audio_input)
+    return wavfile.read(audio_input, mmap=True)
+
+
+def _get_byte_array(data):
+    # uint8 array over the bytes of the buffer, w/o copying them
+    if isinstance(data, memoryview):
+        return numpy.asarray(data).view(numpy.uint8).reshape(-1)
+    return numpy.frombuffer(data, dtype=numpy.uint8)
+
+
+# WAVE_FORMAT_ tags of the sample formats _read_wav_data supports:
+_WAV_FORMAT_PCM = 1
+_WAV_FORMAT_IEEE_FLOAT = 3
+_WAV_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _read_wav_data(wav_data):
+    """
+    Parses the contents of a wav file held in memory, returning a tuple of
+    the sample rate and a view of its samples (w/ a column per channel).
+    """
+    wav_bytes = _get_byte_array(wav_data)
+    if (wav_bytes[:4].tostring() != 'RIFF' or
+            wav_bytes[8:12].tostring() != 'WAVE'):
+        raise ValueError('Audio data is not in WAV format.')
+    wav_format = None
+    chunk_start = 12
+    while chunk_start + 8 <= len(wav_bytes):
+        chunk_id = wav_bytes[chunk_start:chunk_start + 4].tostring()
+        chunk_size = struct.unpack(
+            '<I', wav_bytes[chunk_start + 4:chunk_start + 8].tostring())[0]
+        chunk_data = wav_bytes[chunk_start + 8:chunk_start + 8 + chunk_size]
+        if chunk_id == 'fmt ':
+            wav_format = chunk_data
+        elif chunk_id == 'data':
+            if wav_format is None:
+                raise ValueError('WAV data has no format chunk before its '
+                                 'samples.')
+            return _get_wav_samples(wav_format, chunk_data)
+        # chunks are padded to an even number of bytes:
+        chunk_start += 8 + chunk_size + chunk_size % 2
+    raise ValueError('WAV data has no samples.')
+
+
+def _get_wav_samples(wav_format, sample_bytes):
+    format_tag, channels, sample_rate = struct.unpack(
+        '<HHI', wav_format[:8].tostring())
+    block_align, bits_per_sample = struct.unpack(
+        '<HH', wav_format[12:16].tostring())
+    if format_tag == _WAV_FORMAT_EXTENSIBLE and len(wav_format) >= 26:
+        # actual format is the start of the sub format GUID:
+        format_tag = struct.unpack('<H', wav_format[24:26].tostring())[0]
+    dtypes = {(_WAV_FORMAT_PCM, 8): numpy.uint8,
+              (_WAV_FORMAT_PCM, 16): '<i2',
+              (_WAV_FORMAT_PCM, 32): '<i4',
+              (_WAV_FORMAT_IEEE_FLOAT, 32): '<f4',
+              (_WAV_FORMAT_IEEE_FLOAT, 64): '<f8'}
+    if ((format_tag, bits_per_sample) not in dtypes or channels < 1 or
+            block_align < 1):
+        raise ValueError('Unsupported WAV format: format %d w/ %d bits per '
+                         'sample.' % (format_tag, bits_per_sample))
+    # only whole frames (a sample per channel):
+    sample_bytes = sample_bytes[:len(sample_bytes) -
+                                len(sample_bytes) % block_align]
+    audio_sample = sample_bytes.view(dtypes[(format_tag, bits_per_sample)])
+    if channels > 1:
+        audio_sample = audio_sample.reshape(-1, channels)
     return (sample_rate, audio_sample)
 
 
-def _get_downsampled_audio(original_audio, maximum_allowed_freq, is_filter):
+def _get_input_audio(audio, param=None, sample_scale=1):
     """
-    Calc downsampling rate, downsample audio, return as tuple
+    Cuts the region of interest given by the params (if any) out of a tuple
+    of sample rate & audio samples and converts it to mono, scaled by
+    sample_scale.
     """
-    downsample_rate = _calculate_downsampling_rate(original_audio[0],
-                                                   maximum_allowed_freq)
-    # low pass filter:
-    if is_filter:
-        freq_cutoff = 0.05 / (0.5 * float(downsample_rate))
-        taps = 100
-        filter = signal.firwin(taps, cutoff=freq_cutoff, width=0.005,
-                               window='hanning')
-        filtered_audio = signal.lfilter(filter, 1, original_audio[1])
-        filtered_audio = (original_audio[0], filtered_audio)
-        downsampled_audio = _downsample_audio(filtered_audio, downsample_rate)
+    sample_rate, audio_sample = audio[0], numpy.asarray(audio[1])
+    first_sample = 0
+    last_sample = len(audio_sample)
+    if param is not None:
+        first_sample, last_sample = _get_region_samples(param, sample_rate,
+                                                        len(audio_sample))
+    audio_sample = audio_sample[first_sample:last_sample]
+    if param is not None and param.stats is not None:
+        param.stats.count('bytes_read', audio_sample.nbytes)
+    audio_sample = _get_mono_audio(audio_sample, sample_scale)
+
+    return (sample_rate, audio_sample)
+
+
+def _get_mono_audio(audio_sample, sample_scale=1):
+    """
+    Copies audio out of the memory mapped wav data, converting stereo to
+    mono a block at a time so there is no full size float copy, and scales
+    it by sample_scale. Float samples stay float thru the mix-down.
+    """
+    # TODO: investigate whether this type of conversion to mono is suitable:
+    if len(audio_sample.shape) > 1:
+        dtype = int
+        if (numpy.issubdtype(audio_sample.dtype, numpy.floating) or
+                sample_scale != 1):
+            dtype = numpy.result_type(audio_sample.dtype, numpy.float32)
+        mono_sample = numpy.empty(len(audio_sample), dtype=dtype)
+        for start in xrange(0, len(audio_sample), _AUDIO_BLOCK_SIZE):
+            block = audio_sample[start:start + _AUDIO_BLOCK_SIZE]
+            mono_sample[start:start + _AUDIO_BLOCK_SIZE] = (
+                block[:, 0]/2.0 + block[:, 1]/2.0) * sample_scale
+        return mono_sample
+    if sample_scale != 1:
+        dtype = numpy.result_type(audio_sample.dtype, numpy.float32)
+        return numpy.multiply(audio_sample, sample_scale, dtype=dtype)
+    return numpy.array(audio_sample)
+
+
+def _get_region_samples(param, sample_rate, sample_count):
+    """
+    Returns the (first, last) samples to read for the params' start_time /
+    end_time region (all of them if neither is set). Past the end of the
+    region, the longest lag & RMS windows of its last frames are read too
+    (when the audio has them). Also sets param.region_start to the first
+    sample of the region, and param.region_length to the number of samples
+    in the region itself, used to cut the results down to the region's
+    frames. An end_time past the end of the audio is cut down to it, while
+    a start_time at or past the end of the audio (or end_time) raises a
+    ValueError.
+    """
+    first_sample = 0
+    last_sample = sample_count
+    if param.start_time is None and param.end_time is None:
+        return (first_sample, last_sample)
+    duration = float(sample_count) / sample_rate
+    if param.start_time is not None and param.start_time >= duration:
+        raise ValueError('start_time (%s seconds) is not before the end of '
+                         'the audio (%s seconds).' % (param.start_time,
+                                                      duration))
+    start_time = param.start_time or 0.0
+    if param.end_time is not None and start_time >= param.end_time:
+        raise ValueError('start_time (%s seconds) is not before end_time '
+                         '(%s seconds).' % (start_time, param.end_time))
+    if param.start_time is not None:
+        first_sample = min(max(int(round(param.start_time * sample_rate)), 0),
+                           sample_count)
+    if param.end_time is not None:
+        last_sample = min(max(int(round(param.end_time * sample_rate)),
+                              first_sample), sample_count)
+    param.region_start = first_sample
+    param.region_length = last_sample - first_sample
+    if param.end_time is not None:
+        lag_margin = (int(round(sample_rate / param.minimum_allowed_freq)) +
+                      int(round(param.correlation_window_size *
+                                sample_rate)))
+        # rms windows are 30 ms long and offset up to 20 ms:
+        rms_margin = int(round(0.05 * sample_rate))
+        last_sample = min(last_sample + max(lag_margin, rms_margin),
+                          sample_count)
+    return (first_sample, last_sample)
+
+
+def _get_region_results(results, param):
+    # cuts per frame results down to the frames of the region of interest,
+    # dropping the frames that only cover the margin read past its end
+    if results is None or param.region_length is None:
+        return results
+    frame_count = int(round(float(param.region_length) /
+                            float(param.samples_per_frame)) - 1)
+    return results[:max(frame_count, 0)]
+
+
+def _get_downsampled_audio(original_audio, maximum_allowed_freq, is_filter,
+                           dtype=None, plan=None):
+    """
+    Calc downsampling rate, downsample audio, return as tuple. If a float
+    dtype other than float64 is given, filtering and resampling are done
+    in that precision. The rate & filter are taken from the plan if given.
+    """
+    if plan is None:
+        downsampling = _get_downsampling(original_audio[0],
+                                         maximum_allowed_freq, is_filter,
+                                         dtype)
+    else:
+        downsampling = plan.downsampling
+    downsample_rate, decimation_factor, filter = downsampling
+    if dtype is not None and numpy.dtype(dtype) != numpy.float64:
+        original_audio = (original_audio[0],
+                          numpy.asarray(original_audio[1], dtype=dtype))
+    # anti-aliasing low pass filter, keeping only every Nth filtered sample.
+    # The filter is centered on the kept samples (w/ zeros past the end of
+    # the audio), so the decimated audio lines up w/ the original:
+    if filter is not None:
+        delay = _get_filter_delay(filter)
+        padded_audio = numpy.concatenate((original_audio[1], numpy.zeros(
+            delay, dtype=numpy.asarray(original_audio[1]).dtype)))
+        downsampled_audio = _decimate_audio(padded_audio, filter,
+                                            decimation_factor, delay)[0]
+        downsample_rate = float(original_audio[0]) / decimation_factor
     else:
         downsampled_audio = _downsample_audio(original_audio, downsample_rate)
 
     return (downsample_rate, downsampled_audio)
 
 
+def _get_downsampling(sample_rate, maximum_allowed_freq, is_filter,
+                      dtype=None):
+    """
+    Returns a tuple of the downsampling rate, the decimation factor and the
+    low pass filter taps (in the given float dtype), or of the rate and two
+    Nones if the audio is resampled w/o filtering.
+    """
+    downsample_rate = _calculate_downsampling_rate(sample_rate,
+                                                   maximum_allowed_freq)
+    if not is_filter:
+        return (downsample_rate, None, None)
+    decimation_factor = _get_decimation_factor(sample_rate, downsample_rate)
+    filter = _get_lowpass_filter(decimation_factor)
+    if dtype is not None and numpy.dtype(dtype) == numpy.float32:
+        filter = filter.astype(numpy.float32)
+    return (downsample_rate, decimation_factor, filter)
+
+
+# half the length of the anti-aliasing filter, in decimated samples
+_FILTER_HALF_LENGTH = 10
+
+
+def _get_lowpass_filter(decimation_factor):
+    """
+    FIR taps of the anti-aliasing low pass filter applied before keeping
+    every Nth sample, w/ its cutoff at the Nyquist frequency of the
+    decimated rate (the Kaiser windowed design scipy.signal.resample_poly
+    uses). Its delay is a whole number of decimated samples.
+    """
+    if decimation_factor <= 1:
+        return numpy.ones(1)
+    half_length = _FILTER_HALF_LENGTH * decimation_factor
+    return signal.firwin(2 * half_length + 1, 1.0 / decimation_factor,
+                         window=('kaiser', 5.0))
+
+
+def _get_filter_delay(filter):
+    # delay of a linear phase FIR filter, in input samples
+    return (len(filter) - 1) // 2
+
+
+def _get_decimation_factor(sample_rate, downsample_rate):
+    """
+    Integer ratio between the original and downsampled rates
+    """
+    return max(int(round(float(sample_rate) / downsample_rate)), 1)
+
+
+def _decimate_audio(audio_sample, filter, decimation_factor, first_kept=0,
+                    history=None):
+    """
+    Applies the FIR filter to the audio and keeps every Nth output, only
+    computing the outputs that are kept. Each tap is multiplied w/ one
+    strided slice of the input, so the work is len(filter)/N multiply-adds
+    per input sample instead of len(filter) for filtering the whole signal.
+
+    To filter a signal in blocks, pass the index of the first sample of the
+    block to keep (relative to the block) and the history returned for the
+    previous block. Returns a tuple of the decimated audio and the history
+    to pass w/ the next block.
+    """
+    taps = len(filter)
+    audio_sample = numpy.asarray(audio_sample)
+    if history is None:
+        # same as a filter w/ zero initial state:
+        history = numpy.zeros(taps - 1, dtype=audio_sample.dtype)
+    padded_audio = numpy.concatenate((history, audio_sample))
+    output_count = max(-(-(len(audio_sample) - first_kept) //
+                         decimation_factor), 0)
+    decimated_audio = numpy.zeros(output_count,
+                                  dtype=numpy.result_type(padded_audio,
+                                                          filter))
+    # output i is the sum of filter[k] * audio[i*N + first_kept - k]:
+    for k in xrange(0, taps):
+        start = taps - 1 - k + first_kept
+        decimated_audio += (filter[k] * padded_audio[
+            start:start + output_count * decimation_factor:
+            decimation_factor])
+    return (decimated_audio, padded_audio[len(padded_audio) - taps + 1:])
+
+
 def _downsample_audio(original_audio, downsampling_rate):
     """
     Given the original audio sample/rate and a desired downsampling
@@ -184,22 +719,135 @@ def _calculate_downsampling_rate(initial_sampling_rate, maximum_f0):
     return int(aReturn)
 
 
+# Energy Index:
+
+
+def _get_energy_index(audio_sample):
+    """
+    Builds prefix sums (sum and sum of squares) over an audio sample, so the
+    sum and energy of any window can be looked up by subtracting two entries
+    instead of summing the whole window. Integer audio is summed w/ int64 so
+    the lookups are exact, unless its sum of squares could overflow int64
+    (e.g. 32 bit PCM), in which case it is summed w/ float64 like float
+    audio.
+    """
+    audio_sample = numpy.asarray(audio_sample)
+    if _is_int64_energy(audio_sample):
+        audio_sample = audio_sample.astype(numpy.int64)
+    else:
+        audio_sample = audio_sample.astype(numpy.float64)
+    audio_length = len(audio_sample)
+
+    sums = numpy.zeros(audio_length + 1, dtype=audio_sample.dtype)
+    numpy.cumsum(audio_sample, out=sums[1:])
+    squared_sums = numpy.zeros(audio_length + 1, dtype=audio_sample.dtype)
+    numpy.cumsum(audio_sample * audio_sample, out=squared_sums[1:])
+    return (sums, squared_sums)
+
+
+def _is_int64_energy(audio_sample):
+    # whether the squares of integer audio & their sum fit in an int64
+    if not numpy.issubdtype(audio_sample.dtype, numpy.integer):
+        return False
+    if len(audio_sample) == 0:
+        return True
+    peak = max(abs(int(audio_sample.min())), abs(int(audio_sample.max())))
+    return peak * peak * len(audio_sample) < 2 ** 63
+
+
+def _get_window_sums(energy_index, window_start, window_length):
+    """
+    Returns (sum, sum of squares) of the audio window starting at
+    window_start. window_start may be an int or a numpy array of starts.
+    """
+    sums, squared_sums = energy_index[0], energy_index[1]
+    window_end = window_start + window_length
+    return (sums[window_end] - sums[window_start],
+            squared_sums[window_end] - squared_sums[window_start])
+
+
+# number of hanning windows whose energies are summed at once
+_HANNING_BLOCK_SIZE = 1024
+
+
+def _get_hanning_energy(audio_sample, window_start, hanning_window_vals,
+                        dtype=numpy.float64):
+    """
+    Returns sum((audio * hanning_window_vals)**2) for the window starting at
+    window_start, which may be an int or a numpy array of starts. Windows
+    are read thru a strided view of the audio and copied out a block at a
+    time, so memory use doesn't grow w/ the number of windows.
+    """
+    audio_sample = numpy.asarray(audio_sample)
+    weights = numpy.square(hanning_window_vals).astype(dtype)
+    window_length = len(weights)
+    window_starts = numpy.atleast_1d(window_start)
+    windows = as_strided(audio_sample,
+                         shape=(max(len(audio_sample) - window_length + 1, 0),
+                                window_length),
+                         strides=(audio_sample.strides[0],) * 2)
+    energies = numpy.empty(len(window_starts), dtype=dtype)
+    for start in xrange(0, len(window_starts), _HANNING_BLOCK_SIZE):
+        block_end = start + _HANNING_BLOCK_SIZE
+        block = windows[window_starts[start:block_end]].astype(dtype)
+        energies[start:block_end] = numpy.dot(block * block, weights)
+    if numpy.ndim(window_start) == 0:
+        return energies[0]
+    return energies
+
+
 # NCCF Functionality:
 # TODO: Consider moving nccf functions into a separate module / file?
 
+# max number of (frame, lag) windows gathered at once in the 2nd pass
+_INPUT_LAG_BLOCK_SIZE = 2048
+
+# number of frames whose whole lag range is correlated at once in the 1st
+# pass (or one pass) w/o a pool
+_NCCF_BLOCK_FRAMES = 256
+
+# smallest number of frames handed to a worker process in one block
+_PARALLEL_MIN_BLOCK_FRAMES = 64
+
+# number of frame blocks queued per worker process, to even out the load
+_PARALLEL_BLOCKS_PER_WORKER = 4
+
 
 def _run_nccf(original_audio, raptparam, downsampled_audio=None):
-    if raptparam.is_two_pass_nccf:
-        first_pass = _first_pass_nccf(downsampled_audio, raptparam)
-        # run second pass
-        nccf_results = _second_pass_nccf(original_audio, first_pass, raptparam)
-        return (nccf_results, first_pass)
-    else:
-        nccf_results = _one_pass_nccf(original_audio, raptparam)
-        return (nccf_results, None)
+    if raptparam.threads > 1 and raptparam.is_vectorized_nccf:
+        # the passes overlap, so they're timed as one stage
+        _start_stage(raptparam, 'nccf')
+        nccf_results = _threaded_nccf(original_audio, raptparam,
+                                      downsampled_audio)
+        _stop_stage(raptparam, 'nccf')
+        return nccf_results
+    pool = None
+    if raptparam.workers > 1 and raptparam.is_vectorized_nccf:
+        pool = _get_nccf_pool(raptparam.workers, original_audio,
+                              downsampled_audio)
+    try:
+        if raptparam.is_two_pass_nccf:
+            _start_stage(raptparam, 'first_pass')
+            first_pass = _first_pass_nccf(downsampled_audio, raptparam, pool)
+            _stop_stage(raptparam, 'first_pass')
+            # run second pass
+            _start_stage(raptparam, 'second_pass')
+            nccf_results = _second_pass_nccf(original_audio, first_pass,
+                                             raptparam, pool)
+            _stop_stage(raptparam, 'second_pass')
+            return (nccf_results, first_pass)
+        else:
+            _start_stage(raptparam, 'first_pass')
+            nccf_results = _one_pass_nccf(original_audio, raptparam, pool)
+            _stop_stage(raptparam, 'first_pass')
+            return (nccf_results, None)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
 
-def _one_pass_nccf(audio, raptparam):
+def _one_pass_nccf(audio, raptparam, pool=None):
     """
     Runs NCCF on full audio sample and returns top correlations per frame
     """
@@ -211,15 +859,23 @@ def _one_pass_nccf(audio, raptparam):
                  params[1].shortest_lag_per_frame)
     candidates = [None] * params[1].max_frame_count
 
+    if raptparam.is_vectorized_nccf:
+        if pool is not None:
+            all_frame_results = _get_parallel_correlations(
+                pool, 'original', lag_range, params)
+            return _get_marked_frame_results(all_frame_results, params,
+                                             False)
+        return _get_frame_block_results(audio, lag_range, params)
+
     for i in xrange(0, params[1].max_frame_count):
         all_lag_results = _get_correlations_for_all_lags(audio, i, lag_range,
                                                          params)
         candidates[i] = _get_marked_results(all_lag_results, params, False)
 
-    return candidates
+    return _get_lattice(candidates)
 
 
-def _first_pass_nccf(audio, raptparam):
+def _first_pass_nccf(audio, raptparam, pool=None):
     # Runs normalized cross correlation function (NCCF) on downsampled audio,
     # outputting a set of potential F0 candidates that could be used to
     # determine the pitch at each given frame of the audio sample.
@@ -238,14 +894,36 @@ def _first_pass_nccf(audio, raptparam):
 
     candidates = [None] * params[1].max_frame_count
 
+    if raptparam.is_vectorized_nccf:
+        if pool is not None:
+            all_frame_results = _get_parallel_correlations(
+                pool, 'downsampled', lag_range, params)
+            return _get_marked_frame_results(all_frame_results, params,
+                                             True)
+        return _get_frame_block_results(audio, lag_range, params)
+
     for i in xrange(0, params[1].max_frame_count):
         candidates[i] = _get_firstpass_frame_results(
             audio, i, lag_range, params)
 
-    return candidates
+    return _get_lattice(candidates)
 
 
-def _second_pass_nccf(original_audio, first_pass, raptparam):
+def _get_frame_block_results(audio, lag_range, params):
+    """
+    Runs the vectorized 1st pass (or one pass) NCCF & candidate marking on
+    _NCCF_BLOCK_FRAMES frames at a time, so the frame x lag matrices only
+    ever cover one block instead of growing w/ the length of the audio.
+    """
+    frame_count = params[1].max_frame_count
+    return _concatenate_lattices([
+        _first_pass_block(audio, lag_range, params,
+                          (start, min(start + _NCCF_BLOCK_FRAMES,
+                                      frame_count)))
+        for start in xrange(0, frame_count, _NCCF_BLOCK_FRAMES)])
+
+
+def _second_pass_nccf(original_audio, first_pass, raptparam, pool=None):
     # Runs NCCF on original audio, but only for lags highlighted from first
     # pass results. Will output the finalized F0 candidates for each frame
     nccfparam = _get_nccf_params(original_audio, raptparam, False)
@@ -257,37 +935,279 @@ def _second_pass_nccf(original_audio, first_pass, raptparam):
 
     candidates = [None] * params[1].max_frame_count
 
+    if raptparam.is_vectorized_nccf:
+        if pool is not None:
+            sparse_results = _get_parallel_correlations(
+                pool, 'original', lag_range, params, first_pass)
+        else:
+            sparse_results = _get_correlations_for_all_input_lags(
+                original_audio, first_pass, lag_range, params)
+        return _get_marked_sparse_results(sparse_results, params)
+
     for i in xrange(0, params[1].max_frame_count):
         candidates[i] = _get_secondpass_frame_results(
             original_audio, i, lag_range, params, first_pass)
 
+    return _get_lattice(candidates)
+
+
+# Threaded NCCF:
+
+def _threaded_nccf(original_audio, raptparam, downsampled_audio=None):
+    """
+    Runs NCCF in frame blocks on a thread pool, pipelining the two passes:
+    as soon as the 1st pass of a block is done its 2nd pass is queued,
+    so block k can be in the 2nd pass while block k + 1 is in the 1st.
+    The big numpy operations release the GIL, and there is no process
+    startup or pickling cost, so this suits short low-latency requests.
+    Returns the same (nccf_results, first_pass) tuple as _run_nccf.
+    """
+    if raptparam.is_two_pass_nccf:
+        first_audio = downsampled_audio
+    else:
+        first_audio = original_audio
+    first_params = (raptparam,
+                    _get_nccf_params(first_audio, raptparam, True))
+    first_lag_range = ((first_params[1].longest_lag_per_frame - 1) -
+                       first_params[1].shortest_lag_per_frame)
+    first_frame_count = first_params[1].max_frame_count
+    frame_count = first_frame_count
+    if raptparam.is_two_pass_nccf:
+        second_params = (raptparam,
+                         _get_nccf_params(original_audio, raptparam, False))
+        second_lag_range = ((second_params[1].longest_lag_per_frame - 1) -
+                            second_params[1].shortest_lag_per_frame)
+        frame_count = max(frame_count, second_params[1].max_frame_count)
+
+    frame_blocks = _get_frame_blocks(frame_count, raptparam.threads)
+    first_pass_blocks = []
+    second_pass_results = []
+    pool = ThreadPool(raptparam.threads)
+    try:
+        # keep a bounded number of 1st pass blocks ahead of the 2nd pass:
+        first_pass_results = []
+        for frame_range in frame_blocks[:raptparam.threads]:
+            first_pass_results.append(pool.apply_async(
+                _first_pass_block, (first_audio, first_lag_range,
+                                    first_params, frame_range)))
+        for block_idx, frame_range in enumerate(frame_blocks):
+            first_pass_blocks.append(first_pass_results[block_idx].get())
+            if raptparam.is_two_pass_nccf:
+                # each block only reads its own frames of the 1st pass:
+                second_pass_results.append(pool.apply_async(
+                    _second_pass_block, (original_audio,
+                                         first_pass_blocks[-1],
+                                         second_lag_range, second_params,
+                                         frame_range)))
+            next_block = block_idx + raptparam.threads
+            if next_block < len(frame_blocks):
+                first_pass_results.append(pool.apply_async(
+                    _first_pass_block, (first_audio, first_lag_range,
+                                        first_params,
+                                        frame_blocks[next_block])))
+        first_pass = _concatenate_lattices(first_pass_blocks)
+        if not raptparam.is_two_pass_nccf:
+            return (first_pass, None)
+        nccf_results = _concatenate_lattices([result.get() for result in
+                                              second_pass_results])
+        return (nccf_results, first_pass)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _first_pass_block(audio, lag_range, params, frame_range):
+    # 1st pass (or one pass) NCCF & candidate marking for a block of frames
+    frame_count = params[1].max_frame_count
+    frame_range = (min(frame_range[0], frame_count),
+                   min(frame_range[1], frame_count))
+    all_frame_results = _get_correlations_for_all_frames(
+        audio, lag_range, params, True, frame_range)
+    candidates = _get_marked_frame_results(all_frame_results, params,
+                                           params[0].is_two_pass_nccf)
+    candidates.first_frame = frame_range[0]
+    return candidates
+
+
+def _second_pass_block(audio, first_pass, lag_range, params, frame_range):
+    # 2nd pass NCCF & candidate marking for a block of frames
+    frame_count = params[1].max_frame_count
+    frame_range = (min(frame_range[0], frame_count),
+                   min(frame_range[1], frame_count))
+    sparse_results = _get_correlations_for_all_input_lags(
+        audio, first_pass, lag_range, params, frame_range)
+    candidates = _get_marked_sparse_results(sparse_results, params)
+    candidates.first_frame = frame_range[0]
     return candidates
 
 
+# Parallel NCCF:
+
+# audio & energy indexes shared with the worker processes of an NCCF pool,
+# keyed by 'original' / 'downsampled'. Only populated inside the workers.
+_worker_audio = {}
+_worker_energy_index = {}
+
+
+def _get_nccf_pool(workers, original_audio, downsampled_audio=None):
+    """
+    Creates a process pool for frame-parallel NCCF. The audio is copied once
+    into shared memory that the workers map as numpy arrays, rather than
+    being pickled along with every block of frames.
+    """
+    shared_audio = {'original': _get_shared_audio(original_audio)}
+    if downsampled_audio is not None:
+        shared_audio['downsampled'] = _get_shared_audio(downsampled_audio)
+    return multiprocessing.Pool(workers, _init_nccf_worker, (shared_audio,))
+
+
+def _get_shared_audio(audio):
+    audio_sample = numpy.ascontiguousarray(audio[1])
+    shared_buffer = multiprocessing.RawArray(ctypes.c_char,
+                                             max(audio_sample.nbytes, 1))
+    shared_sample = numpy.frombuffer(shared_buffer, dtype=audio_sample.dtype,
+                                     count=len(audio_sample))
+    shared_sample[:] = audio_sample
+    return (audio[0], shared_buffer, audio_sample.dtype.str,
+            len(audio_sample))
+
+
+def _init_nccf_worker(shared_audio):
+    _worker_audio.clear()
+    _worker_energy_index.clear()
+    for key, (sample_rate, shared_buffer, dtype, length) in \
+            shared_audio.items():
+        _worker_audio[key] = (sample_rate,
+                              numpy.frombuffer(shared_buffer, dtype=dtype,
+                                               count=length))
+
+
+def _run_nccf_block(task):
+    # Runs in a worker process: NCCF over one block of frames of the
+    # shared audio. 2nd pass blocks also carry their 1st pass candidates.
+    audio_key, frame_range, lag_range, params, first_pass = task
+    audio = _worker_audio[audio_key]
+    if audio_key not in _worker_energy_index:
+        _worker_energy_index[audio_key] = _get_energy_index(audio[1])
+    params[1].energy_index = _worker_energy_index[audio_key]
+    if first_pass is None:
+        return _get_correlations_for_all_frames(audio, lag_range, params,
+                                                True, frame_range)
+    return _get_correlations_for_all_input_lags(audio, first_pass, lag_range,
+                                                params, frame_range)
+
+
+def _get_frame_blocks(frame_count, workers):
+    """
+    Splits frames [0, frame_count) into contiguous (start, end) blocks,
+    a few per worker so uneven blocks don't leave workers idle.
+    """
+    frame_count = max(frame_count, 0)
+    block_count = max(min(workers * _PARALLEL_BLOCKS_PER_WORKER,
+                          frame_count // _PARALLEL_MIN_BLOCK_FRAMES), 1)
+    bounds = numpy.linspace(0, frame_count, block_count + 1).astype(int)
+    return [(bounds[i], bounds[i + 1]) for i in xrange(block_count)]
+
+
+def _get_parallel_correlations(pool, audio_key, lag_range, params,
+                               first_pass=None):
+    """
+    Frame-parallel version of _get_correlations_for_all_frames (or of
+    _get_correlations_for_all_input_lags when 1st pass results are given).
+    Blocks of frames are run on the pool against its shared audio and the
+    results are stitched back together in frame order.
+    """
+    raptparam = params[0]
+    frame_blocks = _get_frame_blocks(params[1].max_frame_count,
+                                     raptparam.workers)
+    # audio & indexes are available in the workers, so leave them out of
+    # the pickled params:
+    worker_raptparam = copy.copy(raptparam)
+    worker_raptparam.original_audio = None
+    worker_raptparam.energy_index = None
+    # counts are taken in this process, when the results are marked:
+    worker_raptparam.stats = None
+    worker_nccfparam = copy.copy(params[1])
+    worker_nccfparam.energy_index = None
+    worker_params = (worker_raptparam, worker_nccfparam)
+
+    first_pass = _get_lattice(first_pass)
+    tasks = []
+    for frame_range in frame_blocks:
+        block_first_pass = None
+        if first_pass is not None:
+            # only the block's own frames of the 1st pass are sent along:
+            block_first_pass = first_pass.get_frames(frame_range[0],
+                                                     frame_range[1])
+        tasks.append((audio_key, frame_range, lag_range, worker_params,
+                      block_first_pass))
+    block_results = pool.map(_run_nccf_block, tasks)
+
+    if first_pass is None:
+        return (numpy.concatenate([r[0] for r in block_results]),
+                numpy.concatenate([r[1] for r in block_results]))
+    return _merge_sparse_results(block_results)
+
+
+def _merge_sparse_results(block_results):
+    # joins per block (frame_bounds, lags, correlations, max_vals) results
+    # of consecutive frame blocks into a single sparse result:
+    frame_bounds = [numpy.zeros(1, dtype=int)]
+    offset = 0
+    for block in block_results:
+        frame_bounds.append(block[0][1:] + offset)
+        offset += block[0][-1]
+    return (numpy.concatenate(frame_bounds),
+            numpy.concatenate([r[1] for r in block_results]),
+            numpy.concatenate([r[2] for r in block_results]),
+            numpy.concatenate([r[3] for r in block_results]))
+
+
 def _get_nccf_params(audio_input, raptparams, is_firstpass):
     """
     Creates and returns nccfparams object w/ nccf-specific values
     """
+    plan = raptparams.plan
+    plan_key = (audio_input[0], is_firstpass)
+    if plan is not None and plan_key in plan.nccf_params:
+        nccfparam = copy.copy(plan.nccf_params[plan_key])
+    else:
+        nccfparam = _get_nccf_lag_params(audio_input[0], raptparams,
+                                         is_firstpass)
+    # TODO: do i really need to use the -1 here?
+    # Value of "M-1" in NCCF equation:
+    nccfparam.max_frame_count = int(round(float(len(audio_input[1])) /
+                                    float(nccfparam.samples_per_frame)) - 1)
+    # Prefix sums for window sums/energies - reuse the index of the original
+    # audio if it has already been built:
+    if (audio_input is raptparams.original_audio and
+            raptparams.energy_index is not None):
+        nccfparam.energy_index = raptparams.energy_index
+    else:
+        nccfparam.energy_index = _get_energy_index(audio_input[1])
+    return nccfparam
+
+
+def _get_nccf_lag_params(sample_rate, raptparams, is_firstpass):
+    """
+    Creates nccfparams object w/ the values that only depend on sample rate
+    """
     nccfparam = nccfparams.Nccfparams()
     # Value of "n" in NCCF equation:
     nccfparam.samples_correlated_per_lag = int(round(
-        raptparams.correlation_window_size * audio_input[0]))
+        raptparams.correlation_window_size * sample_rate))
     # Starting value of "k" in NCCF equation:
     if(is_firstpass):
-        nccfparam.shortest_lag_per_frame = int(round(audio_input[0] /
+        nccfparam.shortest_lag_per_frame = int(round(sample_rate /
                                                raptparams.maximum_allowed_freq))
     else:
         nccfparam.shortest_lag_per_frame = 0
     # Value of "K" in NCCF equation
-    nccfparam.longest_lag_per_frame = int(round(audio_input[0] /
+    nccfparam.longest_lag_per_frame = int(round(sample_rate /
                                           raptparams.minimum_allowed_freq))
     # Value of "z" in NCCF equation
     nccfparam.samples_per_frame = int(round(raptparams.frame_step_size *
-                                      audio_input[0]))
-    # TODO: do i really need to use the -1 here?
-    # Value of "M-1" in NCCF equation:
-    nccfparam.max_frame_count = int(round(float(len(audio_input[1])) /
-                                    float(nccfparam.samples_per_frame)) - 1)
+                                      sample_rate))
     return nccfparam
 
 
@@ -337,12 +1257,141 @@ def _get_correlations_for_all_lags(audio, current_frame, lag_range, params):
     return (candidates, max_correlation_val)
 
 
+def _get_correlations_for_all_frames(audio, lag_range, params,
+                                     is_firstpass=True, frame_range=None):
+    """
+    Batched version of _get_correlations_for_all_lags. Builds the whole
+    frame x lag correlation matrix with numpy instead of calling
+    _get_correlation once per lag per frame. Returns the matrix along with
+    the max correlation value (theta_max) per frame.
+    """
+    if frame_range is None:
+        frame_range = (0, params[1].max_frame_count)
+    first_frame, last_frame = frame_range
+    frame_count = max(last_frame - first_frame, 0)
+    lag_range = max(lag_range, 0)
+    dtype = numpy.dtype(params[0].dtype)
+    correlations = numpy.zeros((frame_count, lag_range), dtype=dtype)
+    max_correlation_vals = numpy.zeros(frame_count, dtype=dtype)
+
+    samples_correlated_per_lag = params[1].samples_correlated_per_lag
+    # also covers audio so short that every lag would run past its end:
+    if (frame_count == 0 or lag_range == 0 or
+            len(audio[1]) < samples_correlated_per_lag):
+        return (correlations, max_correlation_vals)
+
+    samples_per_frame = params[1].samples_per_frame
+    shortest_lag = params[1].shortest_lag_per_frame
+    audio_length = len(audio[1])
+
+    # Copy the samples the frames look at, padded w/ zeros so every frame
+    # has a full lag segment. Lags that run past the end of the real audio
+    # are zeroed out below.
+    segment_length = lag_range + samples_correlated_per_lag - 1
+    first_sample = first_frame * samples_per_frame
+    last_sample = (last_frame - 1) * samples_per_frame
+    end_sample = max(last_sample + shortest_lag + segment_length,
+                     last_sample + samples_correlated_per_lag)
+    padded_audio = numpy.zeros(end_sample - first_sample, dtype=dtype)
+    block_audio = audio[1][first_sample:min(end_sample, audio_length)]
+    padded_audio[:len(block_audio)] = block_audio
+    item_size = padded_audio.strides[0]
+
+    frame_windows = as_strided(padded_audio,
+                               shape=(frame_count, samples_correlated_per_lag),
+                               strides=(samples_per_frame * item_size,
+                                        item_size))
+    lag_segments = as_strided(padded_audio[shortest_lag:],
+                              shape=(frame_count, segment_length),
+                              strides=(samples_per_frame * item_size,
+                                       item_size))
+
+    cross_products = _get_cross_products(frame_windows, lag_segments,
+                                         lag_range)
+
+    # window sums and energies are O(1) lookups in the prefix sum index.
+    # Lag windows past the end of the audio are clipped here & zeroed below:
+    energy_index = params[1].energy_index
+    if energy_index is None:
+        energy_index = _get_energy_index(audio[1])
+    frame_starts = (numpy.arange(first_frame, last_frame) *
+                    samples_per_frame)[:, numpy.newaxis]
+    last_window_start = audio_length - samples_correlated_per_lag
+    lag_starts = numpy.minimum(frame_starts + shortest_lag +
+                               numpy.arange(lag_range), last_window_start)
+    frame_sums, frame_squared_sums = _get_window_sums(
+        energy_index, numpy.minimum(frame_starts, last_window_start),
+        samples_correlated_per_lag)
+    lag_sums, lag_squared_sums = _get_window_sums(
+        energy_index, lag_starts, samples_correlated_per_lag)
+    # the frame x lag matrices are worked out in the params' dtype:
+    lag_sums = lag_sums.astype(dtype)
+    lag_squared_sums = lag_squared_sums.astype(dtype)
+
+    mean_for_window = ((1.0 / float(samples_correlated_per_lag)) *
+                       frame_sums).astype(dtype)
+
+    # expand sum((x - mean) * (y - mean)) and sum((y - mean)**2) in terms of
+    # the raw sums so the mean is only applied once per frame:
+    numerator = cross_products - mean_for_window * lag_sums
+    denominator_base = (frame_squared_sums - mean_for_window *
+                        frame_sums).astype(dtype)
+    denominator_lag = (lag_squared_sums - 2.0 * mean_for_window * lag_sums +
+                       samples_correlated_per_lag * mean_for_window**2)
+    denominator = (numpy.maximum(denominator_base, 0.0) *
+                   numpy.maximum(denominator_lag, 0.0))
+    if not (is_firstpass and params[0].is_two_pass_nccf):
+        denominator += params[0].additive_constant
+    denominator = numpy.sqrt(denominator)
+
+    numpy.divide(numerator, denominator, out=correlations,
+                 where=denominator > 0.0)
+
+    # same end of audio check as _get_correlations_for_all_lags:
+    last_lag_sample = (frame_starts + numpy.arange(lag_range) +
+                       shortest_lag + (samples_correlated_per_lag - 1))
+    correlations[last_lag_sample >= audio_length] = 0.0
+
+    numpy.maximum(correlations.max(axis=1), 0.0, out=max_correlation_vals)
+    return (correlations, max_correlation_vals)
+
+
+def _get_cross_products(frame_windows, lag_segments, lag_range):
+    """
+    Returns sum(frame window * lag window) for each of the first lag_range
+    lags of every frame, by cross correlating each frame window against its
+    lag segment w/ FFTs. float32 input uses fftpack's single precision real
+    FFTs; anything else goes thru numpy's (double precision) FFTs.
+    """
+    segment_length = lag_segments.shape[1]
+    fft_size = 1 << int(math.ceil(math.log(segment_length, 2)))
+    if lag_segments.dtype != numpy.float32:
+        return numpy.fft.irfft(
+            numpy.fft.rfft(lag_segments, fft_size) *
+            numpy.conj(numpy.fft.rfft(frame_windows, fft_size)),
+            fft_size)[:, :lag_range]
+
+    # fftpack packs the spectrum as (r0, re1, im1, re2, im2, ..., r(n/2)),
+    # so multiply by the conjugate a (re, im) pair at a time:
+    lag_spectrum = fftpack.rfft(lag_segments, fft_size)
+    frame_spectrum = fftpack.rfft(frame_windows, fft_size)
+    product = lag_spectrum * frame_spectrum
+    if fft_size > 2:
+        lag_re = lag_spectrum[:, 1:-1:2]
+        lag_im = lag_spectrum[:, 2:-1:2]
+        frame_re = frame_spectrum[:, 1:-1:2]
+        frame_im = frame_spectrum[:, 2:-1:2]
+        product[:, 1:-1:2] = lag_re * frame_re + lag_im * frame_im
+        product[:, 2:-1:2] = lag_im * frame_re - lag_re * frame_im
+    return fftpack.irfft(product)[:, :lag_range]
+
+
 def _get_correlations_for_input_lags(audio, current_frame, first_pass,
                                      lag_range, params):
     candidates = [0.0] * lag_range
     max_correlation_val = 0.0
-    sorted_firstpass_results = first_pass[current_frame]
-    sorted_firstpass_results.sort(key=lambda tup: tup[0])
+    sorted_firstpass_results = sorted(first_pass[current_frame],
+                                      key=lambda tup: tup[0])
     for lag_val in sorted_firstpass_results:
         # 1st pass lag value has been interpolated for original audio sample:
         lag_peak = lag_val[0]
@@ -367,6 +1416,323 @@ def _get_correlations_for_input_lags(audio, current_frame, first_pass,
     return (candidates, max_correlation_val)
 
 
+def _get_correlations_for_all_input_lags(audio, first_pass, lag_range, params,
+                                         frame_range=None):
+    """
+    Batched version of _get_correlations_for_input_lags. The neighbourhoods
+    around each frame's 1st pass peaks are merged into one unique set of lags
+    per frame, and the correlations for every (frame, lag) pair are computed
+    together. Only the evaluated lags are returned, in a sparse
+    (frame_bounds, lags, correlations, max_correlation_vals) form: the lags
+    and correlations of frame i are at [frame_bounds[i]:frame_bounds[i + 1]].
+    """
+    if frame_range is None:
+        frame_range = (0, params[1].max_frame_count)
+    first_frame, last_frame = frame_range
+    frame_count = max(last_frame - first_frame, 0)
+    samples_correlated_per_lag = params[1].samples_correlated_per_lag
+    samples_per_frame = params[1].samples_per_frame
+    audio_length = len(audio[1])
+
+    # collect the +/-10 lag neighbourhood of every usable 1st pass peak:
+    first_pass = _get_lattice(first_pass)
+    first_row = max(first_frame - first_pass.first_frame, 0)
+    last_row = max(min(last_frame - first_pass.first_frame, len(first_pass)),
+                   first_row)
+    first_pass_lags = first_pass.lags[first_row:last_row]
+    is_usable = ((numpy.arange(first_pass_lags.shape[1]) <
+                  first_pass.counts[first_row:last_row, numpy.newaxis]) &
+                 (first_pass_lags > 10) & (first_pass_lags < lag_range - 11))
+    peak_rows, peak_idx = numpy.nonzero(is_usable)
+    peak_frames = peak_rows + (first_row + first_pass.first_frame)
+    peak_lags = first_pass_lags[peak_rows, peak_idx]
+    neighbourhood = numpy.arange(-10, 11)
+    pair_keys = (numpy.repeat(peak_frames, len(neighbourhood)) * lag_range +
+                 (peak_lags[:, numpy.newaxis] + neighbourhood).ravel())
+    # overlapping neighbourhoods are only evaluated once:
+    pair_keys = numpy.unique(pair_keys)
+    pair_frames = pair_keys // lag_range
+    pair_lags = pair_keys % lag_range
+    # skip lags that run past the end of the audio sample
+    in_audio = (pair_lags + (samples_correlated_per_lag - 1) +
+                pair_frames * samples_per_frame) < audio_length
+    pair_frames = pair_frames[in_audio]
+    pair_lags = pair_lags[in_audio]
+
+    dtype = numpy.dtype(params[0].dtype)
+    correlations = numpy.zeros(len(pair_lags), dtype=dtype)
+    if len(pair_lags) > 0:
+        audio_sample = numpy.asarray(audio[1], dtype=dtype)
+        item_size = audio_sample.strides[0]
+        all_windows = as_strided(audio_sample,
+                                 shape=(audio_length -
+                                        samples_correlated_per_lag + 1,
+                                        samples_correlated_per_lag),
+                                 strides=(item_size, item_size))
+        energy_index = params[1].energy_index
+        if energy_index is None:
+            energy_index = _get_energy_index(audio[1])
+
+        frame_starts = pair_frames * samples_per_frame
+        lag_starts = frame_starts + pair_lags
+        frame_sums, frame_squared_sums = _get_window_sums(
+            energy_index, frame_starts, samples_correlated_per_lag)
+        lag_sums, lag_squared_sums = _get_window_sums(
+            energy_index, lag_starts, samples_correlated_per_lag)
+        mean_for_window = ((1.0 / float(samples_correlated_per_lag)) *
+                           frame_sums)
+
+        # gather the frame & lag windows in blocks to bound memory use:
+        cross_products = numpy.empty(len(pair_lags), dtype=dtype)
+        block_size = _INPUT_LAG_BLOCK_SIZE
+        for start in xrange(0, len(pair_lags), block_size):
+            stop = start + block_size
+            cross_products[start:stop] = numpy.einsum(
+                'ij,ij->i', all_windows[frame_starts[start:stop]],
+                all_windows[lag_starts[start:stop]])
+
+        numerator = cross_products - mean_for_window * lag_sums
+        denominator_base = frame_squared_sums - mean_for_window * frame_sums
+        denominator_lag = (lag_squared_sums - 2.0 * mean_for_window *
+                           lag_sums + samples_correlated_per_lag *
+                           mean_for_window**2)
+        denominator = numpy.sqrt(numpy.maximum(denominator_base, 0.0) *
+                                 numpy.maximum(denominator_lag, 0.0) +
+                                 params[0].additive_constant)
+        numpy.divide(numerator, denominator, out=correlations,
+                     where=denominator > 0.0)
+
+    # find where each frame's (frame, lag) pairs start:
+    frame_bounds = numpy.searchsorted(pair_frames,
+                                      numpy.arange(first_frame,
+                                                   last_frame + 1))
+    max_correlation_vals = numpy.zeros(frame_count, dtype=dtype)
+    has_lags = numpy.diff(frame_bounds) > 0
+    if numpy.any(has_lags):
+        frame_maxes = numpy.maximum.reduceat(correlations,
+                                             frame_bounds[:-1][has_lags])
+        max_correlation_vals[has_lags] = numpy.maximum(frame_maxes, 0.0)
+    return (frame_bounds, pair_lags, correlations, max_correlation_vals)
+
+
+def _get_marked_frame_results(lag_results, params, is_firstpass=True):
+    """
+    Batched marking for the (correlations, max_correlation_vals) results of
+    _get_correlations_for_all_frames, keeping the top N per frame w/
+    argpartition.
+
+    For a one-pass run only local maxima above the threshold are marked, so
+    each peak takes up one of the max_hypotheses_per_frame slots. A 1st pass
+    run keeps every lag above the threshold like _get_marked_results does:
+    peaks of the smoothed, downsampled NCCF can sit a few lags away from the
+    matching peak at the original rate, so these lags set the range the 2nd
+    pass searches. They are refined w/ a closed form 3 point parabolic fit
+    (using 0.0 past either end of the lag range) for every frame at once and
+    mapped onto lags of the original audio.
+    """
+    correlations, max_correlation_vals = lag_results
+    frame_count, lag_range = correlations.shape
+    max_allowed_candidates = params[0].max_hypotheses_per_frame - 1
+    if lag_range == 0 or max_allowed_candidates <= 0:
+        return _get_empty_lattice(frame_count)
+
+    padded = numpy.zeros((frame_count, lag_range + 2))
+    padded[:, 1:-1] = correlations
+    prev_vals = padded[:, :-2]
+    next_vals = padded[:, 2:]
+    min_valid_correlation = (max_correlation_vals *
+                             params[0].min_acceptable_peak_val)
+    is_peak = correlations > min_valid_correlation[:, numpy.newaxis]
+
+    lags = numpy.arange(lag_range) + params[1].shortest_lag_per_frame
+    lags = numpy.repeat(lags[numpy.newaxis, :], frame_count, axis=0)
+    peak_vals = correlations
+    if is_firstpass:
+        sample_rate_ratio = params[0].sample_rate_ratio
+        # vertex of the parabola thru (k-1, k, k+1), as an offset from k:
+        curvature = prev_vals - 2.0 * correlations + next_vals
+        slope = prev_vals - next_vals
+        offsets = numpy.zeros(correlations.shape)
+        numpy.divide(0.5 * slope, curvature, out=offsets,
+                     where=curvature != 0.0)
+        interpolated_vals = correlations - 0.25 * slope * offsets
+        interpolated_lags = numpy.floor((lags + offsets) * sample_rate_ratio +
+                                        0.5)
+        # fall back to the plain lag like _extrapolate_lag_val does when the
+        # fit lands outside the lag range or gives an invalid correlation:
+        is_valid = ((interpolated_lags >= sample_rate_ratio *
+                     params[1].shortest_lag_per_frame) &
+                    (interpolated_lags <= sample_rate_ratio *
+                     params[1].longest_lag_per_frame) &
+                    (interpolated_vals >= -1.0) & (interpolated_vals <= 1.0))
+        lags = numpy.where(is_valid, interpolated_lags,
+                           numpy.floor(lags * sample_rate_ratio + 0.5))
+        peak_vals = numpy.where(is_valid, interpolated_vals, correlations)
+    else:
+        is_peak &= (correlations >= prev_vals) & (correlations > next_vals)
+    stats = params[0].stats
+    if stats is not None:
+        found_count = numpy.count_nonzero(is_peak)
+
+    # keep the highest N peaks per frame
+    if lag_range > max_allowed_candidates:
+        peak_scores = numpy.where(is_peak, peak_vals, -numpy.inf)
+        top_peaks = numpy.argpartition(-peak_scores,
+                                       max_allowed_candidates - 1,
+                                       axis=1)[:, :max_allowed_candidates]
+        is_top_peak = numpy.zeros(is_peak.shape, dtype=bool)
+        is_top_peak[numpy.arange(frame_count)[:, numpy.newaxis],
+                    top_peaks] = True
+        is_peak &= is_top_peak
+
+    # nonzero is row major, so candidates come out low to high k per frame
+    peak_frames, peak_idx = numpy.nonzero(is_peak)
+    if stats is not None:
+        _count_marked_stats(stats, 'first_pass', correlations.size,
+                            frame_count, found_count, len(peak_frames))
+    peak_lags = lags[peak_frames, peak_idx].astype(int)
+    # order each frame's candidates by lag (a stable sort, so candidates
+    # mapped onto the same lag stay in order of k):
+    order = numpy.lexsort((peak_lags, peak_frames))
+    return _get_lattice_from_arrays(peak_frames[order], peak_lags[order],
+                                    peak_vals[peak_frames, peak_idx][order],
+                                    frame_count)
+
+
+def _get_marked_sparse_results(sparse_results, params):
+    """
+    Batched marking for the sparse 2nd pass results of
+    _get_correlations_for_all_input_lags. Only local maxima above the
+    threshold are marked; a lag whose neighbour was not evaluated is compared
+    against its evaluated side only. Returns the candidate list per frame.
+    """
+    frame_bounds, lags, correlations, max_correlation_vals = sparse_results
+    frame_count = len(frame_bounds) - 1
+    max_allowed_candidates = params[0].max_hypotheses_per_frame - 1
+    if len(lags) == 0 or max_allowed_candidates <= 0:
+        return _get_empty_lattice(frame_count)
+
+    pair_frames = numpy.repeat(numpy.arange(frame_count),
+                               numpy.diff(frame_bounds))
+    # a neighbour only counts if it is the adjacent lag of the same frame:
+    is_adjacent = ((pair_frames[1:] == pair_frames[:-1]) &
+                   (lags[1:] == lags[:-1] + 1))
+    prev_vals = numpy.full(len(lags), -numpy.inf)
+    prev_vals[1:][is_adjacent] = correlations[:-1][is_adjacent]
+    next_vals = numpy.full(len(lags), -numpy.inf)
+    next_vals[:-1][is_adjacent] = correlations[1:][is_adjacent]
+    min_valid_correlation = (max_correlation_vals[pair_frames] *
+                             params[0].min_acceptable_peak_val)
+    is_peak = ((correlations > min_valid_correlation) &
+               (correlations >= prev_vals) & (correlations > next_vals))
+
+    # rank peaks by correlation within each frame, keep the highest N:
+    peak_idx = numpy.nonzero(is_peak)[0]
+    ranked_idx = peak_idx[numpy.lexsort((-correlations[peak_idx],
+                                         pair_frames[peak_idx]))]
+    ranked_frames = pair_frames[ranked_idx]
+    rank_in_frame = (numpy.arange(len(ranked_idx)) -
+                     numpy.searchsorted(ranked_frames, ranked_frames))
+    kept_idx = numpy.sort(ranked_idx[rank_in_frame < max_allowed_candidates])
+    if params[0].stats is not None:
+        _count_marked_stats(params[0].stats, 'second_pass', len(lags),
+                            frame_count, len(peak_idx), len(kept_idx))
+
+    return _get_lattice_from_arrays(pair_frames[kept_idx], lags[kept_idx],
+                                    correlations[kept_idx], frame_count)
+
+
+def _get_lattice(candidates):
+    """
+    Returns NCCF candidates as a CandidateLattice, building one from a list
+    of (lag, correlation) tuples per frame if need be. Unvoiced (0, 0.0)
+    entries are left out, since every frame of a lattice has one implicitly.
+    """
+    if (candidates is None or
+            isinstance(candidates, candidatelattice.CandidateLattice)):
+        return candidates
+    frames = []
+    lags = []
+    correlations = []
+    for frame_idx, frame_candidates in enumerate(candidates):
+        for lag, correlation in frame_candidates:
+            if lag != 0 or correlation != 0.0:
+                frames.append(frame_idx)
+                lags.append(lag)
+                correlations.append(correlation)
+    return _get_lattice_from_arrays(numpy.array(frames, dtype=int),
+                                    numpy.array(lags, dtype=int),
+                                    numpy.array(correlations, dtype=float),
+                                    len(candidates))
+
+
+def _get_lattice_from_arrays(frames, lags, correlations, frame_count):
+    # lattice of the candidates given by frame (in order of frame, each
+    # frame's in the order given), lag & correlation
+    counts = numpy.bincount(frames, minlength=max(frame_count, 1))
+    counts = counts[:frame_count]
+    first_idx = numpy.cumsum(counts) - counts
+    positions = numpy.arange(len(frames)) - first_idx[frames]
+    max_count = counts.max() if frame_count > 0 else 0
+    lattice_lags = numpy.zeros((frame_count, max_count), dtype=int)
+    lattice_lags[frames, positions] = lags
+    lattice_correlations = numpy.zeros((frame_count, max_count))
+    lattice_correlations[frames, positions] = correlations
+    return candidatelattice.CandidateLattice(lattice_lags,
+                                             lattice_correlations, counts)
+
+
+def _get_empty_lattice(frame_count):
+    # audio shorter than a frame gives a negative frame count
+    frame_count = max(frame_count, 0)
+    return candidatelattice.CandidateLattice(
+        numpy.zeros((frame_count, 0), dtype=int),
+        numpy.zeros((frame_count, 0)), numpy.zeros(frame_count, dtype=int))
+
+
+def _concatenate_lattices(lattices):
+    # joins the lattices of consecutive blocks of frames into one lattice
+    if not lattices:
+        return _get_empty_lattice(0)
+    max_count = max(lattice.lags.shape[1] for lattice in lattices)
+    frame_count = sum(len(lattice) for lattice in lattices)
+    lags = numpy.zeros((frame_count, max_count), dtype=int)
+    correlations = numpy.zeros((frame_count, max_count))
+    first_row = 0
+    for lattice in lattices:
+        last_row = first_row + len(lattice)
+        lags[first_row:last_row, :lattice.lags.shape[1]] = lattice.lags
+        correlations[first_row:last_row,
+                     :lattice.lags.shape[1]] = lattice.correlations
+        first_row = last_row
+    return candidatelattice.CandidateLattice(
+        lags, correlations,
+        numpy.concatenate([lattice.counts for lattice in lattices]),
+        lattices[0].first_frame)
+
+
+def _count_marked_stats(stats, nccf_pass, lag_count, frame_count,
+                        found_count, kept_count):
+    # work counters of a pass of the vectorized NCCF, for a RaptStats
+    stats.count(nccf_pass + '_lags', lag_count)
+    stats.count(nccf_pass + '_frames', frame_count)
+    stats.count(nccf_pass + '_candidates_found', found_count)
+    stats.count(nccf_pass + '_candidates_kept', kept_count)
+
+
+def _get_top_candidates(candidates, max_allowed_candidates):
+    # check to see if selected candidates exceed max allowed:
+    if len(candidates) > max_allowed_candidates:
+        candidates = sorted(candidates, key=lambda tup: tup[1], reverse=True)
+        returned_candidates = candidates[0:max_allowed_candidates]
+        # re-sort before returning so that it is in order of low to highest k
+        returned_candidates.sort(key=lambda tup: tup[0])
+    else:
+        returned_candidates = candidates
+
+    return returned_candidates
+
+
 # TODO: this can be used for 2nd pass - use parameter to decide 1stpass run?
 def _get_marked_results(lag_results, params, is_firstpass=True):
     # values that meet certain threshold shall be marked for consideration
@@ -384,16 +1750,7 @@ def _get_marked_results(lag_results, params, is_firstpass=True):
                 current_lag = k + params[1].shortest_lag_per_frame
                 candidates.append((current_lag, k_val))
 
-    # now check to see if selected candidates exceed max allowed:
-    if len(candidates) > max_allowed_candidates:
-        candidates.sort(key=lambda tup: tup[1], reverse=True)
-        returned_candidates = candidates[0:max_allowed_candidates]
-        # re-sort before returning so that it is in order of low to highest k
-        returned_candidates.sort(key=lambda tup: tup[0])
-    else:
-        returned_candidates = candidates
-
-    return returned_candidates
+    return _get_top_candidates(candidates, max_allowed_candidates)
 
 
 def _get_correlation(audio, frame, lag, params, is_firstpass=True):
@@ -404,19 +1761,37 @@ def _get_correlation(audio, frame, lag, params, is_firstpass=True):
     frame_start = frame * params[1].samples_per_frame
     final_correlated_sample = frame_start + samples_correlated_per_lag
 
-    frame_sum = numpysum(audio_sample[frame_start:final_correlated_sample])
-    mean_for_window = ((1.0 / float(samples_correlated_per_lag)) * frame_sum)
+    energy_index = params[1].energy_index
 
     audio_slice = audio_sample[frame_start:final_correlated_sample]
     lag_audio_slice = audio_sample[frame_start + lag:
                                    final_correlated_sample + lag]
 
+    if energy_index is not None:
+        # look up window sums/energies instead of summing the slices:
+        frame_sum, frame_energy = _get_window_sums(
+            energy_index, frame_start, samples_correlated_per_lag)
+        lag_sum, lag_energy = _get_window_sums(
+            energy_index, frame_start + lag, samples_correlated_per_lag)
+        mean_for_window = ((1.0 / float(samples_correlated_per_lag)) *
+                           float(frame_sum))
+        denominator_base = max(float(frame_energy) -
+                               mean_for_window * float(frame_sum), 0.0)
+        denominator_lag = max(float(lag_energy) - 2.0 * mean_for_window *
+                              float(lag_sum) + samples_correlated_per_lag *
+                              mean_for_window**2, 0.0)
+    else:
+        frame_sum = numpysum(audio_slice)
+        mean_for_window = ((1.0 / float(samples_correlated_per_lag)) *
+                           frame_sum)
+        denominator_base = numpysum((audio_slice -
+                                     float(mean_for_window))**2)
+        denominator_lag = numpysum((lag_audio_slice -
+                                    float(mean_for_window))**2)
+
     samples = numpysum((audio_slice - mean_for_window) *
                        (lag_audio_slice - mean_for_window))
 
-    denominator_base = numpysum((audio_slice - float(mean_for_window))**2)
-    denominator_lag = numpysum((lag_audio_slice - float(mean_for_window))**2)
-
     if is_firstpass and params[0].is_two_pass_nccf:
         denominator = math.sqrt(denominator_base * denominator_lag)
     else:
@@ -510,43 +1885,25 @@ def _extrapolate_lag_val(lag_results, min_valid_correlation,
     return extrapolated_cands
 
 
-# TODO: Try and get peaks instead of just taking the basic lag value, but
-# don't introduce wildly different lag values.
-def _get_peak_lag_val(lag_results, lag_index, params):
-    current_lag = lag_index + params[1].shortest_lag_per_frame
-    extrapolated_lag = int(round(current_lag * params[0].sample_rate_ratio))
-    return (extrapolated_lag, lag_results[lag_index])
-
-    # lag peak is the maxima of a given peak obtained by results
-    # lag_peak = lag_index + params[1].shortest_lag_per_frame
-    # x_vals = []
-    # y_vals = []
-
-    # if lag_index == 0:
-    #    y_vals = lag_results[lag_index:lag_index + 3]
-    #    x_vals = range(lag_peak, lag_peak+3)
-    # elif lag_index == (len(lag_results)-1):
-    #    y_vals = lag_results[lag_index-2:lag_index+1]
-    #    x_vals = range(lag_peak-2, lag_peak+1)
-    # else:
-    #    y_vals = lag_results[lag_index-1:lag_index+2]
-    #    x_vals = range(lag_peak-1, lag_peak+2)
-
-    # parabolic_func = numpy.polyfit(x_vals, y_vals, 2)
-    # return maxima of the parabola, shifted to appropriate lag value
-    # lag_peak = -parabolic_func[1] / (2 * parabolic_func[0])
-    # lag_peak = round(lag_peak * params[0].sample_rate_ratio)
-    # lag_peak = int(lag_peak)
-    # return (lag_peak, lag_results[lag_index])
-
-
 # Dynamic Programming / Post-Processing:
 
 # this method will obtain best candidate per frame and calc freq est per frame
 def _get_freq_estimate(nccf_results, raptparam, sample_rate):
-    results = []
     candidates = _determine_state_per_frame(nccf_results, raptparam,
                                             sample_rate)
+    return _get_candidate_freqs(candidates, sample_rate)
+
+
+def _get_freq_estimates(nccf_results, raptparam, sample_rate, config_count):
+    # same as _get_freq_estimate, for params from _get_sweep_params
+    paths = _determine_state_per_frame(nccf_results, raptparam, sample_rate,
+                                       config_count)
+    return [_get_candidate_freqs(candidates, sample_rate)
+            for candidates in paths]
+
+
+def _get_candidate_freqs(candidates, sample_rate):
+    results = []
     for candidate in candidates:
         if candidate > 0:
             results.append(sample_rate/candidate)
@@ -555,173 +1912,238 @@ def _get_freq_estimate(nccf_results, raptparam, sample_rate):
     return results
 
 
-# this method will prepare to call a recursive function that will determine
-# the optimal voicing state / candidate per frame
-def _determine_state_per_frame(nccf_results, raptparam, sample_rate):
-    candidates = []
-    # Add unvoiced candidate entry per frame (tuple w/ 0 lag, 0 correlation)
-    for result in nccf_results:
-        result.append((0, 0.0))
-
-    # now call recursive function that will calculate cost per candidate:
-    final_candidates = _select_candidates(nccf_results, raptparam, sample_rate)
-    # sort results - take the result with the lowest cost for its last item
-    final_candidates.sort(key=lambda y: y[-1][0])
-
-    # with the results, take the lag of the lowest cost candidate per frame
-    for result in final_candidates[0]:
-        # sort results - the first value, the cost, is used by default
-        candidates.append(result[1][0])
-    return candidates
-
-
-def _select_candidates(nccf_results, params, sample_rate):
-    # start by calculating frame 0:
-    max_for_frame = _select_max_correlation_for_frame(nccf_results[0])
-    frame_candidates = []
-    for candidate in nccf_results[0]:
-        best_cost = None
-        local_cost = _calculate_local_cost(candidate, max_for_frame, params,
-                                           sample_rate)
-        for initial_candidate in [(0.0, (1, 0.1)), (0.0, (0, 0.0))]:
-            delta_cost = _get_delta_cost(candidate, initial_candidate,
-                                         0, params)
-            total_cost = local_cost + delta_cost
-            if best_cost is None or total_cost <= best_cost:
-                best_cost = total_cost
-        frame_candidates.append([(best_cost, candidate)])
-    # now we have initial costs for frame 0. lets loop thru later frames
-    final_candidates = _get_next_cands(1, frame_candidates, nccf_results,
-                                       params, sample_rate)
-    return final_candidates
-
-
-def _get_next_cands(frame_idx, prev_candidates, nccf_results, params,
-                    sample_rate):
-    frame_max = _select_max_correlation_for_frame(nccf_results[frame_idx])
-    final_candidates = []
-    for candidate in nccf_results[frame_idx]:
-        best_cost = None
-        returned_path = None
-        local_cost = _calculate_local_cost(candidate, frame_max, params,
-                                           sample_rate)
-        for prev_candidate in prev_candidates:
-            delta_cost = _get_delta_cost(candidate, prev_candidate[-1],
-                                         frame_idx, params)
-            total_cost = local_cost + delta_cost
-            if best_cost is None or total_cost <= best_cost:
-                best_cost = total_cost
-                returned_path = list(prev_candidate)
-        returned_path.append((best_cost, candidate))
-        final_candidates.append(returned_path)
-    next_idx = frame_idx + 1
-    if next_idx < len(nccf_results):
-        return _get_next_cands(next_idx, final_candidates, nccf_results,
-                               params, sample_rate)
-    return final_candidates
-
-
-def _select_max_correlation_for_frame(nccf_results_frame):
-    maxval = 0.0
-    for hypothesis in nccf_results_frame:
-        if hypothesis[1] > maxval:
-            maxval = hypothesis[1]
-    return maxval
-
-
-def _calculate_local_cost(candidate, max_corr_for_frame, params, sample_rate):
-    # calculate local cost of hypothesis (d_i,j in RAPT)
-    lag_val = candidate[0]
-    correlation_val = candidate[1]
-    if lag_val == 0 and correlation_val == 0.0:
-        # unvoiced hypothesis: add VO_BIAS to largest correlation val in frame
-        cost = params.voicing_bias + max_corr_for_frame
-    else:
-        # voiced hypothesis
-        lag_weight = (float(params.lag_weight) / float(sample_rate /
-                      float(params.minimum_allowed_freq)))
-        cost = (1.0 - correlation_val * (1.0 - float(lag_weight)
-                * float(lag_val)))
-    return cost
-
-
-# determine what type of transition for candidate and previous, and return delta
-def _get_delta_cost(candidate, prev_candidate, frame_idx, params):
-    # determine what type of transition:
-    if _is_unvoiced(candidate) and _is_unvoiced(prev_candidate[1]):
-        return _get_unvoiced_to_unvoiced_cost(prev_candidate)
-    elif _is_unvoiced(candidate):
-        return _get_voiced_to_unvoiced_cost(candidate, prev_candidate,
-                                            frame_idx, params)
-    elif _is_unvoiced(prev_candidate[1]):
-        return _get_unvoiced_to_voiced_cost(candidate, prev_candidate,
-                                            frame_idx, params)
-    else:
-        return _get_voiced_to_voiced_cost(candidate, prev_candidate, params)
+def _get_chosen_correlations(lattice, candidates, freq_estimate):
+    # correlation of the candidate the DP chose for each frame (lags are
+    # unique w/in a frame), 0.0 for frames w/o an F0 estimate
+    is_chosen = ((lattice.lags ==
+                  numpy.array(candidates, dtype=int)[:, numpy.newaxis]) &
+                 (numpy.arange(lattice.lags.shape[1]) <
+                  lattice.counts[:, numpy.newaxis]))
+    correlations = numpy.where(is_chosen, lattice.correlations,
+                               0.0).sum(axis=1)
+    correlations[numpy.array(freq_estimate) == 0.0] = 0.0
+    return correlations
 
 
-# for a candidate tuple w/ lag and correlation value, determine if it is a
-# placeholder for unvoiced hypothesis
-def _is_unvoiced(candidate):
-    return candidate[0] == 0 and candidate[1] == 0.0
-
+# this method will prepare to call the function that will determine
+# the optimal voicing state / candidate per frame
+def _determine_state_per_frame(nccf_results, raptparam, sample_rate,
+                               config_count=None):
+    # call the viterbi search that will calculate cost per candidate (w/ an
+    # unvoiced candidate per frame, see _select_candidates) and return the
+    # lag of the lowest cost path's candidate per frame:
+    return _select_candidates(nccf_results, raptparam, sample_rate,
+                              config_count)
 
-# determines cost of voiced to voice delta w/ prev entry's global cost:
-def _get_voiced_to_voiced_cost(candidate, prev_entry, params):
-    numpylog = numpy.log
-    prev_cost = prev_entry[0]
-    prev_candidate = prev_entry[1]
-    # value of epsilon in voiced-to-voiced delta formula:
-    freq_jump_cost = numpylog(float(candidate[0]) / float(prev_candidate[0]))
-    transition_cost = (params.freq_weight * (params.doubling_cost +
-                       abs(freq_jump_cost - numpylog(2.0))))
-    final_cost = prev_cost + transition_cost
-    return final_cost
 
+def _select_candidates(nccf_results, params, sample_rate, config_count=None):
+    """
+    Iterative Viterbi search over the candidates of every frame (a
+    CandidateLattice, or lists of (lag, correlation) tuples per frame), plus
+    an unvoiced (0 lag, 0.0 correlation) candidate after each frame's last
+    one. Only the costs of the latest frame are kept, along w/ a frames x
+    candidates array pointing each candidate at its best previous
+    candidate, and the lowest cost path is traced back once at the end.
+    Returns that path's lag per frame.
+
+    If config_count is given, the DP params hold a value per configuration
+    (see _get_sweep_params). Every configuration is then searched at once,
+    w/ an extra configurations axis on the costs & backpointers, and a list
+    of paths is returned.
+    """
+    lattice = _get_lattice(nccf_results)
+    frame_count = len(lattice)
+    config_shape = ()
+    if config_count is not None:
+        config_shape = (config_count,)
+    if frame_count == 0:
+        if config_count is not None:
+            return [[] for i in xrange(config_count)]
+        return []
+    # the lattice w/ a column of padding, so each frame's candidates and
+    # unvoiced candidate are the first count + 1 entries of its row:
+    max_candidates = lattice.lags.shape[1] + 1
+    lags = numpy.zeros((frame_count, max_candidates), dtype=int)
+    lags[:, :-1] = lattice.lags
+    candidate_lags = lags.astype(float)
+    correlations = numpy.zeros((frame_count, max_candidates))
+    correlations[:, :-1] = lattice.correlations
+    candidate_counts = lattice.counts + 1
+    backpointers = numpy.zeros((frame_count,) + config_shape +
+                               (max_candidates,), dtype=int)
+
+    # start by calculating frame 0, against the initial states:
+    prev_costs = numpy.zeros(config_shape + (2,))
+    prev_candidates = _get_candidate_arrays([(1, 0.1), (0, 0.0)])
+    for frame_idx in xrange(0, frame_count):
+        candidate_count = candidate_counts[frame_idx]
+        frame_candidates = (candidate_lags[frame_idx, :candidate_count],
+                            correlations[frame_idx, :candidate_count])
+        prev_costs, best_prev = _get_next_cands(frame_idx, prev_costs,
+                                                prev_candidates,
+                                                frame_candidates, params,
+                                                sample_rate)
+        backpointers[frame_idx, ..., :best_prev.shape[-1]] = best_prev
+        prev_candidates = frame_candidates
+
+    if params.stats is not None:
+        _count_dp_stats(params.stats, candidate_counts, config_count or 1)
+
+    # take the path w/ the lowest cost for its last item (first one on ties)
+    # and trace it back:
+    best_states = numpy.argmin(prev_costs, axis=-1)
+    if config_count is None:
+        return _get_best_path(lags, backpointers, best_states)
+    return [_get_best_path(lags, backpointers[:, config_idx],
+                           best_states[config_idx])
+            for config_idx in xrange(config_count)]
+
+
+def _count_dp_stats(stats, candidate_counts, config_count):
+    # candidates & candidate pairs scored, counting the 2 initial states
+    state_counts = numpy.concatenate(([2], candidate_counts))
+    stats.count('dp_states', config_count * int(numpy.sum(state_counts[1:])))
+    stats.count('dp_transitions', config_count *
+                int(numpy.dot(state_counts[:-1], state_counts[1:])))
+
+
+def _get_best_path(lags, backpointers, best_state):
+    # traces the path ending in best_state back thru the frames x candidates
+    # lags, returning its lag per frame
+    candidates = [0] * len(lags)
+    for frame_idx in xrange(len(lags) - 1, -1, -1):
+        candidates[frame_idx] = int(lags[frame_idx, best_state])
+        best_state = backpointers[frame_idx, best_state]
+    return candidates
 
-# delta cost of unvoiced to unvoiced is 0, so just return previous entry's
-# global cost:
-def _get_unvoiced_to_unvoiced_cost(prev_entry):
-    return prev_entry[0] + 0.0
 
+def _get_candidate_arrays(frame_candidates):
+    # (lags, correlations) arrays for a frame's list of candidate tuples
+    lags = numpy.array([candidate[0] for candidate in frame_candidates],
+                       dtype=float)
+    correlations = numpy.array([candidate[1]
+                                for candidate in frame_candidates],
+                               dtype=float)
+    return (lags, correlations)
 
-def _get_voiced_to_unvoiced_cost(candidate, prev_entry, frame_idx, params):
-    prev_cost = prev_entry[0]
-    # prev_candidate = prev_entry[1]
-    # NOTE: Not using spec_mod / itakura distortion for delta cost
-    # delta = (params.transition_cost + (params.spec_mod_transition_cost *
-    #         _get_spec_stationarity()) + (params.amp_mod_transition_cost *
-    #         _get_rms_ratio(sample_rate)))
-    delta = (params.transition_cost + (params.amp_mod_transition_cost *
-             _get_rms_ratio(frame_idx, params)))
-    return prev_cost + delta
 
-
-def _get_unvoiced_to_voiced_cost(candidate, prev_entry, frame_idx, params):
-    prev_cost = prev_entry[0]
-    # prev_candidate = prev_entry[1]
+def _get_next_cands(frame_idx, prev_costs, prev_candidates, frame_candidates,
+                    params, sample_rate):
+    """
+    One viterbi step. Builds the frame's candidates x previous candidates
+    matrix of total costs (local cost d_i,j + delta cost from RAPT) and
+    returns the lowest cost per candidate, along w/ the index of the
+    previous candidate it came from. Ties go to the later previous
+    candidate. W/ params from _get_sweep_params (and prev_costs w/ a row per
+    configuration), the matrix, costs and indexes get a leading
+    configurations axis.
+    """
+    lags, correlations = frame_candidates
+    prev_lags = prev_candidates[0]
+    is_unvoiced = (lags == 0) & (correlations == 0.0)
+    prev_is_unvoiced = (prev_lags == 0) & (prev_candidates[1] == 0.0)
+
+    # local costs (as a column, to add to each row of transition costs):
+    frame_max = max(numpy.max(correlations), 0.0)
+    lag_weight = (params.lag_weight / float(sample_rate /
+                  float(params.minimum_allowed_freq)))
+    local_costs = numpy.where(is_unvoiced[:, numpy.newaxis],
+                              params.voicing_bias + frame_max,
+                              1.0 - correlations[:, numpy.newaxis] *
+                              (1.0 - lag_weight * lags[:, numpy.newaxis]))
+
+    # voiced to voiced transitions:
+    # (pairs w/ an unvoiced candidate give nan / inf here, replaced below)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        freq_jump_costs = numpy.log(lags[:, numpy.newaxis] /
+                                    prev_lags[numpy.newaxis, :])
+        transition_costs = (params.freq_weight * (params.doubling_cost +
+                            numpy.abs(freq_jump_costs - numpy.log(2.0))))
+    # voicing state changes only depend on the frame's rms ratio:
     # NOTE: Not using spec_mod / itakura distortion for delta cost
-    # delta = (params.transition_cost + (params.spec_mod_transition_cost *
-    #         _get_spec_stationarity()) + (params.amp_mod_transition_cost /
-    #         _get_rms_ratio(sample_rate)))
-    current_rms_ratio = _get_rms_ratio(frame_idx, params)
-
-    # TODO: figure out how to better handle rms ratio on final frame
-    if current_rms_ratio <= 0:
-        return prev_cost + params.transition_cost
-
-    delta = (params.transition_cost + (params.amp_mod_transition_cost /
-             current_rms_ratio))
-    return prev_cost + delta
-
-
-# NOTE: this method is not being utilized for transition costs
-# spectral stationarity function, denoted as S_i in the delta formulas:
-def _get_spec_stationarity():
-    # TODO: Figure out how to calculate this:
-    itakura_distortion = 1
-    return_val = 0.2 / (itakura_distortion - 0.8)
-    return return_val
+    is_unvoiced_to_voiced = (~is_unvoiced[:, numpy.newaxis] &
+                             prev_is_unvoiced[numpy.newaxis, :])
+    is_voiced_to_unvoiced = (is_unvoiced[:, numpy.newaxis] &
+                             ~prev_is_unvoiced[numpy.newaxis, :])
+    if numpy.any(is_unvoiced_to_voiced | is_voiced_to_unvoiced):
+        if (params.rms_ratios is not None and
+                frame_idx < len(params.rms_ratios)):
+            rms_ratio = params.rms_ratios[frame_idx]
+        else:
+            rms_ratio = _get_rms_ratio(frame_idx, params)
+        transition_costs = numpy.where(
+            is_voiced_to_unvoiced,
+            params.transition_cost + (params.amp_mod_transition_cost *
+                                      rms_ratio),
+            transition_costs)
+        if rms_ratio <= 0:
+            transition_costs = numpy.where(is_unvoiced_to_voiced,
+                                           params.transition_cost,
+                                           transition_costs)
+        else:
+            transition_costs = numpy.where(
+                is_unvoiced_to_voiced,
+                params.transition_cost + (params.amp_mod_transition_cost /
+                                          rms_ratio),
+                transition_costs)
+    transition_costs = numpy.where(is_unvoiced[:, numpy.newaxis] &
+                                   prev_is_unvoiced[numpy.newaxis, :], 0.0,
+                                   transition_costs)
+
+    total_costs = local_costs + (prev_costs[..., numpy.newaxis, :] +
+                                 transition_costs)
+    # argmin picks the first lowest cost, so search the previous candidates
+    # in reverse to pick the last one:
+    prev_count = prev_costs.shape[-1]
+    best_prev = (prev_count - 1) - numpy.argmin(total_costs[..., ::-1],
+                                                axis=-1)
+    costs = numpy.min(total_costs, axis=-1)
+    return (costs, best_prev)
+
+
+# RMS ratios for all frames at once, looked up by the DP instead of calling
+# _get_rms_ratio for every transition:
+def _get_rms_ratios(params, frame_count):
+    """
+    Returns the RMS ratio (see _get_rms_ratio) of every frame, w/ the
+    hanning weighted energies of all the frame windows summed in blocks by
+    _get_hanning_energy. The last few frames, whose windows run past the
+    end of the audio, go thru _get_rms_ratio itself so the end of the audio
+    is handled the same way. A frame whose previous window is silent gets
+    0.0 (like a frame w/ no samples left) rather than dividing by zero.
+    """
+    frame_count = max(frame_count, 0)
+    audio_sample = params.original_audio[1]
+    samples_per_frame = params.samples_per_frame
+    rms_offset = params.rms_offset
+    hanning_win_len = params.hanning_window_length
+    rms_ratios = numpy.zeros(frame_count)
+
+    frames = numpy.arange(frame_count)
+    curr_frame_index = frames * samples_per_frame + rms_offset
+    prev_frame_index = numpy.maximum(numpy.maximum(
+        (frames - 1) * samples_per_frame, 0) - rms_offset, 0)
+    # frames w/ the whole window inside the audio:
+    full_count = int(numpy.sum(curr_frame_index + hanning_win_len <=
+                               len(audio_sample)))
+    if hanning_win_len <= 0:
+        full_count = 0
+    if full_count > 0:
+        curr_frame_index = curr_frame_index[:full_count]
+        prev_frame_index = prev_frame_index[:full_count]
+        dtype = numpy.dtype(params.dtype)
+        curr_sums = _get_hanning_energy(audio_sample, curr_frame_index,
+                                        params.hanning_window_vals, dtype)
+        prev_sums = _get_hanning_energy(audio_sample, prev_frame_index,
+                                        params.hanning_window_vals, dtype)
+        rms_curr = numpy.sqrt(curr_sums / float(hanning_win_len))
+        rms_prev = numpy.sqrt(prev_sums / float(hanning_win_len))
+        numpy.divide(rms_curr, rms_prev, out=rms_ratios[:full_count],
+                     where=rms_prev > 0.0)
+
+    for frame_idx in xrange(full_count, frame_count):
+        rms_ratios[frame_idx] = _get_rms_ratio(frame_idx, params)
+    return rms_ratios
 
 
 # RMS ratio, denoted as rr_i in the delta formulas:
@@ -758,10 +2180,9 @@ def _get_rms_ratio(frame_idx, params):
                                hanning_win_len]
     prev_audio_slice = audio_sample[prev_frame_index:prev_frame_index +
                                     hanning_win_len]
-    # since window len may be reduced (since we are end of sample), make sure
-    # the hanning window vals match up with our slice of the audio sample
+    # since window len may be reduced (since we are end of sample), make
+    # sure the hanning window vals match up with our slice of the audio
     hanning_win_val = hanning_win_vals[:hanning_win_len]
-
     curr_sum = numpy.sum((audio_slice * hanning_win_val)**2)
     prev_sum = numpy.sum((prev_audio_slice * hanning_win_val)**2)
 
@@ -772,4 +2193,7 @@ def _get_rms_ratio(frame_idx, params):
 
     rms_curr = math.sqrt(float(curr_sum) / float(hanning_win_len))
     rms_prev = math.sqrt(float(prev_sum) / float(hanning_win_len))
+    # same as _get_rms_ratios for a silent previous window:
+    if rms_prev == 0.0:
+        return 0.0
     return (rms_curr / rms_prev)
@@ -0,0 +1,111 @@
+"""
+Batch version of the rapt function, for pitch tracking many recordings at
+once on a pool of worker processes.
+"""
+
+import multiprocessing
+
+import pyrapt
+
+
+# RAPT params & plans (by sample rate) of the batch a worker process runs:
+_batch_kwargs = {}
+_batch_plans = {}
+
+
+def rapt_batch(paths_or_arrays, workers=None, is_ordered=True, **kwargs):
+    """
+    Runs rapt on each of a list of audio inputs (wav file paths or any of
+    the in-memory inputs rapt accepts) across a pool of worker processes
+    (workers=None starts one per CPU). Inputs are handed to the pool longest
+    first so a long recording at the end of the list does not leave the
+    other workers idle at the end of the batch.
+
+    Returns an iterator over the F0 estimates of each input, in input order,
+    or w/ is_ordered=False over (input index, F0 estimates) tuples as soon
+    as each input completes. kwargs are the RAPT parameters rapt() accepts.
+    The setup for each sample rate (see RaptPlan) is built once and shared
+    by all the workers.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    params = pyrapt._setup_rapt_params(kwargs)
+    tasks = _get_batch_tasks(paths_or_arrays, params.sample_scale)
+    plans = {}
+    for index, audio_input, sample_rate, sample_scale in tasks:
+        if sample_rate not in plans:
+            plans[sample_rate] = pyrapt._get_rapt_plan(sample_rate, params)
+    return _get_batch_results(tasks, workers, is_ordered, kwargs, plans)
+
+
+def _get_batch_tasks(paths_or_arrays, sample_scale=None):
+    """
+    Returns (input index, input, sample rate, sample scale) tuples for the
+    inputs, longest input first. Only the headers of wav files are read
+    here. Inputs other than paths are sent to the workers as (sample rate,
+    samples) tuples, since buffers & file objects can't be passed to
+    another process, so the scale their wav format gives (see
+    pyrapt._get_sample_scale) is worked out here & sent along w/ them
+    (sample_scale, if given, is used for every input instead).
+    """
+    tasks = []
+    lengths = []
+    for index, audio_input in enumerate(paths_or_arrays):
+        sample_rate, audio_sample = pyrapt._read_audio(audio_input)
+        input_scale = pyrapt._get_sample_scale(audio_input, audio_sample,
+                                               sample_scale)
+        if not isinstance(audio_input, basestring):
+            audio_input = (sample_rate, audio_sample)
+        tasks.append((index, audio_input, sample_rate, input_scale))
+        lengths.append(float(len(audio_sample)) / sample_rate)
+    return sorted(tasks, key=lambda task: -lengths[task[0]])
+
+
+def _get_batch_results(tasks, workers, is_ordered, kwargs, plans):
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)),
+                                    _init_batch_worker, (kwargs, plans))
+        completed = pool.imap_unordered(_run_batch_task, tasks)
+    else:
+        # nothing to balance w/o a pool, so just go thru inputs in order:
+        completed = ((index, _get_input_results(audio_input, kwargs,
+                                                plans[sample_rate],
+                                                sample_scale))
+                     for index, audio_input, sample_rate, sample_scale
+                     in sorted(tasks))
+    try:
+        # results that completed ahead of an earlier input, by input index:
+        waiting = {}
+        next_index = 0
+        for index, results in completed:
+            if not is_ordered:
+                yield (index, results)
+                continue
+            waiting[index] = results
+            while next_index in waiting:
+                yield waiting.pop(next_index)
+                next_index += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _init_batch_worker(kwargs, plans):
+    _batch_kwargs.clear()
+    _batch_kwargs.update(kwargs)
+    _batch_plans.clear()
+    _batch_plans.update(plans)
+
+
+def _run_batch_task(task):
+    index, audio_input, sample_rate, sample_scale = task
+    return (index, _get_input_results(audio_input, _batch_kwargs,
+                                      _batch_plans[sample_rate],
+                                      sample_scale))
+
+
+def _get_input_results(audio_input, kwargs, plan, sample_scale):
+    kwargs = dict(kwargs, sample_scale=sample_scale)
+    return pyrapt.rapt(audio_input, plan=plan, **kwargs)
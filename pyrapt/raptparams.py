@@ -15,6 +15,44 @@ class Raptparams:
         # Boolean flag to run a low pass filter on the 1st pass of NCCF:
         self.is_run_filter = True
 
+        # Boolean flag to calculate NCCF for all frames and lags at once with
+        # numpy (False runs the per-lag reference implementation instead):
+        self.is_vectorized_nccf = True
+
+        # Number of worker processes to split NCCF frames across (only used
+        # w/ is_vectorized_nccf, 1 runs everything in the calling process):
+        self.workers = 1
+
+        # Number of threads to run NCCF frame blocks on, pipelining the 1st
+        # and 2nd passes (only used w/ is_vectorized_nccf, takes precedence
+        # over workers, 1 runs everything in the calling thread):
+        self.threads = 1
+
+        # Float type used for the vectorized NCCF, downsampling & RMS calcs.
+        # 'float32' halves memory traffic; see README for its accuracy vs
+        # the default 'float64'. Prefix sums always use 64 bit types:
+        self.dtype = 'float64'
+
+        # Factor the samples are multiplied by to bring them to the 16 bit
+        # PCM range the params (e.g. additive_constant) assume. None takes
+        # it from the source format: 32768 for float wav samples (which are
+        # in [-1, 1]), else 1 (arrays, PCM bytes & stream chunks as is):
+        self.sample_scale = None
+
+        # Region of interest to analyze, in seconds from the start of the
+        # audio (None analyzes from the start / to the end):
+        self.start_time = None
+        self.end_time = None
+
+        # RaptPlan w/ sample rate dependent setup to reuse (if None, or if
+        # built for another sample rate or parameters, a cached plan is
+        # used instead - see _get_rapt_plan):
+        self.plan = None
+
+        # RaptStats to report stage timings & work counters to (None skips
+        # the instrumentation - see raptstats):
+        self.stats = None
+
         # Value of "F0_max" in NCCF equation:
         self.maximum_allowed_freq = 500
 
@@ -77,3 +115,17 @@ class Raptparams:
 
         # value of h in rms ratio calc, used for + or - 20 ms offset
         self.rms_offset = None
+
+        # prefix sums over the original audio (see _get_energy_index)
+        self.energy_index = None
+
+        # rms ratio per frame, looked up when calculating voicing state
+        self.rms_ratios = None
+
+        # number of samples in the region of interest (w/o the margin read
+        # past its end), used to cut results down to the region's frames
+        self.region_length = None
+
+        # first sample of the region of interest, used for the times of the
+        # frames of a PitchTrack
+        self.region_start = None
@@ -0,0 +1,43 @@
+"""
+Simple object that stores the sample rate dependent setup of RAPT.
+"""
+
+
+class RaptPlan:
+    """
+    Simple object that stores values that only depend on the sample rate
+    and the RAPT parameters, so they can be computed once and reused for
+    every audio input w/ that sample rate. Plans are not modified once
+    built (their arrays are read only), so one plan can be shared by any
+    number of calls and threads.
+    """
+
+    def __init__(self):
+        # sample rate & RAPT parameter values the plan was built for:
+        self.key = None
+
+        # sample rate of the original audio:
+        self.sample_rate = None
+
+        # frame step size in samples (z in RAPT equations)
+        self.samples_per_frame = None
+
+        # hanning window length & values used in the RMS ratio calc
+        self.hanning_window_length = None
+        self.hanning_window_vals = None
+
+        # value of h in rms ratio calc, used for + or - 20 ms offset
+        self.rms_offset = None
+
+        # tuple of the downsampling rate, decimation factor and low pass
+        # filter taps (see _get_downsampling), None w/o a 1st pass on
+        # downsampled audio:
+        self.downsampling = None
+
+        # sample rate of the downsampled audio:
+        self.downsample_rate = None
+
+        # Nccfparams w/ the lag ranges & window sizes of each NCCF pass,
+        # keyed by (sample rate, is_firstpass). The values that depend on
+        # the audio itself (frame count, energy index) are not filled in:
+        self.nccf_params = {}
@@ -0,0 +1,70 @@
+"""
+Object that collects stage timings and work counters of a RAPT call.
+"""
+
+import collections
+import threading
+import timeit
+
+
+class RaptStats(object):
+    """
+    Collects how long each stage of a rapt call took and how much work it
+    did. Pass one as the stats param of rapt(), rapt_with_nccf() or
+    rapt_sweep() and read timings & counters afterwards, or give it a
+    callback(event, name, value) to see each event as it happens: ('start',
+    stage, None), ('stop', stage, seconds) and ('count', counter, value).
+
+    Stages are load, setup, downsample, first_pass, second_pass (or nccf
+    for both passes when they run pipelined on threads) and dp. Counters:
+    - bytes_read: bytes of audio samples read for the analyzed region
+    - <pass>_lags: (frame, lag) pairs the vectorized NCCF evaluated
+    - <pass>_frames: frames the pass marked candidates for
+    - <pass>_candidates_found / _kept: peaks above the threshold before &
+      after keeping the top max_hypotheses_per_frame - 1 per frame
+    - dp_states / dp_transitions: candidates (w/ the unvoiced one) & pairs
+      of candidates scored by the DP, summed over every configuration
+    The NCCF pass counters are only taken by the vectorized NCCF. The same
+    object can be passed to several calls to sum them up.
+    """
+
+    def __init__(self, callback=None):
+        self.timings = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        self.callback = callback
+        self._starts = {}
+        # NCCF threads mark candidates & add to the counters concurrently
+        self._lock = threading.Lock()
+
+    def start(self, stage):
+        if self.callback is not None:
+            self.callback('start', stage, None)
+        self._starts[stage] = timeit.default_timer()
+
+    def stop(self, stage):
+        seconds = timeit.default_timer() - self._starts.pop(stage)
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if self.callback is not None:
+            self.callback('stop', stage, seconds)
+
+    def count(self, counter, value):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        if self.callback is not None:
+            self.callback('count', counter, value)
+
+    def get_stats(self):
+        # plain dict of the timings & counters, e.g. to log or send as JSON
+        return {'timings': dict(self.timings),
+                'counters': dict(self.counters)}
+
+
+def run_with_stats(rapt_function, args=(), kwargs=None):
+    """
+    Calls rapt_function(*args, **kwargs) w/ a new RaptStats as its stats
+    param, returning a tuple of its results & RaptStats.get_stats(). The
+    stats are a plain dict, so this can run in another process.
+    """
+    stats = RaptStats()
+    kwargs = dict(kwargs or {}, stats=stats)
+    return (rapt_function(*args, **kwargs), stats.get_stats())
@@ -0,0 +1,348 @@
+"""
+Streaming version of the rapt function, for pitch tracking audio that
+arrives in chunks (e.g. live input) instead of as a complete wav file.
+"""
+
+import collections
+import copy
+import math
+import numpy
+from scipy.io import wavfile
+
+import pyrapt
+
+
+def rapt_blocks(wavfile_path, block_duration=10.0, max_latency=5.0,
+                **kwargs):
+    """
+    Long recording mode of rapt. The wav file is memory mapped and fed thru
+    a RaptStream block_duration seconds at a time, so working memory stays
+    the same no matter how long the recording is. This is a generator that
+    yields a list of F0 estimates for the frames decided after each block
+    (frames whose analysis windows overlap the next block wait for it), and
+    the remaining frames once the file is done.
+
+    Viterbi decisions are only made once every path agrees on them, which
+    gives the same path as one DP over the whole file. max_latency (seconds)
+    is only a memory bound for the unlikely case paths have not merged by
+    then; pass None to never force a decision.
+    """
+    sample_rate, audio_sample = wavfile.read(wavfile_path, mmap=True)
+    # blocks are scaled like rapt scales the whole file (e.g. float wavs):
+    kwargs['sample_scale'] = pyrapt._get_sample_scale(
+        wavfile_path, audio_sample, kwargs.get('sample_scale'))
+    stream = RaptStream(sample_rate, max_latency, **kwargs)
+    block_size = max(int(round(block_duration * sample_rate)), 1)
+    for block_start in xrange(0, len(audio_sample), block_size):
+        # copy the block out of the memory map before processing it:
+        block = numpy.array(audio_sample[block_start:block_start +
+                                         block_size])
+        yield stream.process(block)
+    yield stream.finish()
+
+
+class RaptStream:
+    """
+    Incremental RAPT pitch tracker. PCM chunks are passed to process() as
+    they arrive and the F0 estimates of frames that have been decided are
+    returned right away. finish() decides the remaining frames once the
+    stream ends.
+
+    The 1st pass runs on audio that is low pass filtered w/ carried filter
+    state and decimated by an integer factor, and NCCF frames are computed
+    as soon as their window plus longest lag (and RMS windows) have arrived.
+    Voicing decisions use a fixed-lag Viterbi: a frame is output once every
+    surviving path agrees on it, or once it is max_latency seconds behind
+    the newest frame (then the current best path decides). Only the samples
+    and frames that are still needed are kept, so memory use stays constant
+    for long streams. max_latency=None only outputs frames once the paths
+    agree, which gives the same path as the full DP over the candidates.
+    """
+
+    def __init__(self, sample_rate, max_latency=0.15, **kwargs):
+        self.sample_rate = sample_rate
+        self.max_latency = max_latency
+        # kwargs are the same optional RAPT parameters rapt() accepts:
+        self.params = pyrapt._setup_rapt_params(kwargs)
+        params = self.params
+        # chunks are arrays, so they're only scaled if sample_scale is given
+        # (e.g. 32768 for float samples in [-1, 1]):
+        self._sample_scale = 1
+        if params.sample_scale is not None:
+            self._sample_scale = params.sample_scale
+        if max_latency is None:
+            self._max_lag_frames = None
+        else:
+            self._max_lag_frames = max(int(round(max_latency /
+                                                 params.frame_step_size)), 0)
+
+        empty_audio = numpy.zeros(0)
+        params.plan = pyrapt._get_rapt_plan(sample_rate, params)
+        if params.is_two_pass_nccf:
+            downsample_rate, self._decimation_factor, self._filter = (
+                params.plan.downsampling)
+            if self._filter is None:
+                # w/o filtering the stream just keeps every Nth sample:
+                self._decimation_factor = pyrapt._get_decimation_factor(
+                    sample_rate, downsample_rate)
+                self._filter = numpy.ones(1)
+            self.downsample_rate = (float(sample_rate) /
+                                    self._decimation_factor)
+            self._filter_history = None
+            # samples fed to the filter so far, and the number of filtered
+            # samples still to drop before the first one centered on the
+            # start of the stream (see pyrapt._get_downsampled_audio):
+            self._filter_end = 0
+            self._filter_delay = pyrapt._get_filter_delay(self._filter)
+            self._ds_skip = self._filter_delay // self._decimation_factor
+            pyrapt._calculate_params(params, (sample_rate, empty_audio),
+                                     (self.downsample_rate, empty_audio))
+            first_nccf = pyrapt._get_nccf_params(
+                (self.downsample_rate, empty_audio), params, True)
+            second_nccf = pyrapt._get_nccf_params(
+                (sample_rate, empty_audio), params, False)
+            self._second_params = (params, second_nccf)
+            self._second_lag_range = ((second_nccf.longest_lag_per_frame - 1) -
+                                      second_nccf.shortest_lag_per_frame)
+            second_nccf.energy_index = None
+        else:
+            pyrapt._calculate_params(params, (sample_rate, empty_audio))
+            first_nccf = pyrapt._get_nccf_params((sample_rate, empty_audio),
+                                                 params, True)
+        # NCCF & RMS calcs work on the buffered audio, so they build their
+        # own prefix sums / slices rather than use an index or precomputed
+        # RMS ratios of the whole stream:
+        params.energy_index = None
+        params.rms_ratios = None
+        first_nccf.energy_index = None
+        self._first_params = (params, first_nccf)
+        self._first_lag_range = ((first_nccf.longest_lag_per_frame - 1) -
+                                 first_nccf.shortest_lag_per_frame)
+
+        # original audio buffered from sample _audio_start onwards:
+        self._audio = numpy.zeros(0)
+        self._audio_start = 0
+        self._audio_end = 0
+        # downsampled audio buffered from sample _ds_audio_start onwards:
+        self._ds_audio = numpy.zeros(0)
+        self._ds_audio_start = 0
+        # 1st pass candidates of frames _first_pass_start and later:
+        self._first_pass = pyrapt._get_empty_lattice(0)
+        self._first_pass_start = 0
+        self._next_first_frame = 0
+        self._next_frame = 0
+
+        # Viterbi state: candidates & their costs for the newest frame and,
+        # per frame not yet output, its candidates & best previous candidates
+        self._candidates = None
+        self._costs = None
+        self._history = collections.deque()
+        self._is_finished = False
+
+    def process(self, chunk):
+        """
+        Adds a chunk of PCM samples to the stream and returns a list with
+        the F0 estimates of any frames decided as a result.
+        """
+        if self._is_finished:
+            raise ValueError('Cannot add audio to a stream that has already '
+                             'been finished.')
+        # same conversion to mono & scaling as pyrapt._get_audio_data:
+        chunk = pyrapt._get_mono_audio(numpy.asarray(chunk),
+                                       self._sample_scale)
+        chunk = chunk.astype(numpy.float64)
+
+        if self.params.is_two_pass_nccf:
+            self._add_ds_audio(chunk)
+        self._audio = numpy.concatenate((self._audio, chunk))
+        self._audio_end += len(chunk)
+        return self._run_frames(False)
+
+    def finish(self):
+        """
+        Ends the stream, returning the F0 estimates of all frames that have
+        not been output yet.
+        """
+        if self._is_finished:
+            return []
+        self._is_finished = True
+        if self.params.is_two_pass_nccf:
+            # the last filtered samples are centered on the end of the
+            # stream, w/ zeros after it:
+            self._add_ds_audio(numpy.zeros(self._filter_delay))
+        return self._run_frames(True)
+
+    def _add_ds_audio(self, chunk):
+        # keep every Nth filtered sample of the stream, wherever chunks split:
+        first_kept = -self._filter_end % self._decimation_factor
+        ds_chunk, self._filter_history = pyrapt._decimate_audio(
+            chunk, self._filter, self._decimation_factor, first_kept,
+            self._filter_history)
+        self._filter_end += len(chunk)
+        skip = min(self._ds_skip, len(ds_chunk))
+        self._ds_skip -= skip
+        self._ds_audio = numpy.concatenate((self._ds_audio, ds_chunk[skip:]))
+
+    def _run_frames(self, is_final):
+        if self.params.is_two_pass_nccf:
+            self._run_first_pass(is_final)
+        frame_results = self._run_last_pass(is_final)
+        results = []
+        for lag in frame_results:
+            # same freq calc (and > 500 Hz filtering) as pyrapt.rapt:
+            freq = self.sample_rate/lag if lag > 0 else 0.0
+            results.append(0.0 if freq > 500.0 else freq)
+        return results
+
+    def _get_frame_range(self, next_frame, audio_length, nccfparam,
+                         lookahead, is_final):
+        # returns the range of frames w/ all the audio they need available.
+        # The last frames of the stream are cut off by the end of the audio
+        # like they are in a full rapt run.
+        samples_per_frame = nccfparam.samples_per_frame
+        if is_final:
+            frame_end = int(round(float(audio_length) /
+                                  float(samples_per_frame)) - 1)
+        else:
+            frame_end = ((audio_length - lookahead) // samples_per_frame) + 1
+        return (next_frame, max(frame_end, next_frame))
+
+    def _run_first_pass(self, is_final):
+        params = self._first_params
+        nccfparam = params[1]
+        samples_per_frame = nccfparam.samples_per_frame
+        ds_audio_end = self._ds_audio_start + len(self._ds_audio)
+        lookahead = (nccfparam.longest_lag_per_frame +
+                     nccfparam.samples_correlated_per_lag)
+        first_frame, last_frame = self._get_frame_range(
+            self._next_first_frame, ds_audio_end, nccfparam, lookahead,
+            is_final)
+        if last_frame > first_frame:
+            base_frame = self._ds_audio_start // samples_per_frame
+            all_frame_results = pyrapt._get_correlations_for_all_frames(
+                (self.downsample_rate, self._ds_audio),
+                self._first_lag_range, params, True,
+                (first_frame - base_frame, last_frame - base_frame))
+            self._first_pass = pyrapt._concatenate_lattices([
+                self._first_pass, pyrapt._get_marked_frame_results(
+                    all_frame_results, params, True)])
+            self._next_first_frame = last_frame
+            # drop audio only used by frames that are done:
+            trim = (last_frame - base_frame) * samples_per_frame
+            self._ds_audio = self._ds_audio[trim:]
+            self._ds_audio_start += trim
+
+    def _run_last_pass(self, is_final):
+        # runs the 2nd pass (or the only pass) & the Viterbi step for every
+        # frame that is ready, returning the lags of decided frames
+        params = self.params
+        if params.is_two_pass_nccf:
+            nccfparam = self._second_params[1]
+        else:
+            nccfparam = self._first_params[1]
+        samples_per_frame = nccfparam.samples_per_frame
+        lookahead = max(nccfparam.longest_lag_per_frame +
+                        nccfparam.samples_correlated_per_lag,
+                        params.rms_offset + params.hanning_window_length)
+        first_frame, last_frame = self._get_frame_range(
+            self._next_frame, self._audio_end, nccfparam, lookahead, is_final)
+        if params.is_two_pass_nccf and not is_final:
+            last_frame = max(min(last_frame, self._next_first_frame),
+                             first_frame)
+
+        if last_frame > first_frame:
+            base_frame = self._audio_start // samples_per_frame
+            audio = (self.sample_rate, self._audio)
+            frame_range = (first_frame - base_frame, last_frame - base_frame)
+            if params.is_two_pass_nccf:
+                # 1st pass candidates, for frames relative to the buffered
+                # audio:
+                first_pass = self._first_pass.get_frames(
+                    first_frame - self._first_pass_start,
+                    last_frame - self._first_pass_start, frame_range[0])
+                sparse_results = pyrapt._get_correlations_for_all_input_lags(
+                    audio, first_pass, self._second_lag_range,
+                    self._second_params, frame_range)
+                candidates = pyrapt._get_marked_sparse_results(
+                    sparse_results, self._second_params)
+            else:
+                all_frame_results = pyrapt._get_correlations_for_all_frames(
+                    audio, self._first_lag_range, self._first_params, True,
+                    frame_range)
+                candidates = pyrapt._get_marked_frame_results(
+                    all_frame_results, self._first_params, False)
+
+            # RMS ratios are taken from the buffered audio as well:
+            rms_params = copy.copy(params)
+            rms_params.original_audio = audio
+            for i, frame_candidates in enumerate(candidates):
+                self._add_frame(frame_candidates, frame_range[0] + i,
+                                rms_params)
+            self._next_frame = last_frame
+
+            # keep the audio that later frames & their RMS windows need:
+            margin = 1 + int(math.ceil(float(params.rms_offset) /
+                                       float(samples_per_frame)))
+            trim = max((last_frame - margin - base_frame) *
+                       samples_per_frame, 0)
+            self._audio = self._audio[trim:]
+            self._audio_start += trim
+            if params.is_two_pass_nccf:
+                self._first_pass = self._first_pass.get_frames(
+                    last_frame - self._first_pass_start, len(self._first_pass))
+                self._first_pass_start = last_frame
+
+        return self._commit_frames(is_final)
+
+    def _add_frame(self, candidates, frame_idx, params):
+        # Viterbi step w/ the same costs as pyrapt._select_candidates
+        candidates = candidates + [(0, 0.0)]
+        candidate_arrays = pyrapt._get_candidate_arrays(candidates)
+        if self._costs is None:
+            prev_costs = numpy.zeros(2)
+            prev_candidates = pyrapt._get_candidate_arrays([(1, 0.1),
+                                                            (0, 0.0)])
+        else:
+            prev_costs = self._costs
+            prev_candidates = self._candidates
+        costs, best_prev = pyrapt._get_next_cands(frame_idx, prev_costs,
+                                                  prev_candidates,
+                                                  candidate_arrays, params,
+                                                  self.sample_rate)
+        if self._costs is None:
+            # frame 0 has no real previous frame to trace back to:
+            best_prev = None
+        self._candidates = candidate_arrays
+        self._costs = costs
+        self._history.append((candidates, best_prev))
+
+    def _commit_frames(self, is_final):
+        # traces back from the newest frame: frames where all paths have
+        # merged are decided, as are frames older than the max latency
+        history = self._history
+        if not history:
+            return []
+        # first lowest cost wins, like the sort in _determine_state_per_frame
+        best_state = numpy.argmin(self._costs)
+        states = set(xrange(len(self._costs)))
+        best_path = [None] * len(history)
+        commit_count = 0
+        for frame in xrange(len(history) - 1, -1, -1):
+            best_path[frame] = best_state
+            if len(states) == 1 and commit_count == 0:
+                commit_count = frame + 1
+            best_prev = history[frame][1]
+            if frame > 0:
+                states = set(best_prev[state] for state in states)
+                best_state = best_prev[best_state]
+
+        if is_final:
+            commit_count = len(history)
+        elif self._max_lag_frames is not None:
+            commit_count = max(commit_count,
+                               len(history) - self._max_lag_frames)
+        lags = []
+        for frame in xrange(commit_count):
+            candidates = history.popleft()[0]
+            lags.append(candidates[best_path[frame]][0])
+        return lags
@@ -5,3 +5,7 @@ class Version(object):
 
     def __init__(self, num):
         super(Version, self).__setattr__('number', num)
+
+
+# version of pyrapt (used by setup.py, and to key cached results)
+version = Version('0.0.1')
@@ -0,0 +1,232 @@
+"""
+Cache of pitch tracking results for the RPC server, so requests for the
+same recording w/ the same parameters don't rerun the analysis.
+"""
+
+import cPickle
+import collections
+import hashlib
+import numpy
+import os
+import tempfile
+import threading
+
+from pyrapt import pyrapt
+from pyrapt.version import version
+
+
+# params that change how results are computed but not the results:
+_NON_RESULT_PARAMS = ('workers', 'threads', 'plan', 'stats')
+
+# bytes of audio hashed at a time
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# number of file content hashes remembered
+_FILE_HASH_COUNT = 4096
+
+
+def _get_algorithm_hash():
+    # hash of the pyrapt sources (w/ the version), so results computed by
+    # other code aren't returned even if the version number wasn't bumped
+    algorithm_hash = hashlib.sha1(version.number)
+    source_dir = os.path.dirname(os.path.abspath(pyrapt.__file__))
+    for file_name in sorted(os.listdir(source_dir)):
+        if file_name.endswith('.py'):
+            with open(os.path.join(source_dir, file_name), 'rb') as source:
+                algorithm_hash.update(file_name)
+                algorithm_hash.update(source.read())
+    return algorithm_hash.hexdigest()
+
+
+_ALGORITHM_HASH = _get_algorithm_hash()
+
+
+class ResultCache(object):
+    """
+    Results of pyrapt functions keyed by a hash of the audio contents,
+    the full set of RAPT params in effect (defaults included) and a hash of
+    the pyrapt sources & version. Results are kept pickled in memory, least
+    recently used dropped first once they take up more than max_bytes. If a
+    cache_dir is given, results are also written there and read back on a
+    miss in memory, so they survive restarts. The files there are dropped
+    the same way once they take up more than max_disk_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None,
+                 max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._result_bytes = 0
+        # size of each results file in cache_dir, least recently used first:
+        self._disk_files = collections.OrderedDict()
+        self._disk_bytes = 0
+        # content hash per (path, size, mtime), so repeat requests for a file
+        # that hasn't changed don't read it again:
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            self._load_disk_files()
+
+    def get_results(self, rapt_function, wavfile_path, **kwargs):
+        """
+        Returns rapt_function(wavfile_path, **kwargs), from the cache if the
+        same audio has been analyzed w/ the same function & params before.
+        Besides paths, the audio can be any in-memory input rapt accepts
+        other than a file object.
+        """
+        key = self.get_key(rapt_function, wavfile_path, kwargs)
+        results = self.get_cached_results(key)
+        if results is None:
+            results = rapt_function(wavfile_path, **kwargs)
+            self.add_results(key, results)
+        return results
+
+    def get_cached_results(self, key):
+        # results stored under the key (see get_key), or None on a miss
+        pickled_results = self._get_pickled_results(key)
+        if pickled_results is None:
+            return None
+        return cPickle.loads(pickled_results)
+
+    def add_results(self, key, results):
+        self._add_results(key, cPickle.dumps(results,
+                                             cPickle.HIGHEST_PROTOCOL))
+
+    def get_key(self, rapt_function, wavfile_path, kwargs):
+        params = vars(pyrapt._setup_rapt_params(kwargs))
+        param_items = sorted((name, value) for name, value in params.items()
+                             if name not in _NON_RESULT_PARAMS)
+        key = repr((rapt_function.__name__, self._get_audio_hash(wavfile_path),
+                    param_items, _ALGORITHM_HASH))
+        return hashlib.sha1(key).hexdigest()
+
+    def get_stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'entries': len(self._results),
+                    'bytes': self._result_bytes,
+                    'disk_entries': len(self._disk_files),
+                    'disk_bytes': self._disk_bytes}
+
+    def _get_audio_hash(self, audio_input):
+        if isinstance(audio_input, basestring):
+            return self._get_file_hash(audio_input)
+        if isinstance(audio_input, tuple):
+            sample_rate, audio_sample = pyrapt._read_audio(audio_input)
+            audio_sample = numpy.ascontiguousarray(audio_sample)
+            content_hash = hashlib.sha1(repr((sample_rate,
+                                              audio_sample.dtype.str,
+                                              audio_sample.shape)))
+            content_hash.update(audio_sample)
+            return content_hash.hexdigest()
+        return hashlib.sha1(audio_input).hexdigest()
+
+    def _get_file_hash(self, wavfile_path):
+        file_stat = os.stat(wavfile_path)
+        file_key = (os.path.abspath(wavfile_path), file_stat.st_size,
+                    file_stat.st_mtime)
+        file_hash = self._file_hashes.get(file_key)
+        if file_hash is None:
+            content_hash = hashlib.sha1()
+            with open(wavfile_path, 'rb') as wav_file:
+                block = wav_file.read(_HASH_BLOCK_SIZE)
+                while block:
+                    content_hash.update(block)
+                    block = wav_file.read(_HASH_BLOCK_SIZE)
+            file_hash = content_hash.hexdigest()
+            if len(self._file_hashes) >= _FILE_HASH_COUNT:
+                self._file_hashes.clear()
+            self._file_hashes[file_key] = file_hash
+        return file_hash
+
+    def _get_pickled_results(self, key):
+        with self._lock:
+            pickled_results = self._results.pop(key, None)
+            if pickled_results is not None:
+                self._results[key] = pickled_results
+                self.hits += 1
+                return pickled_results
+        pickled_results = self._read_results(key)
+        with self._lock:
+            if pickled_results is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+        if pickled_results is not None:
+            self._add_results(key, pickled_results, is_write=False)
+        return pickled_results
+
+    def _add_results(self, key, pickled_results, is_write=True):
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = pickled_results
+                self._result_bytes += len(pickled_results)
+            while self._result_bytes > self.max_bytes and self._results:
+                self._result_bytes -= len(self._results.popitem(
+                    last=False)[1])
+        if is_write:
+            self._write_results(key, pickled_results)
+
+    def _read_results(self, key):
+        if self.cache_dir is None:
+            return None
+        cache_path = self._get_cache_path(key)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                pickled_results = cache_file.read()
+            # the file's mtime keeps its place in the LRU order on restarts:
+            os.utime(cache_path, None)
+        except (IOError, OSError):
+            return None
+        self._add_disk_file(key, len(pickled_results))
+        return pickled_results
+
+    def _write_results(self, key, pickled_results):
+        if self.cache_dir is None:
+            return
+        # write to a temp file & rename it, so readers never see part of one:
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(temp_fd, 'wb') as temp_file:
+            temp_file.write(pickled_results)
+        os.rename(temp_path, self._get_cache_path(key))
+        self._add_disk_file(key, len(pickled_results))
+
+    def _load_disk_files(self):
+        # results files left by earlier runs, oldest used first
+        disk_files = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.p'):
+                file_stat = os.stat(os.path.join(self.cache_dir, file_name))
+                disk_files.append((file_stat.st_mtime, file_name[:-2],
+                                   file_stat.st_size))
+        for mtime, key, size in sorted(disk_files):
+            self._add_disk_file(key, size)
+
+    def _add_disk_file(self, key, size):
+        # marks the file as the most recently used, then deletes the least
+        # recently used ones past max_disk_bytes
+        removed_keys = []
+        with self._lock:
+            self._disk_bytes -= self._disk_files.pop(key, 0)
+            self._disk_files[key] = size
+            self._disk_bytes += size
+            while self._disk_bytes > self.max_disk_bytes and self._disk_files:
+                removed_key, removed_size = self._disk_files.popitem(
+                    last=False)
+                self._disk_bytes -= removed_size
+                removed_keys.append(removed_key)
+        for removed_key in removed_keys:
+            try:
+                os.remove(self._get_cache_path(removed_key))
+            except OSError:
+                pass
+
+    def _get_cache_path(self, key):
+        return os.path.join(self.cache_dir, key + '.p')
@@ -5,36 +5,175 @@ vocal pitch. See the tonetrainer github repo for more details:
 https://github.com/dgaspari/tonetrainer
 """
 
+import argparse
+import json
+import os
+
+import gevent.threadpool
 import zerorpc
 from pyrapt import pyrapt
+from pyrapt import raptstats
+
+import resultcache
+import workerpool
 
 
 class Pyrapt_RPC(object):
-    def raptforfile(self, filename):
+    def __init__(self, cache=None, pool=None, timeout=None,
+                 is_log_stats=False):
+        if cache is None:
+            cache = resultcache.ResultCache()
+        if pool is None:
+            pool = workerpool.AnalysisPool()
+        self.cache = cache
+        self.pool = pool
+        # seconds an analysis may take (None for no limit) unless its
+        # request gives its own timeout
+        self.timeout = timeout
+        # log stage timings & work counters of each analysis (see raptstats)
+        self.is_log_stats = is_log_stats
+        # threads that wait for the worker processes, so a request waiting
+        # on its analysis doesn't block the gevent loop other clients use:
+        self._waiters = gevent.threadpool.ThreadPool(pool.workers +
+                                                     pool.queue_depth)
+
+    def raptforfile(self, filename, timeout=None):
+        # each request can pass a timeout (in seconds, 0 for no limit) to use
+        # instead of the server's, as in the other rapt calls
+        return self._rapt(filename, timeout=timeout)
+
+    def raptforaudio(self, audio, timeout=None):
+        # audio is the contents of a wav file, so no temp file is needed. The
+        # str is hashed thru a buffer & goes to the worker as is (buffers
+        # can't be pickled), where _rapt_wav_data parses it in place
+        return self._rapt(audio, _rapt_wav_data, buffer(audio), timeout)
+
+    def cachestats(self):
+        # hit / miss counters & size of the result cache
+        return self.cache.get_stats()
+
+    def poolstats(self):
+        # worker count, queue depth & number of analyses running or queued
+        return self.pool.get_stats()
+
+    def testraptforfile(self, filename, tcost, dcost, addconst, vobias, lagwt,
+                        freqwt, numcands, istwopass, isfilter, timeout=None):
+        print('running TEST pyrapt.rapt...')
+        results = self._get_results(pyrapt.rapt_with_nccf, filename,
+                                    timeout=timeout, transition_cost=tcost,
+                                    doubling_cost=dcost,
+                                    additive_constant=addconst,
+                                    voicing_bias=vobias, lag_weight=lagwt,
+                                    freq_weight=freqwt,
+                                    max_hypotheses_per_frame=numcands,
+                                    is_two_pass_nccf=istwopass,
+                                    is_run_filter=isfilter)
+        print('finished running pyrapt.rapt...')
+        return results
+
+    def testraptconfigsforfile(self, filename, dpconfigs, addconst, numcands,
+                               istwopass, isfilter, timeout=None):
+        # dpconfigs is a list of dicts of DP params (e.g. transition_cost,
+        # doubling_cost, voicing_bias) - NCCF only runs once for all of them
+        print('running TEST pyrapt.rapt_sweep...')
+        results = self._run(pyrapt.rapt_sweep, (filename, dpconfigs),
+                            {'additive_constant': addconst,
+                             'max_hypotheses_per_frame': numcands,
+                             'is_two_pass_nccf': istwopass,
+                             'is_run_filter': isfilter}, timeout)
+        print('finished running pyrapt.rapt_sweep...')
+        return results
+
+    def _rapt(self, audio_input, rapt_function=pyrapt.rapt, key_input=None,
+              timeout=None):
         print('running pyrapt.rapt...')
         # freq_map = pyrapt.rapt(filename, doubling_cost=30.0,
         #                       max_hypotheses_per_frame=35)
-        freq_map = pyrapt.rapt(filename, max_hypotheses_per_frame=25,
-                               transition_cost=0.5, doubling_cost=30.0)
+        freq_map = self._get_results(rapt_function, audio_input, key_input,
+                                     timeout, max_hypotheses_per_frame=25,
+                                     transition_cost=0.5, doubling_cost=30.0)
         print('finished running pyrapt.rapt...')
         return freq_map
 
-    def testraptforfile(self, filename, tcost, dcost, addconst, vobias, lagwt,
-                        freqwt, numcands, istwopass, isfilter):
-        print('running TEST pyrapt.rapt...')
-        results = pyrapt.rapt_with_nccf(filename, transition_cost=tcost,
-                                        doubling_cost=dcost,
-                                        additive_constant=addconst,
-                                        voicing_bias=vobias, lag_weight=lagwt,
-                                        freq_weight=freqwt,
-                                        max_hypotheses_per_frame=numcands,
-                                        is_two_pass_nccf=istwopass,
-                                        is_run_filter=isfilter)
-        print('finished running pyrapt.rapt...')
+    def _get_results(self, rapt_function, audio_input, key_input=None,
+                     timeout=None, **kwargs):
+        # cached results, or else run the analysis & cache its results. The
+        # cache key is based on key_input if given, else audio_input
+        if key_input is None:
+            key_input = audio_input
+        key = self.cache.get_key(rapt_function, key_input, kwargs)
+        results = self.cache.get_cached_results(key)
+        if results is None:
+            results = self._run(rapt_function, (audio_input,), kwargs,
+                                timeout)
+            self.cache.add_results(key, results)
+        return results
+
+    def _run(self, function, args, kwargs, timeout=None):
+        if not self.is_log_stats:
+            return self._run_in_pool(function, args, kwargs, timeout)
+        results, stats = self._run_in_pool(raptstats.run_with_stats,
+                                           (function, args, kwargs), None,
+                                           timeout)
+        print('%s stats: %s' % (function.__name__,
+                                json.dumps(stats, sort_keys=True)))
         return results
 
-print('Using ZeroRPC to listen on port 4242 for pitch tracker requests...')
-server = zerorpc.Server(Pyrapt_RPC())
-# TODO: specify binding in config to control who talks to this server:
-server.bind("tcp://0.0.0.0:4242")
-server.run()
+    def _run_in_pool(self, function, args, kwargs=None, timeout=None):
+        # raises workerpool.ServerBusyError right away if the queue is full
+        if timeout is None:
+            timeout = self.timeout
+        async_result = self.pool.submit(function, args, kwargs)
+        return self._waiters.apply(self.pool.get_result,
+                                   (async_result, timeout or None))
+
+
+def _rapt_wav_data(wav_data, **kwargs):
+    # rapt for wav contents in a str (which rapt would take as a path), w/o
+    # copying them
+    return pyrapt.rapt(buffer(wav_data), **kwargs)
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(
+        description='ZeroRPC server for pyrapt pitch tracker requests')
+    parser.add_argument('--bind', default='tcp://0.0.0.0:4242',
+                        help='address to listen on (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--queue-depth', type=int, default=16,
+                        help='requests that can wait for a free worker '
+                        'before new ones are turned away as busy '
+                        '(default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='seconds an analysis may take unless its '
+                        'request gives a timeout, 0 for no limit (default: '
+                        '%(default)s)')
+    parser.add_argument('--cache-dir',
+                        default=os.environ.get('PYRAPT_CACHE_DIR'),
+                        help='directory to keep cached results in across '
+                        'restarts (default: $PYRAPT_CACHE_DIR, or memory '
+                        'only)')
+    parser.add_argument('--cache-dir-mb', type=int, default=1024,
+                        help='megabytes of results kept in --cache-dir, '
+                        'least recently used removed first (default: '
+                        '%(default)s)')
+    parser.add_argument('--log-stats', action='store_true',
+                        help='log stage timings & work counters of each '
+                        'analysis')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _get_args()
+    # start the worker processes before zerorpc sets up gevent & zeromq:
+    pool = workerpool.AnalysisPool(args.workers, args.queue_depth)
+    cache = resultcache.ResultCache(
+        cache_dir=args.cache_dir,
+        max_disk_bytes=args.cache_dir_mb * 1024 * 1024)
+    rpc = Pyrapt_RPC(cache, pool, args.timeout or None, args.log_stats)
+    print('Using ZeroRPC to listen on %s for pitch tracker requests...' %
+          args.bind)
+    server = zerorpc.Server(rpc)
+    server.bind(args.bind)
+    server.run()
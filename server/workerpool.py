@@ -0,0 +1,113 @@
+"""
+Pool of worker processes that runs pitch tracking analyses for the RPC
+server, so a slow analysis doesn't hold up other clients and requests are
+spread across every core.
+"""
+
+import cPickle
+import multiprocessing
+import threading
+
+
+class ServerBusyError(Exception):
+    """
+    Raised when a request arrives while the pool & its queue are full.
+    """
+    pass
+
+
+class AnalysisTimeoutError(Exception):
+    """
+    Raised when an analysis doesn't finish within the request's timeout.
+    """
+    pass
+
+
+class AnalysisPool(object):
+    """
+    Runs analyses on a pool of worker processes (workers=None starts one per
+    CPU). At most queue_depth requests wait for a free worker; requests past
+    that fail right away w/ ServerBusyError rather than piling up. An
+    analysis whose request timed out still holds its worker (and its place
+    in the queue) until it finishes. Each request gives its own timeout to
+    get_result / run.
+    """
+
+    def __init__(self, workers=None, queue_depth=16):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.queue_depth = queue_depth
+        # number of analyses running or queued, freed up by _free_place
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = multiprocessing.Pool(workers)
+
+    def submit(self, function, args=(), kwargs=None):
+        """
+        Queues function(*args, **kwargs) on a worker and returns the async
+        result to pass to get_result.
+        """
+        # the pool only calls callbacks for tasks that return, so the task is
+        # pickled here (errors pickling it are raised to the caller) & its
+        # results in _run_task, so every task that gets queued frees its place
+        task = cPickle.dumps((function, args, kwargs or {}),
+                             cPickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._pending >= self.workers + self.queue_depth:
+                raise ServerBusyError('Server is busy: %d analyses are '
+                                      'running or queued. Try again later.' %
+                                      self._pending)
+            async_result = self._pool.apply_async(
+                _run_task, (task,), callback=self._free_place)
+            self._pending += 1
+            return async_result
+
+    def get_result(self, async_result, timeout=None):
+        """
+        Waits up to timeout seconds (None waits as long as it takes) for the
+        result of a submitted analysis. Errors raised by the analysis are
+        raised here.
+        """
+        try:
+            is_error, value = cPickle.loads(async_result.get(timeout))
+        except multiprocessing.TimeoutError:
+            raise AnalysisTimeoutError('Analysis did not finish within %s '
+                                       'seconds.' % timeout)
+        if is_error:
+            raise value
+        return value
+
+    def run(self, function, args=(), kwargs=None, timeout=None):
+        return self.get_result(self.submit(function, args, kwargs), timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queue_depth': self.queue_depth,
+                    'pending': self._pending}
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def _free_place(self, pickled_result):
+        # called by the pool (w/ the result of _run_task) when a task is done
+        with self._lock:
+            self._pending -= 1
+
+
+def _run_task(task):
+    # errors raised by the analysis are returned & raised by get_result. The
+    # results are returned pickled, so results or errors that can't be
+    # pickled are returned as errors too instead of failing in the pool
+    function, args, kwargs = cPickle.loads(task)
+    try:
+        result = (False, function(*args, **kwargs))
+    except Exception as error:
+        result = (True, error)
+    try:
+        return cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+    except Exception as error:
+        return cPickle.dumps((True, TypeError('Analysis result could not be '
+                                              'pickled: %s' % error)),
+                             cPickle.HIGHEST_PROTOCOL)
@@ -1,8 +1,8 @@
 import setuptools
-from pyrapt.version import Version
+from pyrapt.version import version
 
 setuptools.setup(name='pyrapt',
-    version=Version('0.0.1').number,
+    version=version.number,
     description='PyRapt - Python implementation of RAPT (Robust Algorithm for Pitch Tracking)',
     long_description=open('README.md').read().strip(),
     author='Daniel Gaspari',
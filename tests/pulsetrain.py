@@ -0,0 +1,17 @@
+"""
+Test audio shared by the test modules
+"""
+import numpy
+
+
+def get_pulse_train(length=8000, period=40, seed=None, state=None):
+    """
+    Returns int16 samples of a pulse train w/ a bit of noise (at 8 kHz the
+    default period of 40 samples is 200 Hz). Pass a numpy RandomState
+    instead of a seed to draw several inputs from one seed.
+    """
+    if state is None:
+        state = numpy.random.RandomState(seed)
+    audio = state.randint(-50, 50, length)
+    audio[::period] += 8000
+    return audio.astype(numpy.int16)
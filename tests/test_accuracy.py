@@ -0,0 +1,103 @@
+"""
+Unit tests for the golden output accuracy harness
+"""
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+from scipy.io import wavfile
+
+from benchmarks import accuracy
+from tests import pulsetrain
+
+
+class TestAccuracy(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        state = numpy.random.RandomState(4)
+        self.paths = []
+        for name, period in [('a.wav', 40), ('b.wav', 64)]:
+            self.paths.append(os.path.join(self.temp_dir, 'wavs', name))
+            if not os.path.isdir(os.path.dirname(self.paths[-1])):
+                os.mkdir(os.path.dirname(self.paths[-1]))
+            wavfile.write(self.paths[-1], 8000,
+                          pulsetrain.get_pulse_train(period=period,
+                                                     state=state))
+        self.reference_dir = os.path.join(self.temp_dir, 'golden')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_compare_engine(self):
+        info = accuracy.record_references(self.paths, self.reference_dir,
+                                          doubling_cost=0.5)
+        self.assertEqual('default', info['engine'])
+        with open(os.path.join(self.reference_dir,
+                               accuracy.REFERENCE_INFO)) as info_file:
+            self.assertEqual(self.paths, json.load(info_file)['paths'])
+
+        results = accuracy.compare_engine(self.reference_dir, engine='threads',
+                                          doubling_cost=0.5)
+        self.assertTrue(results['is_passed'])
+        summary = results['summary']
+        self.assertEqual(1.0, summary['voicing_agreement'])
+        self.assertEqual(0.0, summary['gross_error_rate'])
+        self.assertEqual(0.0, summary['fine_error_cents'])
+        self.assertEqual(1.0, summary['candidate_recall'])
+        self.assertEqual(0, summary['frame_count_diff'])
+        self.assertGreater(summary['speedup'], 0.0)
+        self.assertEqual(2, len(results['files']))
+        self.assertEqual(198, sum(item['counts']['frames']
+                                  for item in results['files']))
+
+    def test_compare_engine_failures(self):
+        accuracy.record_references(self.paths[:1], self.reference_dir)
+        results = accuracy.compare_engine(
+            self.reference_dir, tolerances={'min_voicing_agreement': 1.01})
+        self.assertFalse(results['is_passed'])
+        self.assertEqual(['min_voicing_agreement'], results['failures'])
+        with self.assertRaises(ValueError):
+            accuracy.compare_engine(self.reference_dir, [])
+
+    def test_get_accuracy_counts(self):
+        reference = {'f0': numpy.array([0.0, 100.0, 200.0, 200.0, 100.0]),
+                     'lattice_counts': numpy.array([0, 2, 1, 1, 1]),
+                     'lattice_lags': numpy.array([[0, 0], [40, 80], [20, 0],
+                                                  [20, 0], [40, 0]]),
+                     'lattice_correlations': numpy.array([
+                         [0.0, 0.0], [0.9, 0.5], [0.8, 0.0], [0.8, 0.0],
+                         [0.7, 0.0]])}
+        f0 = numpy.array([0.0, 100.0, 400.0, 200.0 * 2 ** (12 / 1200.0),
+                          0.0, 120.0])
+        lattice = accuracy._get_lattice_arrays([
+            [(0, 0.0)], [(41, 0.85), (0, 0.0)], [(10, 0.9)], [(20, 0.75)],
+            [], [(33, 0.4)]])
+        counts = accuracy._get_accuracy_counts(reference, f0, lattice)
+        self.assertEqual(5, counts['frames'])
+        self.assertEqual(1, counts['frame_count_diff'])
+        self.assertEqual(4, counts['voicing_agreed'])
+        self.assertEqual(3, counts['both_voiced'])
+        self.assertEqual(1, counts['gross_errors'])
+        self.assertAlmostEqual(12.0, counts['fine_error_cents_total'])
+        self.assertAlmostEqual(12.0, counts['fine_error_cents_max'])
+        # 40 ~ 41 & 20 = 20 match, 80, 20 (vs 10) & 40 (vs nothing) don't:
+        self.assertEqual(5, counts['reference_candidates'])
+        self.assertEqual(2, counts['matched_candidates'])
+        self.assertAlmostEqual(0.05, counts['correlation_diff_max'])
+
+        counts.update({'reference_seconds': 2.0, 'seconds': 0.5})
+        metrics = accuracy._get_metrics(counts)
+        self.assertEqual(0.8, metrics['voicing_agreement'])
+        self.assertAlmostEqual(1.0 / 3.0, metrics['gross_error_rate'])
+        self.assertAlmostEqual(6.0, metrics['fine_error_cents'])
+        self.assertEqual(0.4, metrics['candidate_recall'])
+        self.assertEqual(4.0, metrics['speedup'])
+        self.assertEqual(['min_voicing_agreement', 'max_gross_error_rate',
+                          'max_fine_error_cents', 'min_candidate_recall',
+                          'max_frame_count_diff'],
+                         accuracy._get_failures(metrics,
+                                                accuracy.TOLERANCES))
@@ -0,0 +1,71 @@
+"""
+Unit tests for the per stage benchmark suite
+"""
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+from scipy.io import wavfile
+
+from benchmarks import benchmark
+from pyrapt import pyrapt
+from tests import pulsetrain
+
+
+class TestBenchmark(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.temp_dir, 'more'))
+        state = numpy.random.RandomState(3)
+        self.paths = []
+        for name, length in [('b.wav', 8000), ('more/a.WAV', 4000)]:
+            self.paths.append(os.path.join(self.temp_dir, name))
+            wavfile.write(self.paths[-1], 8000,
+                          pulsetrain.get_pulse_train(length, state=state))
+        open(os.path.join(self.temp_dir, 'notes.txt'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_wav_paths(self):
+        self.assertEqual(sorted(self.paths),
+                         benchmark.get_wav_paths([self.temp_dir]))
+
+    def test_run_benchmark(self):
+        results = benchmark.run_benchmark(self.paths, repeat=2,
+                                          doubling_cost=0.5)
+        self.assertEqual({'doubling_cost': 0.5}, results['run']['params'])
+        self.assertEqual(list(benchmark.STAGES), results['stages'].keys())
+        for item, path in zip(results['files'], self.paths):
+            self.assertEqual(len(pyrapt.rapt(path, doubling_cost=0.5)),
+                             item['frames'])
+            self.assertAlmostEqual(sum(item['seconds'].values()),
+                                   item['total'])
+        summary = results['summary']
+        self.assertEqual(2, summary['files'])
+        self.assertEqual(1.5, summary['duration'])
+        self.assertEqual(148, summary['frames'])
+        self.assertAlmostEqual(summary['seconds'] / 1.5,
+                               summary['real_time_factor'])
+        self.assertAlmostEqual(1.0, sum(stage['share'] for stage in
+                                        results['stages'].values()))
+        self.assertLessEqual(summary['seconds_p50'], summary['seconds_p99'])
+        self.assertEqual(24000, summary['counters']['bytes_read'])
+        # the results are written out as JSON:
+        self.assertEqual(148, json.loads(json.dumps(results))['summary'][
+            'frames'])
+
+    def test_run_benchmark_one_pass(self):
+        results = benchmark.run_benchmark(self.paths[:1],
+                                          is_two_pass_nccf=False)
+        self.assertEqual(0.0, results['stages']['second_pass']['seconds'])
+        self.assertEqual(None,
+                         results['stages']['second_pass']['frames_per_sec'])
+
+    def test_run_benchmark_threads(self):
+        with self.assertRaises(ValueError):
+            benchmark.run_benchmark(self.paths, threads=2)
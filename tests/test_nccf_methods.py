@@ -57,11 +57,52 @@ class TestNccfMethods(TestCase):
         sample_rate = 2004
         audio_data = numpy.full(3346, 5.0)
         params = raptparams.Raptparams()
+        params.is_vectorized_nccf = False
         candidates = pyrapt._first_pass_nccf((sample_rate, audio_data), params)
         self.assertEqual(166, len(candidates))
         self.assertEqual(3, len(candidates[0]))
         self.assertEqual(0.8, candidates[34][1][1])
 
+    @patch('pyrapt.pyrapt._get_marked_frame_results')
+    @patch('pyrapt.pyrapt._NCCF_BLOCK_FRAMES', 100)
+    def test_nccf_firstpass_vectorized(self, mock_marked_results):
+        # frames are correlated & marked a block at a time:
+        mock_marked_results.side_effect = lambda results, params, is_first: (
+            pyrapt._get_lattice([[(8, 0.7), (12, 0.8), (21, 0.6)]] *
+                                len(results[0])))
+        sample_rate = 2004
+        audio_data = numpy.full(3346, 5.0)
+        params = raptparams.Raptparams()
+        candidates = pyrapt._first_pass_nccf((sample_rate, audio_data), params)
+        self.assertEqual(166, len(candidates))
+        self.assertEqual(2, mock_marked_results.call_count)
+        mock_marked_results.assert_called_with(ANY, ANY, True)
+        self.assertEqual([(100, 35), (66, 35)],
+                         [call[0][0][0].shape for call in
+                          mock_marked_results.call_args_list])
+        self.assertEqual(0.8, candidates[34][1][1])
+        self.assertEqual(0.8, candidates[134][1][1])
+
+    def test_one_pass_nccf_in_frame_blocks(self):
+        # blocks of frames give the same candidates as the whole matrix:
+        audio = numpy.random.RandomState(4).randint(-50, 50, 4000)
+        audio[::40] += 8000
+        audio = (8000, audio)
+        raptparam = raptparams.Raptparams()
+        raptparam.is_two_pass_nccf = False
+        pyrapt._calculate_params(raptparam, audio)
+        params = (raptparam, pyrapt._get_nccf_params(audio, raptparam, True))
+        lag_range = ((params[1].longest_lag_per_frame - 1) -
+                     params[1].shortest_lag_per_frame)
+        expected = pyrapt._get_marked_frame_results(
+            pyrapt._get_correlations_for_all_frames(audio, lag_range, params),
+            params, False).tolist()
+        with patch('pyrapt.pyrapt._NCCF_BLOCK_FRAMES', 7):
+            candidates = pyrapt._one_pass_nccf(audio, raptparam)
+        self.assertEqual(49, len(candidates))
+        self.assertEqual(expected, candidates.tolist())
+        self.assertEqual(40, candidates[20][0][0])
+
     @patch('pyrapt.pyrapt._get_secondpass_frame_results')
     def test_nccf_secondpass(self, mock_frame_results):
         mock_frame_results.return_value = [(5, 0.6), (30, 0.7), (55, 0.9)]
@@ -69,6 +110,7 @@ class TestNccfMethods(TestCase):
         audio_data = (44100, numpy.full(73612, 6.8))
         raptparam = raptparams.Raptparams()
         raptparam.sample_rate_ratio = 20
+        raptparam.is_vectorized_nccf = False
         with patch('pyrapt.pyrapt._get_nccf_params') as mock_get_params:
             nccfparam = nccfparams.Nccfparams()
             # lag range is supposed to be 0-samplerate/50 for 2nd pass default:
@@ -139,6 +181,33 @@ class TestNccfMethods(TestCase):
         self.assertEqual(0.4, results[0][7])
         mock_get_correlation.assert_called_with(ANY, ANY, ANY, ANY)
 
+    def test_get_correlations_for_all_frames(self):
+        # batched results should match the per-lag calculation, including the
+        # zeroed out lags that run past the end of the audio sample:
+        audio = (2004, numpy.random.RandomState(7).randn(600) * 1000.0)
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[1].samples_correlated_per_lag = 15
+        params[1].samples_per_frame = 20
+        params[1].shortest_lag_per_frame = 4
+        params[1].max_frame_count = 29
+        lag_range = 35
+        correlations, max_vals = pyrapt._get_correlations_for_all_frames(
+            audio, lag_range, params)
+        self.assertEqual((29, 35), correlations.shape)
+        for frame in [0, 13, 27, 28]:
+            expected = pyrapt._get_correlations_for_all_lags(audio, frame,
+                                                             lag_range, params)
+            numpy.testing.assert_allclose(expected[0], correlations[frame],
+                                          atol=1e-10)
+            self.assertAlmostEqual(expected[1], max_vals[frame])
+        self.assertEqual(0.0, correlations[28][-1])
+        # a sub range of frames lines up w/ the same frames in the full run:
+        partial = pyrapt._get_correlations_for_all_frames(audio, lag_range,
+                                                          params, True,
+                                                          (10, 12))
+        self.assertEqual((2, 35), partial[0].shape)
+        numpy.testing.assert_allclose(correlations[11], partial[0][1])
+
     # TODO: Test below with lags that go beyond range of the audio sample
     # (logic should be designed to prevent out of range exceptions)
 
@@ -164,6 +233,245 @@ class TestNccfMethods(TestCase):
         self.assertEqual(0.0, results[0][36])
         self.assertEqual(0.6, results[1])
 
+    def test_get_correlations_for_all_input_lags(self):
+        audio = (44100, numpy.random.RandomState(11).randint(-2000, 2000,
+                                                             1070))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[1].samples_correlated_per_lag = 30
+        params[1].samples_per_frame = 100
+        params[1].shortest_lag_per_frame = 0
+        params[1].max_frame_count = 11
+        lag_range = 120
+        # overlapping peaks (32 & 40) and one too close to the lag range edge
+        first_pass = [[(40, 0.6), (32, 0.7), (112, 0.5)]] * 11
+        frame_bounds, lags, correlations, max_vals = \
+            pyrapt._get_correlations_for_all_input_lags(audio, first_pass,
+                                                        lag_range, params)
+        self.assertEqual(12, len(frame_bounds))
+        self.assertEqual(11, len(max_vals))
+        # lags 22 to 50 are each evaluated once:
+        self.assertEqual(range(22, 51),
+                         lags[frame_bounds[2]:frame_bounds[3]].tolist())
+        self.assertEqual([(40, 0.6), (32, 0.7), (112, 0.5)], first_pass[0])
+        for frame in [2, 10]:
+            expected = pyrapt._get_correlations_for_input_lags(
+                audio, frame, [sorted(c) for c in first_pass], lag_range,
+                params)
+            frame_slice = slice(frame_bounds[frame], frame_bounds[frame + 1])
+            dense = numpy.zeros(lag_range)
+            dense[lags[frame_slice]] = correlations[frame_slice]
+            numpy.testing.assert_allclose(expected[0], dense, atol=1e-10)
+            self.assertAlmostEqual(expected[1], max_vals[frame])
+        # the last frame runs off the end of the audio after lag 40:
+        self.assertEqual(40, lags[-1])
+
+    def test_get_frame_blocks(self):
+        self.assertEqual([(0, 10)], pyrapt._get_frame_blocks(10, 4))
+        blocks = pyrapt._get_frame_blocks(1000, 2)
+        self.assertEqual(8, len(blocks))
+        self.assertEqual(0, blocks[0][0])
+        self.assertEqual(1000, blocks[-1][1])
+        for prev, block in zip(blocks, blocks[1:]):
+            self.assertEqual(prev[1], block[0])
+
+    def test_merge_sparse_results(self):
+        block_results = [(numpy.array([0, 2, 2]), numpy.array([4, 5]),
+                          numpy.array([0.5, 0.6]), numpy.array([0.6, 0.0])),
+                         (numpy.array([0, 1]), numpy.array([7]),
+                          numpy.array([0.9]), numpy.array([0.9]))]
+        merged = pyrapt._merge_sparse_results(block_results)
+        self.assertEqual([0, 2, 2, 3], merged[0].tolist())
+        self.assertEqual([4, 5, 7], merged[1].tolist())
+        self.assertEqual([0.5, 0.6, 0.9], merged[2].tolist())
+        self.assertEqual([0.6, 0.0, 0.9], merged[3].tolist())
+
+    def test_parallel_correlations(self):
+        audio = (44100, numpy.random.RandomState(5).randint(-2000, 2000,
+                                                            20000))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[0].workers = 2
+        params[1].samples_correlated_per_lag = 30
+        params[1].samples_per_frame = 100
+        params[1].shortest_lag_per_frame = 0
+        params[1].max_frame_count = 199
+        lag_range = 120
+        first_pass = [[(40, 0.6), (70, 0.7)]] * 199
+        serial_frames = pyrapt._get_correlations_for_all_frames(
+            audio, lag_range, params)
+        serial_lags = pyrapt._get_correlations_for_all_input_lags(
+            audio, first_pass, lag_range, params)
+        pool = pyrapt._get_nccf_pool(2, audio)
+        try:
+            parallel_frames = pyrapt._get_parallel_correlations(
+                pool, 'original', lag_range, params)
+            parallel_lags = pyrapt._get_parallel_correlations(
+                pool, 'original', lag_range, params, first_pass)
+        finally:
+            pool.close()
+            pool.join()
+        for serial, parallel in zip(serial_frames + serial_lags,
+                                    parallel_frames + parallel_lags):
+            numpy.testing.assert_allclose(serial, parallel)
+
+    def test_threaded_nccf(self):
+        original_audio = (4000, numpy.random.RandomState(3).randint(
+            -2000, 2000, 16000))
+        downsampled_audio = (1000, original_audio[1][::4].astype(float))
+        for is_two_pass in [True, False]:
+            params = raptparams.Raptparams()
+            params.is_two_pass_nccf = is_two_pass
+            params.min_acceptable_peak_val = 0.05
+            if is_two_pass:
+                pyrapt._calculate_params(params, original_audio,
+                                         downsampled_audio)
+            else:
+                pyrapt._calculate_params(params, original_audio)
+            serial = pyrapt._run_nccf(original_audio, params,
+                                      downsampled_audio)
+            params.threads = 3
+            threaded = pyrapt._run_nccf(original_audio, params,
+                                        downsampled_audio)
+            self.assertEqual(399, len(threaded[0]))
+            self.assertEqual(serial[0].tolist(), threaded[0].tolist())
+            if is_two_pass:
+                self.assertEqual(serial[1].tolist(), threaded[1].tolist())
+            else:
+                self.assertIsNone(threaded[1])
+
+    def test_get_cross_products(self):
+        state = numpy.random.RandomState(2)
+        frame_windows = state.uniform(-1, 1, (4, 20))
+        lag_segments = state.uniform(-1, 1, (4, 50))
+        expected = numpy.array([[numpy.dot(frame_windows[i],
+                                           lag_segments[i, k:k + 20])
+                                 for k in xrange(31)] for i in xrange(4)])
+        numpy.testing.assert_allclose(expected, pyrapt._get_cross_products(
+            frame_windows, lag_segments, 31), atol=1e-10)
+        single_results = pyrapt._get_cross_products(
+            frame_windows.astype(numpy.float32),
+            lag_segments.astype(numpy.float32), 31)
+        self.assertEqual(numpy.float32, single_results.dtype)
+        numpy.testing.assert_allclose(expected, single_results, atol=1e-4)
+
+    def test_correlations_float32(self):
+        audio = (44100, numpy.random.RandomState(4).randint(-2000, 2000,
+                                                            3000))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[1].samples_correlated_per_lag = 30
+        params[1].samples_per_frame = 100
+        params[1].shortest_lag_per_frame = 5
+        params[1].max_frame_count = 29
+        first_pass = [[(40, 0.6), (70, 0.7)]] * 29
+        expected = pyrapt._get_correlations_for_all_frames(audio, 35, params)
+        expected_lags = pyrapt._get_correlations_for_all_input_lags(
+            audio, first_pass, 120, params)
+        params[0].dtype = 'float32'
+        results = pyrapt._get_correlations_for_all_frames(audio, 35, params)
+        results_lags = pyrapt._get_correlations_for_all_input_lags(
+            audio, first_pass, 120, params)
+        self.assertEqual(numpy.float32, results[0].dtype)
+        self.assertEqual(numpy.float32, results_lags[2].dtype)
+        numpy.testing.assert_allclose(expected[0], results[0], atol=1e-4)
+        numpy.testing.assert_allclose(expected_lags[2], results_lags[2],
+                                      atol=1e-5)
+
+    def test_get_lattice(self):
+        candidates = [[(7, 0.7), (11, 0.9), (0, 0.0)], [(0, 0.0)],
+                      [(8, 0.4)]]
+        lattice = pyrapt._get_lattice(candidates)
+        self.assertEqual(3, len(lattice))
+        self.assertEqual([2, 0, 1], lattice.counts.tolist())
+        self.assertEqual([[7, 11], [0, 0], [8, 0]], lattice.lags.tolist())
+        self.assertEqual([[(7, 0.7), (11, 0.9)], [], [(8, 0.4)]],
+                         lattice.tolist())
+        self.assertEqual([(8, 0.4)], lattice[2])
+        self.assertIs(lattice, pyrapt._get_lattice(lattice))
+        self.assertIsNone(pyrapt._get_lattice(None))
+        # lattices are shared between stages, so they can't be changed:
+        with self.assertRaises(ValueError):
+            lattice.lags[0, 0] = 5
+        self.assertEqual([(0, 0.0)], candidates[1])
+
+        block = lattice.get_frames(1, 3)
+        self.assertEqual(1, block.first_frame)
+        self.assertEqual([[], [(8, 0.4)]], block.tolist())
+        self.assertEqual(10, lattice.get_frames(1, 3, 10).first_frame)
+        self.assertEqual(0, len(pyrapt._get_lattice([])))
+
+    def test_concatenate_lattices(self):
+        first = pyrapt._get_lattice([[(7, 0.7)], []])
+        first.first_frame = 4
+        second = pyrapt._get_lattice([[(8, 0.4), (10, 0.35)]])
+        lattice = pyrapt._concatenate_lattices([first, second])
+        self.assertEqual(4, lattice.first_frame)
+        self.assertEqual([[(7, 0.7)], [], [(8, 0.4), (10, 0.35)]],
+                         lattice.tolist())
+        self.assertEqual((3, 2), lattice.lags.shape)
+        self.assertEqual(0, len(pyrapt._concatenate_lattices([])))
+
+    def test_get_marked_sparse_results(self):
+        # frame 0 has two runs of lags (7-12 and 20-21), frame 1 has none
+        sparse_results = (numpy.array([0, 8, 8]),
+                          numpy.array([7, 8, 9, 10, 11, 12, 20, 21]),
+                          numpy.array([0.7, 0.2, 0.6, 0.8, 0.9, 0.5, 0.75,
+                                       0.6]),
+                          numpy.array([1.0, 0.0]))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[0].min_acceptable_peak_val = 0.5
+        params[0].max_hypotheses_per_frame = 20
+        marked_values = pyrapt._get_marked_sparse_results(sparse_results,
+                                                          params)
+        self.assertEqual([[(7, 0.7), (11, 0.9), (20, 0.75)], []],
+                         marked_values.tolist())
+        # only the highest peaks are kept when over the max allowed:
+        params[0].max_hypotheses_per_frame = 3
+        marked_values = pyrapt._get_marked_sparse_results(sparse_results,
+                                                          params)
+        self.assertEqual([[(11, 0.9), (20, 0.75)], []],
+                         marked_values.tolist())
+
+    def test_get_marked_frame_results(self):
+        correlations = numpy.array([[0.7, 0.2, 0.6, 0.8, 0.9, 0.5],
+                                    [0.1, 0.4, 0.3, 0.35, 0.2, 0.0]])
+        lag_results = (correlations, numpy.array([0.9, 0.4]))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[1].shortest_lag_per_frame = 7
+        params[1].longest_lag_per_frame = 14
+        params[0].min_acceptable_peak_val = 0.5
+        params[0].max_hypotheses_per_frame = 20
+        # one-pass run only marks local maxima:
+        marked_values = pyrapt._get_marked_frame_results(lag_results, params,
+                                                         False)
+        self.assertEqual([[(7, 0.7), (11, 0.9)], [(8, 0.4), (10, 0.35)]],
+                         marked_values.tolist())
+        self.assertEqual([2, 2], marked_values.counts.tolist())
+        params[0].max_hypotheses_per_frame = 2
+        marked_values = pyrapt._get_marked_frame_results(lag_results, params,
+                                                         False)
+        self.assertEqual([[(11, 0.9)], [(8, 0.4)]], marked_values.tolist())
+
+    def test_get_marked_frame_results_firstpass(self):
+        # symmetric neighbours put the vertex right on the lag, otherwise it
+        # is pulled toward the larger neighbour:
+        correlations = numpy.array([[0.2, 0.3, 0.6, 0.3, 0.2],
+                                    [0.2, 0.3, 0.6, 0.5, 0.2]])
+        lag_results = (correlations, numpy.array([0.6, 0.6]))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[0].sample_rate_ratio = 10.0
+        params[1].shortest_lag_per_frame = 4
+        params[1].longest_lag_per_frame = 10
+        params[0].min_acceptable_peak_val = 0.9
+        marked_values = pyrapt._get_marked_frame_results(lag_results, params,
+                                                         True)
+        self.assertEqual([(60, 0.6)], marked_values[0])
+        self.assertEqual(1, len(marked_values[1]))
+        lags = numpy.array([50.0, 60.0, 70.0])
+        expected = numpy.polyfit(lags, [0.3, 0.6, 0.5], 2)
+        vertex = -expected[1] / (2 * expected[0])
+        self.assertEqual(int(round(vertex)), marked_values[1][0][0])
+        self.assertAlmostEqual(numpy.polyval(expected, vertex),
+                               marked_values[1][0][1])
+
     def test_get_marked_results(self):
         candidates = ([0.7, 0.2, 0.6, 0.8], 1.0)
         params = (raptparams.Raptparams(), nccfparams.Nccfparams())
@@ -186,18 +494,18 @@ class TestNccfMethods(TestCase):
         self.assertEqual((11, 0.9), marked_values[3])
         self.assertEqual((10, 0.8), marked_values[2])
 
-    @patch('pyrapt.pyrapt._get_peak_lag_val')
-    def test_get_marked_results_firstpass(self, mock_get_peak):
+    @patch('pyrapt.pyrapt._extrapolate_lag_val')
+    def test_get_marked_results_firstpass(self, mock_extrapolate):
         candidates = ([0.7, 0.2, 0.6, 0.8], 1.0)
         params = (raptparams.Raptparams(), nccfparams.Nccfparams())
         params[1].shortest_lag_per_frame = 7
         params[0].min_acceptable_peak_val = 0.5
         params[0].max_hypotheses_per_frame = 19
-        mock_get_peak.return_value = (9, 0.6)
+        mock_extrapolate.return_value = [(14, 0.7), (9, 0.6), (20, 0.8)]
         marked_values = pyrapt._get_marked_results(candidates, params, True)
         self.assertEqual(3, len(marked_values))
         self.assertEqual((9, 0.6), marked_values[1])
-        mock_get_peak.assert_called_with(ANY, ANY, ANY)
+        mock_extrapolate.assert_called_once_with(candidates, 0.5, 18, params)
 
     # TODO: have variable return values for mocks depending on inputs
     # TODO: verify inputs came in as expected:
@@ -215,27 +523,59 @@ class TestNccfMethods(TestCase):
         correlation = pyrapt._get_correlation(audio, 0, 1, params, False)
         self.assertEqual(0.7856742013183862, correlation)
 
-    # TODO: Improve get_peak_lag_val testing
-
-    # def test_get_peak_lag(self):
-    #    candidates = [0.7, 0.2, 0.6, 0.5]
-    #    params = (raptparams.Raptparams(), nccfparams.Nccfparams())
-    #    params[1].shortest_lag_per_frame = 7
-    #    params[0].min_acceptable_peak_val = 0.5
-    #    params[0].max_hypotheses_per_frame = 19
-    #    params[0].sample_rate_ratio = 10
-    #    candidate = pyrapt._get_peak_lag_val(candidates, 2, params)
-    #    self.assertEqual((93, 0.6), candidate)
-
-    # TODO: fix this to actually verify boundary behavior (take 1st or last 3)
-    # def test_get_peak_lag_array_bounds(self):
-    #    candidates = [0.7, 0.2, 0.6, 0.8]
-    #    params = (raptparams.Raptparams(), nccfparams.Nccfparams())
-    #    params[1].shortest_lag_per_frame = 7
-    #    params[0].min_acceptable_peak_val = 0.5
-    #    params[0].max_hypotheses_per_frame = 19
-    #    params[0].sample_rate_ratio = 2
-    #    candidate = pyrapt._get_peak_lag_val(candidates, 0, params)
-    #    self.assertEqual((14, 0.7), candidate)
-    #    candidate = pyrapt._get_peak_lag_val(candidates, 3, params)
-    #    self.assertEqual((20, 0.8), candidate)
+    def test_get_correlation_with_energy_index(self):
+        audio = (10, numpy.array([0, 1, 2, 3, 4, 5, 6, 7]))
+        params = (raptparams.Raptparams(), nccfparams.Nccfparams())
+        params[1].samples_per_frame = 2
+        params[1].samples_correlated_per_lag = 5
+        params[1].energy_index = pyrapt._get_energy_index(audio[1])
+        correlation = pyrapt._get_correlation(audio, 0, 1, params)
+        self.assertAlmostEqual(0.816496580927726, correlation)
+        params[0].additive_constant = 12
+        correlation = pyrapt._get_correlation(audio, 0, 1, params, False)
+        self.assertAlmostEqual(0.7856742013183862, correlation)
+
+    def test_get_window_sums(self):
+        audio = numpy.array([3, -1, 4, 1, -5, 9, 2], dtype=numpy.int16)
+        energy_index = pyrapt._get_energy_index(audio)
+        window_sum, window_energy = pyrapt._get_window_sums(energy_index, 2,
+                                                            3)
+        self.assertEqual(0, window_sum)
+        self.assertEqual(42, window_energy)
+        # also works on an array of window starts:
+        window_sums = pyrapt._get_window_sums(energy_index,
+                                              numpy.array([0, 4]), 3)[0]
+        self.assertEqual([6, 6], window_sums.tolist())
+        # int16 samples are squared w/o overflowing:
+        loud_index = pyrapt._get_energy_index(numpy.full(4, 30000,
+                                                         dtype=numpy.int16))
+        self.assertEqual(4 * 30000**2, loud_index[1][-1])
+        # 32 bit samples are summed w/ float64 rather than overflowing:
+        loud_index = pyrapt._get_energy_index(numpy.full(4, 2**31 - 1,
+                                                         dtype=numpy.int32))
+        self.assertEqual(numpy.float64, loud_index[1].dtype)
+        self.assertAlmostEqual(1.0, loud_index[1][-1] / (4.0 * (2**31 - 1)**2))
+        self.assertEqual(numpy.int64, pyrapt._get_energy_index(
+            numpy.full(4, 2**20, dtype=numpy.int32))[1].dtype)
+
+    @patch('pyrapt.pyrapt._HANNING_BLOCK_SIZE', 3)
+    def test_get_hanning_energy(self):
+        audio = numpy.random.RandomState(3).randint(-3000, 3000, 500)
+        hanning_vals = numpy.hanning(60)
+        starts = [0, 137, 440, 438, 7]
+        expected = [numpy.sum((audio[start:start + 60] * hanning_vals)**2)
+                    for start in starts]
+        numpy.testing.assert_allclose(expected, pyrapt._get_hanning_energy(
+            audio, numpy.array(starts), hanning_vals), rtol=1e-12)
+        self.assertAlmostEqual(1.0, pyrapt._get_hanning_energy(
+            audio, 137, hanning_vals) / expected[1])
+        # a shortened window at the end of the audio:
+        self.assertAlmostEqual(1.0, pyrapt._get_hanning_energy(
+            audio, 470, hanning_vals[:30]) / numpy.sum(
+                (audio[470:] * hanning_vals[:30])**2))
+        energies = pyrapt._get_hanning_energy(audio, numpy.array(starts),
+                                              hanning_vals, numpy.float32)
+        self.assertEqual(numpy.float32, energies.dtype)
+        numpy.testing.assert_allclose(expected, energies, rtol=1e-5)
+        # the index only keeps the sums & sums of squares:
+        self.assertEqual(2, len(pyrapt._get_energy_index(audio)))
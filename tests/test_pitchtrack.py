@@ -0,0 +1,100 @@
+"""
+Unit tests for the array based PitchTrack results of rapt
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+
+from pyrapt import pitchtrack
+from pyrapt import pyrapt
+from tests import pulsetrain
+
+
+class TestPitchTrack(TestCase):
+
+    def setUp(self):
+        # 200 Hz pulse train w/ a bit of noise, at 8 kHz:
+        audio = pulsetrain.get_pulse_train(seed=5)
+        audio[4000:5000] = 0
+        self.audio = (8000, audio)
+        self.track = pitchtrack.PitchTrack([0.0, 200.0, 201.5], 0.5, 0.01,
+                                           [0.0, 0.9, 0.85])
+
+    def test_pitch_track(self):
+        track = self.track
+        self.assertEqual(3, len(track))
+        self.assertEqual([0.0, 200.0, 201.5], track.tolist())
+        self.assertEqual([False, True, True], track.voicing.tolist())
+        numpy.testing.assert_allclose([0.5, 0.51, 0.52], track.times)
+        self.assertTrue(track.f0.flags.c_contiguous)
+        with self.assertRaises(ValueError):
+            track.f0[0] = 100.0
+        self.assertIsNone(pitchtrack.PitchTrack([100.0]).correlations)
+        with self.assertRaises(ValueError):
+            pitchtrack.PitchTrack([100.0, 0.0], correlations=[0.5])
+
+    def test_tobytes(self):
+        data = self.track.tobytes()
+        self.assertEqual(32 + 2 * 3 * 8, len(data))
+        self.assertEqual(data, ''.join(str(bytearray(part)) for part in
+                                       self.track.get_buffers()))
+        for track_data in (data, bytearray(data), buffer(data),
+                           memoryview(bytearray(data))):
+            track = pitchtrack.frombytes(track_data)
+            self.assertEqual(self.track.tolist(), track.tolist())
+            self.assertEqual(self.track.correlations.tolist(),
+                             track.correlations.tolist())
+            self.assertEqual(self.track.times.tolist(), track.times.tolist())
+        track = pitchtrack.frombytes(
+            pitchtrack.PitchTrack([100.0, 0.0]).tobytes())
+        self.assertEqual([100.0, 0.0], track.tolist())
+        self.assertIsNone(track.correlations)
+        with self.assertRaises(ValueError):
+            pitchtrack.frombytes(data[:-1])
+        with self.assertRaises(ValueError):
+            pitchtrack.frombytes('RIFF' + data[4:])
+
+    def test_save_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'track.bin')
+            self.track.save(path)
+            with open(path, 'rb') as track_file:
+                self.assertEqual(self.track.tobytes(), track_file.read())
+            track = pitchtrack.load(path)
+            self.assertEqual(self.track.tolist(), track.tolist())
+            self.assertEqual(self.track.correlations.tolist(),
+                             track.correlations.tolist())
+            with open(path, 'r+b') as track_file:
+                track_file.truncate(40)
+            with self.assertRaises(ValueError):
+                pitchtrack.load(path)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_rapt_track(self):
+        track = pyrapt.rapt_track(self.audio)
+        self.assertEqual(pyrapt.rapt(self.audio), track.tolist())
+        self.assertEqual(0.01, track.frame_step)
+        self.assertEqual(0.0, track.times[0])
+        # chosen candidates of voiced frames are strong peaks:
+        self.assertTrue(track.voicing[:30].all())
+        self.assertFalse(track.voicing[55:60].any())
+        self.assertTrue((track.correlations[track.voicing] > 0.3).all())
+        self.assertTrue((track.correlations[~track.voicing] == 0.0).all())
+
+        region_track = pyrapt.rapt_track(self.audio, start_time=0.25,
+                                         end_time=0.75)
+        self.assertEqual(pyrapt.rapt(self.audio, start_time=0.25,
+                                     end_time=0.75), region_track.tolist())
+        self.assertEqual(0.25, region_track.times[0])
+
+    def test_get_chosen_correlations(self):
+        lattice = pyrapt._get_lattice([[(40, 0.9), (80, 0.5)], [],
+                                       [(40, 0.8)], [(20, 0.7)]])
+        correlations = pyrapt._get_chosen_correlations(
+            lattice, [80, 0, 40, 20], [100.0, 0.0, 200.0, 0.0])
+        self.assertEqual([0.5, 0.0, 0.8, 0.0], correlations.tolist())
@@ -66,115 +66,160 @@ class TestPostProcessingMethods(TestCase):
                 mock_local.assert_called_with(ANY, 0.6772, raptparam, 44100)
                 mock_best.assert_called_with(ANY, ANY, [], 100, raptparam)
 
-    def test_select_max_correlation(self):
-        nccf_results_frame = [(172, 0.5423), (235, 0.682), (422, 0.51),
-                              (533, 0.822), (0, 0.0)]
-        max_cand = pyrapt._select_max_correlation_for_frame(nccf_results_frame)
-        self.assertEqual(0.822, max_cand)
-
-    def test_calculate_local_cost(self):
-        # standard voiced hypothesis calc:
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_select_candidates(self, mock_rms):
+        mock_rms.return_value = 1.0
+        raptparam = raptparams.Raptparams()
+        # a strong 100 lag candidate throughout, then an unvoiced frame:
+        nccf_results = [[(100, 0.9), (200, 0.4), (0, 0.0)],
+                        [(50, 0.3), (101, 0.95), (0, 0.0)],
+                        [(99, 0.9), (0, 0.0)],
+                        [(0, 0.0)]]
+        candidates = pyrapt._select_candidates(nccf_results, raptparam,
+                                               10000)
+        self.assertEqual([100, 101, 99, 0], candidates)
+        self.assertEqual([], pyrapt._select_candidates([], raptparam, 10000))
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_select_candidates_lattice(self, mock_rms):
+        mock_rms.return_value = 1.0
+        raptparam = raptparams.Raptparams()
+        nccf_results = [[(100, 0.9), (200, 0.4)], [(50, 0.3), (101, 0.95)],
+                        [(99, 0.9)], []]
+        lattice = pyrapt._get_lattice(nccf_results)
+        candidates = pyrapt._select_candidates(lattice, raptparam, 10000)
+        self.assertEqual([100, 101, 99, 0], candidates)
+        self.assertEqual(candidates, pyrapt._select_candidates(
+            nccf_results, raptparam, 10000))
+        # the unvoiced candidates aren't added to the input:
+        self.assertEqual([(99, 0.9)], nccf_results[2])
+        self.assertEqual([2, 2, 1, 0], lattice.counts.tolist())
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_select_candidates_long_input(self, mock_rms):
+        # well past the recursion limit, e.g. a couple minutes of audio:
+        mock_rms.return_value = 1.0
+        raptparam = raptparams.Raptparams()
+        nccf_results = [[(100, 0.9), (200, 0.4), (0, 0.0)]] * 12000
+        candidates = pyrapt._select_candidates(nccf_results, raptparam,
+                                               10000)
+        self.assertEqual([100] * 12000, candidates)
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_get_next_cands(self, mock_rms):
+        mock_rms.return_value = 0.8
+        raptparam = raptparams.Raptparams()
+        prev_entries = [(0.3, (100, 0.9)), (0.5, (210, 0.6)), (0.1, (0, 0.0))]
+        frame_candidates = [(50, 0.4), (101, 0.8), (0, 0.0)]
+        costs, best_prev = pyrapt._get_next_cands(
+            4, numpy.array([entry[0] for entry in prev_entries]),
+            pyrapt._get_candidate_arrays([entry[1] for entry in
+                                          prev_entries]),
+            pyrapt._get_candidate_arrays(frame_candidates), raptparam,
+            10000)
+        mock_rms.assert_called_once_with(4, raptparam)
+        self.assertEqual((3,), costs.shape)
+        # the 101 lag candidate stays on the 100 lag, the unvoiced one stays
+        # unvoiced, and the 50 lag one halves the 100 lag:
+        self.assertEqual([0, 0, 2], best_prev.tolist())
+        lag_weight = 0.3 / (10000 / 50.0)
+        self.assertAlmostEqual(
+            0.3 + (1.0 - 0.8 * (1.0 - lag_weight * 101)) +
+            0.02 * (0.35 + abs(numpy.log(101 / 100.0) - numpy.log(2.0))),
+            costs[1])
+        self.assertAlmostEqual(0.1 + 0.8, costs[2])
+
+    def test_get_next_cands_ties(self):
+        # ties go to the later previous candidate:
+        raptparam = raptparams.Raptparams()
+        costs, best_prev = pyrapt._get_next_cands(
+            2, numpy.array([0.2, 0.2, 0.2]),
+            pyrapt._get_candidate_arrays([(0, 0.0)] * 3),
+            pyrapt._get_candidate_arrays([(0, 0.0)]), raptparam, 10000)
+        self.assertEqual([2], best_prev.tolist())
+        self.assertEqual([0.2], costs.tolist())
+
+    def test_get_next_cands_local_costs(self):
+        # w/ no transition costs from an unvoiced previous candidate, the
+        # costs are just the local costs:
         raptparam = raptparams.Raptparams()
         raptparam.lag_weight = 0.4
         raptparam.minimum_allowed_freq = 50
-        max_corr_for_frame = 0.682
-        sample_rate = 44100
-        cost = pyrapt._calculate_local_cost((172, 0.5423), max_corr_for_frame,
-                                            raptparam, sample_rate)
-        self.assertEqual(0.5000018594104307, cost)
-        # now test unvoiced hypothesis calc:
         raptparam.voicing_bias = 10.0
-        cost = pyrapt._calculate_local_cost((0, 0.0), max_corr_for_frame,
-                                            raptparam, sample_rate)
-        self.assertEqual(10.682, cost)
+        raptparam.transition_cost = 0.0
+        raptparam.amp_mod_transition_cost = 0.0
+        raptparam.rms_ratios = numpy.array([1.0])
+        costs, best_prev = pyrapt._get_next_cands(
+            0, numpy.array([0.0]), pyrapt._get_candidate_arrays([(0, 0.0)]),
+            pyrapt._get_candidate_arrays([(172, 0.5423), (235, 0.682),
+                                          (0, 0.0)]), raptparam, 44100)
+        self.assertAlmostEqual(0.5000018594104307, costs[0])
+        # unvoiced hypothesis adds the voicing bias to the frame's best
+        # correlation:
+        self.assertAlmostEqual(10.682, costs[2])
+        self.assertEqual([0, 0, 0], best_prev.tolist())
 
-    @patch('pyrapt.pyrapt._get_delta_cost')
-    def test_get_best_cost(self, mock_delta):
-        mock_delta.return_value = 25
-        candidate = (172, 0.542)
-        params = raptparams.Raptparams()
-        params.original_audio = (44100, [2.0] * 73000)
-        cost = pyrapt._get_best_cost(candidate, 25, [], 100, params)
-        self.assertEqual(50, cost)
-
-    def test_get_delta_cost(self):
-        cand1 = (172, 0.542)
-        cand2 = (0, 0.0)
-        prev_cand1 = (10, (215, 0.211))
-        prev_cand2 = (10, (0, 0.0))
-        params = raptparams.Raptparams()
-        with patch('pyrapt.pyrapt._get_unvoiced_to_unvoiced_cost') as mok_cost1:
-            mok_cost1.return_value = 5
-            cost = pyrapt._get_delta_cost(cand2, prev_cand2, 25, params)
-            self.assertEquals(5, cost)
-            mok_cost1.assert_called_once_with(prev_cand2)
-        with patch('pyrapt.pyrapt._get_voiced_to_unvoiced_cost') as mok_cost2:
-            mok_cost2.return_value = 10
-            cost = pyrapt._get_delta_cost(cand2, prev_cand1, 25, params)
-            self.assertEquals(10, cost)
-            mok_cost2.assert_called_once_with(cand2, prev_cand1, 25, params)
-        with patch('pyrapt.pyrapt._get_unvoiced_to_voiced_cost') as mok_cost3:
-            mok_cost3.return_value = 15
-            cost = pyrapt._get_delta_cost(cand1, prev_cand2, 25, params)
-            self.assertEquals(15, cost)
-            mok_cost3.assert_called_once_with(cand1, prev_cand2, 25, params)
-        with patch('pyrapt.pyrapt._get_voiced_to_voiced_cost') as mok_cost4:
-            mok_cost4.return_value = 25
-            cost = pyrapt._get_delta_cost(cand1, prev_cand1, 25, params)
-            self.assertEquals(25, cost)
-            mok_cost4.assert_called_once_with(cand1, prev_cand1, params)
-
-    def test_is_unvoiced(self):
-        voiced_cand = (172, 0.542)
-        unvoiced_cand = (0, 0.0)
-        partial_cand1 = (0, 0.672)
-        partial_cand2 = (215, 0.0)
-        self.assertTrue(pyrapt._is_unvoiced(unvoiced_cand))
-        self.assertFalse(pyrapt._is_unvoiced(voiced_cand))
-        self.assertFalse(pyrapt._is_unvoiced(partial_cand1))
-        self.assertFalse(pyrapt._is_unvoiced(partial_cand2))
+    def _get_transition_cost(self, candidate, prev_entry, params):
+        # total cost minus the local cost (lag weight and voicing bias are
+        # zeroed, so the local cost is 1 - correlation or 0.0 if unvoiced)
+        params.lag_weight = 0.0
+        params.voicing_bias = 0.0
+        costs, best_prev = pyrapt._get_next_cands(
+            100, numpy.array([prev_entry[0]]),
+            pyrapt._get_candidate_arrays([prev_entry[1]]),
+            pyrapt._get_candidate_arrays([candidate]), params, 44100)
+        local_cost = 0.0 if candidate == (0, 0.0) else 1.0 - candidate[1]
+        return costs[0] - local_cost
 
     def test_voiced_to_voiced(self):
         candidate = (709, 0.733)
         prev_entry = (0.373, (650, 0.841))
         params = raptparams.Raptparams()
-        cost = pyrapt._get_voiced_to_voiced_cost(candidate, prev_entry, params)
-        self.assertEqual(0.39212528033835004, cost)
+        cost = self._get_transition_cost(candidate, prev_entry, params)
+        self.assertAlmostEqual(0.39212528033835004, cost)
 
     def test_unvoiced_to_unvoiced(self):
         prev_entry = (0.373, (0, 0.0))
-        cost = pyrapt._get_unvoiced_to_unvoiced_cost(prev_entry)
-        self.assertEqual(0.373, cost)
+        params = raptparams.Raptparams()
+        cost = self._get_transition_cost((0, 0.0), prev_entry, params)
+        self.assertAlmostEqual(0.373, cost)
 
     @patch('pyrapt.pyrapt._get_rms_ratio')
     def test_voiced_to_unvoiced(self, mock_rms):
         mock_rms.return_value = 2.0
-        candidate = (709, 0.733)
         prev_entry = (0.373, (650, 0.841))
         params = raptparams.Raptparams()
         params.transition_cost = 10.0
         params.amp_mod_transition_cost = 4.0
-        cost = pyrapt._get_voiced_to_unvoiced_cost(candidate, prev_entry,
-                                                   100, params)
+        cost = self._get_transition_cost((0, 0.0), prev_entry, params)
         mock_rms.assert_called_once_with(100, params)
-        self.assertEqual(18.373, cost)
+        self.assertAlmostEqual(18.373, cost)
 
     @patch('pyrapt.pyrapt._get_rms_ratio')
     def test_unvoiced_to_voiced(self, mock_rms):
         mock_rms.return_value = 2.0
         candidate = (709, 0.733)
-        prev_entry = (0.373, (650, 0.841))
+        prev_entry = (0.373, (0, 0.0))
         params = raptparams.Raptparams()
         params.transition_cost = 10.0
         params.amp_mod_transition_cost = 4.0
-        cost = pyrapt._get_unvoiced_to_voiced_cost(candidate, prev_entry,
-                                                   100, params)
+        cost = self._get_transition_cost(candidate, prev_entry, params)
         mock_rms.assert_called_once_with(100, params)
-        self.assertEqual(12.373, cost)
+        self.assertAlmostEqual(12.373, cost)
+        # w/ no rms ratio (e.g. the final frame) it's just the transition
+        # cost:
+        mock_rms.return_value = 0.0
+        cost = self._get_transition_cost(candidate, prev_entry, params)
+        self.assertAlmostEqual(10.373, cost)
 
-    # def test_spec_stationarity(self):
-    #    result = pyrapt._get_spec_stationarity()
-    #    self.assertAlmostEqual(1.0, result)
+    @patch('pyrapt.pyrapt._get_delta_cost')
+    def test_get_best_cost(self, mock_delta):
+        mock_delta.return_value = 25
+        candidate = (172, 0.542)
+        params = raptparams.Raptparams()
+        params.original_audio = (44100, [2.0] * 73000)
+        cost = pyrapt._get_best_cost(candidate, 25, [], 100, params)
+        self.assertEqual(50, cost)
 
     def test_rms_ratio(self):
         # TODO: mock hanning window vals
@@ -201,3 +246,115 @@ class TestPostProcessingMethods(TestCase):
         result = pyrapt._get_rms_ratio(100, params)
         self.assertGreater(result, 0.0)
         self.assertLess(result, 1.0)
+        # a silent previous window (e.g. digital silence) gives 0.0:
+        silent_audio = [0.0] * 73000
+        params.original_audio = (2000, silent_audio)
+        self.assertEqual(0.0, pyrapt._get_rms_ratio(100, params))
+
+    def test_get_rms_ratios_trailing_silence(self):
+        # the frames at the end of the audio, whose windows run past it, are
+        # in digital silence:
+        audio = numpy.random.RandomState(9).randint(-3000, 3000, 1000)
+        audio[700:] = 0
+        params = raptparams.Raptparams()
+        params.original_audio = (2000, audio)
+        params.samples_per_frame = 20
+        params.hanning_window_length = 60
+        params.hanning_window_vals = numpy.hanning(60)
+        params.rms_offset = 20
+        rms_ratios = pyrapt._get_rms_ratios(params, 49)
+        self.assertEqual([0.0] * 10, rms_ratios[-10:].tolist())
+        self.assertGreater(rms_ratios[30], 0.0)
+        # and rapt handles a recording that ends in silence:
+        audio = numpy.random.RandomState(7).randint(-50, 50, 8000)
+        audio[::40] += 8000
+        audio[6000:] = 0
+        results = pyrapt.rapt((8000, audio.astype(numpy.int16)))
+        self.assertEqual(0.0, results[-1])
+        self.assertGreater(results[10], 0.0)
+
+    def test_get_rms_ratios(self):
+        audio = numpy.random.RandomState(8).randint(-3000, 3000, 1000)
+        params = raptparams.Raptparams()
+        params.original_audio = (2000, audio)
+        params.samples_per_frame = 20
+        params.hanning_window_length = 60
+        params.hanning_window_vals = numpy.hanning(60)
+        params.rms_offset = 20
+        # frames 46 to 48 have windows cut off by the end of the audio:
+        expected = [pyrapt._get_rms_ratio(i, params) for i in xrange(49)]
+        rms_ratios = pyrapt._get_rms_ratios(params, 49)
+        numpy.testing.assert_allclose(expected, rms_ratios, rtol=1e-9)
+        params.dtype = 'float32'
+        rms_ratios = pyrapt._get_rms_ratios(params, 49)
+        numpy.testing.assert_allclose(expected, rms_ratios, rtol=1e-5)
+        # a silent previous window gives 0.0:
+        audio[:200] = 0
+        self.assertEqual(0.0, pyrapt._get_rms_ratios(params, 49)[3])
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_get_next_cands_rms_ratios(self, mock_rms):
+        raptparam = raptparams.Raptparams()
+        raptparam.rms_ratios = numpy.array([1.0, 2.0, 0.5])
+        costs, best_prev = pyrapt._get_next_cands(
+            2, numpy.array([0.0]), pyrapt._get_candidate_arrays([(0, 0.0)]),
+            pyrapt._get_candidate_arrays([(100, 0.9)]), raptparam, 10000)
+        self.assertFalse(mock_rms.called)
+        local_cost = 1.0 - 0.9 * (1.0 - 0.3 / (10000 / 50.0) * 100)
+        self.assertAlmostEqual(local_cost + raptparam.transition_cost +
+                               raptparam.amp_mod_transition_cost / 0.5,
+                               costs[0])
+        # frames past the precomputed ratios are calculated directly:
+        mock_rms.return_value = 0.5
+        later_costs, best_prev = pyrapt._get_next_cands(
+            3, numpy.array([0.0]), pyrapt._get_candidate_arrays([(0, 0.0)]),
+            pyrapt._get_candidate_arrays([(100, 0.9)]), raptparam, 10000)
+        mock_rms.assert_called_once_with(3, raptparam)
+        self.assertEqual(costs[0], later_costs[0])
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_select_candidates_per_config(self, mock_rms):
+        mock_rms.return_value = 1.3
+        state = numpy.random.RandomState(4)
+        nccf_results = []
+        for i in xrange(0, 30):
+            lags = sorted(state.choice(range(20, 200), 3, replace=False))
+            nccf_results.append([(int(lag), state.uniform(0.2, 1.0))
+                                 for lag in lags] + [(0, 0.0)])
+        dp_configs = [{}, {'transition_cost': 0.5, 'doubling_cost': 30.0},
+                      {'voicing_bias': 0.4, 'lag_weight': 1},
+                      {'freq_weight': 0.5, 'amp_mod_transition_cost': 0.1}]
+        raptparam = raptparams.Raptparams()
+        sweep_param = pyrapt._get_sweep_params(raptparam, dp_configs)
+        self.assertEqual((4, 1, 1), sweep_param.transition_cost.shape)
+        self.assertEqual(0.005, raptparam.transition_cost)
+        paths = pyrapt._select_candidates(nccf_results, sweep_param, 4000, 4)
+        self.assertEqual(4, len(paths))
+        # same paths as running the DP once per configuration:
+        for dp_config, path in zip(dp_configs, paths):
+            config_param = pyrapt._setup_rapt_params(dp_config)
+            self.assertEqual(pyrapt._select_candidates(nccf_results,
+                                                       config_param, 4000),
+                             path)
+        self.assertEqual([[], []], pyrapt._select_candidates(
+            [], pyrapt._get_sweep_params(raptparam, [{}, {}]), 4000, 2))
+
+    def test_get_sweep_params_nccf_param(self):
+        raptparam = raptparams.Raptparams()
+        with self.assertRaises(ValueError):
+            pyrapt._get_sweep_params(raptparam, [{'doubling_cost': 1.0},
+                                                 {'additive_constant': 10}])
+
+    @patch('pyrapt.pyrapt._get_audio_data')
+    @patch('pyrapt.pyrapt._run_rapt_nccf')
+    def test_rapt_sweep(self, mock_nccf, mock_audio):
+        mock_audio.return_value = (10000, numpy.zeros(1000))
+        nccf_results = [[(100, 0.9), (200, 0.4)], [(101, 0.9)], [(99, 0.3)]]
+        mock_nccf.return_value = (nccf_results, None)
+        with patch('pyrapt.pyrapt._get_rms_ratio') as mock_rms:
+            mock_rms.return_value = 1.0
+            results = pyrapt.rapt_sweep('test.wav', [{}, {'voicing_bias': -1}],
+                                        transition_cost=0.1)
+        self.assertEqual(1, mock_nccf.call_count)
+        self.assertEqual(0.1, mock_nccf.call_args[0][1].transition_cost)
+        self.assertEqual([[100, 99, 101], [0.0, 0.0, 0.0]], results)
@@ -1,11 +1,13 @@
 """
 Unit tests for main methods used by rapt
 """
+import io
 from unittest import TestCase
 from mock import patch
 from mock import ANY
 
 import numpy
+from scipy.io import wavfile
 
 from pyrapt import pyrapt
 
@@ -27,3 +29,52 @@ class TestMainRaptMethods(TestCase):
                                                           44100)
                     self.assertEqual(166, len(results))
                     self.assertEqual(75, results[0])
+
+    def test_rapt_region_past_end(self):
+        audio = numpy.random.RandomState(5).randint(-50, 50, 8000)
+        audio[::40] += 8000
+        audio = (8000, audio.astype(numpy.int16))
+        results = pyrapt.rapt(audio, start_time=0.5, end_time=6.0)
+        self.assertEqual(pyrapt.rapt(audio, start_time=0.5), results)
+        self.assertEqual(49, len(results))
+        with self.assertRaises(ValueError):
+            pyrapt.rapt(audio, start_time=5.0, end_time=6.0)
+        with self.assertRaises(ValueError):
+            pyrapt.rapt_track(audio, start_time=0.6, end_time=0.2)
+        # audio shorter than a frame has no F0 estimates:
+        for length in [0, 10]:
+            self.assertEqual([], pyrapt.rapt((8000, audio[1][:length])))
+
+    def test_rapt_int32_audio(self):
+        # loud 200 Hz tone in 32 bit PCM, whose window energies would
+        # overflow int64:
+        times = numpy.arange(8000) / 8000.0
+        audio = (1.5e9 * numpy.sin(2 * numpy.pi * 200.0 * times) +
+                 3e8 * numpy.sin(2 * numpy.pi * 400.0 * times) +
+                 numpy.random.RandomState(6).randint(-1e6, 1e6, 8000))
+        audio = audio.astype(numpy.int32)
+        results = pyrapt.rapt((8000, audio))
+        self.assertEqual(pyrapt.rapt((8000, audio.astype(numpy.float64))),
+                         results)
+        self.assertTrue(all(freq > 0.0 for freq in results[1:-1]))
+
+    def test_rapt_float_audio(self):
+        # float wav contents (in [-1, 1]) track like the same 16 bit PCM:
+        times = numpy.arange(8000) / 8000.0
+        audio = (8000 * numpy.sin(2 * numpy.pi * 200.0 * times) +
+                 2000 * numpy.sin(2 * numpy.pi * 400.0 * times) +
+                 numpy.random.RandomState(6).randint(-50, 50, 8000))
+        audio = audio.astype(numpy.int16)
+        expected = pyrapt.rapt((8000, audio))
+        self.assertTrue(all(freq > 0.0 for freq in expected[1:-1]))
+        float_audio = audio.astype(numpy.float32) / 32768
+        for samples in [float_audio,
+                        numpy.column_stack((float_audio, float_audio))]:
+            wav_file = io.BytesIO()
+            wavfile.write(wav_file, 8000, samples)
+            results = pyrapt.rapt(buffer(wav_file.getvalue()))
+            numpy.testing.assert_allclose(expected, results, rtol=1e-6)
+            # arrays are only scaled when asked to:
+            results = pyrapt.rapt((8000, samples), sample_scale=32768)
+            numpy.testing.assert_allclose(expected, results, rtol=1e-6)
+        self.assertEqual([0.0] * 99, pyrapt.rapt((8000, float_audio)))
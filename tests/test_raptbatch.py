@@ -0,0 +1,90 @@
+"""
+Unit tests for running rapt on a batch of inputs
+"""
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+from scipy.io import wavfile
+
+from pyrapt import pyrapt
+from pyrapt import raptbatch
+from tests import pulsetrain
+
+
+class TestRaptBatch(TestCase):
+
+    def setUp(self):
+        # 200 Hz & 125 Hz pulse trains w/ a bit of noise, at 8 kHz:
+        state = numpy.random.RandomState(5)
+        self.audio = [pulsetrain.get_pulse_train(length, period, state=state)
+                      for length, period in [(4000, 40), (12000, 64),
+                                             (8000, 40)]]
+        self.wav_file = tempfile.NamedTemporaryFile(suffix='.wav',
+                                                    delete=False)
+        self.wav_file.close()
+        wavfile.write(self.wav_file.name, 8000, self.audio[1])
+
+    def tearDown(self):
+        os.remove(self.wav_file.name)
+
+    def _get_inputs(self):
+        return [(8000, self.audio[0]), self.wav_file.name,
+                (8000, self.audio[2])]
+
+    def test_batch_tasks_longest_first(self):
+        tasks = raptbatch._get_batch_tasks(self._get_inputs())
+        self.assertEqual([1, 2, 0], [task[0] for task in tasks])
+        self.assertEqual([8000] * 3, [task[2] for task in tasks])
+
+    def test_rapt_batch(self):
+        expected = pyrapt.rapt(self.wav_file.name, doubling_cost=0.5)
+        for workers in [1, 2]:
+            results = list(raptbatch.rapt_batch(self._get_inputs(),
+                                                workers=workers,
+                                                doubling_cost=0.5))
+            self.assertEqual(3, len(results))
+            self.assertEqual(expected, results[1])
+            self.assertEqual([49, 149, 99], [len(item) for item in results])
+            self.assertEqual(200, results[0][20])
+            self.assertEqual(125, results[1][20])
+
+    def test_rapt_batch_unordered(self):
+        ordered = list(raptbatch.rapt_batch(self._get_inputs(), workers=2))
+        unordered = list(raptbatch.rapt_batch(self._get_inputs(), workers=2,
+                                              is_ordered=False))
+        self.assertEqual([0, 1, 2], sorted(item[0] for item in unordered))
+        for index, results in unordered:
+            self.assertEqual(ordered[index], results)
+
+    def test_rapt_batch_in_memory(self):
+        expected = list(raptbatch.rapt_batch(self._get_inputs(), workers=1))
+        wav_data = buffer(open(self.wav_file.name, 'rb').read())
+        inputs = [(8000, self.audio[0].tostring()), wav_data,
+                  (8000, self.audio[2])]
+        self.assertEqual(expected, list(raptbatch.rapt_batch(inputs,
+                                                             workers=2)))
+
+    def test_rapt_batch_float_wav(self):
+        # wav contents sent to the workers as arrays keep the scale of
+        # their float format:
+        float_audio = self.audio[1].astype(numpy.float32) / 32768
+        wavfile.write(self.wav_file.name, 8000, float_audio)
+        wav_data = buffer(open(self.wav_file.name, 'rb').read())
+        inputs = [self.wav_file.name, wav_data, (8000, float_audio)]
+        tasks = raptbatch._get_batch_tasks(inputs)
+        self.assertEqual([32768, 32768, 1], [task[3] for task in tasks])
+        expected = pyrapt.rapt(self.wav_file.name)
+        self.assertEqual(125, expected[20])
+        results = list(raptbatch.rapt_batch(inputs, workers=2))
+        self.assertEqual([expected, expected], results[:2])
+        self.assertEqual(0.0, max(results[2]))
+        results = list(raptbatch.rapt_batch(inputs[2:], sample_scale=32768))
+        self.assertEqual([expected], results)
+
+    def test_rapt_batch_region(self):
+        results = list(raptbatch.rapt_batch([(8000, self.audio[1])],
+                                            start_time=0.5, end_time=1.0))
+        self.assertEqual(49, len(results[0]))
+        self.assertEqual(125, results[0][10])
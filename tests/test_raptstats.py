@@ -0,0 +1,82 @@
+"""
+Unit tests for the stage timings & work counters of rapt
+"""
+from unittest import TestCase
+
+from pyrapt import pyrapt
+from pyrapt import raptstats
+from tests import pulsetrain
+
+
+class TestRaptStats(TestCase):
+
+    def setUp(self):
+        # 200 Hz pulse train w/ a bit of noise, at 8 kHz:
+        self.audio = (8000, pulsetrain.get_pulse_train(seed=2))
+
+    def test_stats(self):
+        events = []
+        stats = raptstats.RaptStats(lambda *event: events.append(event))
+        stats.start('load')
+        stats.stop('load')
+        stats.start('load')
+        stats.stop('load')
+        stats.count('bytes_read', 10)
+        stats.count('bytes_read', 5)
+        self.assertEqual(['load'], stats.timings.keys())
+        self.assertEqual(15, stats.counters['bytes_read'])
+        self.assertEqual(['start', 'stop', 'start', 'stop', 'count', 'count'],
+                         [event[0] for event in events])
+        self.assertEqual(stats.timings['load'], events[1][2] + events[3][2])
+        self.assertEqual({'timings': {'load': stats.timings['load']},
+                          'counters': {'bytes_read': 15}}, stats.get_stats())
+
+    def test_rapt_stats(self):
+        stats = raptstats.RaptStats()
+        results = pyrapt.rapt(self.audio, stats=stats)
+        self.assertEqual(pyrapt.rapt(self.audio), results)
+        self.assertEqual(['load', 'setup', 'downsample', 'first_pass',
+                          'second_pass', 'dp'], stats.timings.keys())
+        counters = stats.counters
+        self.assertEqual(16000, counters['bytes_read'])
+        self.assertEqual(len(results), counters['second_pass_frames'])
+        for nccf_pass in ['first_pass', 'second_pass']:
+            self.assertLessEqual(counters[nccf_pass + '_candidates_kept'],
+                                 counters[nccf_pass + '_candidates_found'])
+            self.assertLessEqual(counters[nccf_pass + '_candidates_found'],
+                                 counters[nccf_pass + '_lags'])
+        # each frame's kept candidates plus the unvoiced one:
+        self.assertEqual(counters['second_pass_candidates_kept'] +
+                         len(results), counters['dp_states'])
+        self.assertGreater(counters['dp_transitions'], counters['dp_states'])
+
+    def test_rapt_stats_nccf_modes(self):
+        stats = raptstats.RaptStats()
+        pyrapt.rapt(self.audio, stats=stats)
+        workers_stats = raptstats.RaptStats()
+        pyrapt.rapt(self.audio, stats=workers_stats, workers=2)
+        self.assertEqual(stats.counters, workers_stats.counters)
+        threads_stats = raptstats.RaptStats()
+        pyrapt.rapt(self.audio, stats=threads_stats, threads=2)
+        self.assertEqual(stats.counters, threads_stats.counters)
+        self.assertIn('nccf', threads_stats.timings)
+        self.assertNotIn('first_pass', threads_stats.timings)
+
+    def test_rapt_sweep_stats(self):
+        stats = raptstats.RaptStats()
+        pyrapt.rapt(self.audio, stats=stats)
+        sweep_stats = raptstats.RaptStats()
+        pyrapt.rapt_sweep(self.audio, [{}, {'doubling_cost': 0.5},
+                                       {'voicing_bias': 0.1}],
+                          stats=sweep_stats)
+        self.assertEqual(3 * stats.counters['dp_transitions'],
+                         sweep_stats.counters['dp_transitions'])
+        self.assertEqual(stats.counters['second_pass_lags'],
+                         sweep_stats.counters['second_pass_lags'])
+
+    def test_run_with_stats(self):
+        results, stats = raptstats.run_with_stats(pyrapt.rapt, (self.audio,),
+                                                  {'doubling_cost': 0.5})
+        self.assertEqual(pyrapt.rapt(self.audio, doubling_cost=0.5), results)
+        self.assertEqual(16000, stats['counters']['bytes_read'])
+        self.assertIn('dp', stats['timings'])
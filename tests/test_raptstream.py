@@ -0,0 +1,138 @@
+"""
+Unit tests for the streaming RaptStream pitch tracker
+"""
+import os
+import tempfile
+from unittest import TestCase
+from mock import patch
+
+import numpy
+from scipy.io import wavfile
+
+from pyrapt import pyrapt
+from pyrapt import raptstream
+from tests import pulsetrain
+
+
+class TestRaptStream(TestCase):
+
+    def _get_test_audio(self):
+        # 200 Hz pulse train w/ a bit of noise, then silence, at 8 kHz:
+        audio = pulsetrain.get_pulse_train(seed=7)
+        audio[5000:] = 0
+        return audio
+
+    def test_stream_chunk_sizes(self):
+        audio = self._get_test_audio()
+        results = []
+        for chunk_size in [len(audio), 1000, 97]:
+            stream = raptstream.RaptStream(8000)
+            output = []
+            for i in xrange(0, len(audio), chunk_size):
+                output.extend(stream.process(audio[i:i + chunk_size]))
+            output.extend(stream.finish())
+            results.append(output)
+        self.assertEqual(99, len(results[0]))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(200, results[0][25])
+        self.assertEqual(0.0, results[0][80])
+
+    def test_stream_bounded_latency(self):
+        audio = self._get_test_audio()
+        stream = raptstream.RaptStream(8000, max_latency=0.1)
+        output_count = 0
+        for i in xrange(0, len(audio), 160):
+            output_count += len(stream.process(audio[i:i + 160]))
+            # never more than 10 frames behind the newest analyzed frame:
+            self.assertLessEqual(stream._next_frame - output_count, 10)
+            self.assertLessEqual(len(stream._history), 10)
+            # only the most recent audio is buffered:
+            self.assertLess(len(stream._audio), 1000)
+        self.assertEqual(99, output_count + len(stream.finish()))
+
+    def test_stream_one_pass(self):
+        audio = self._get_test_audio()
+        stream = raptstream.RaptStream(8000, is_two_pass_nccf=False)
+        output = stream.process(audio[:4000])
+        output.extend(stream.process(audio[4000:]))
+        output.extend(stream.finish())
+        self.assertEqual(99, len(output))
+        self.assertEqual(200, output[25])
+
+    def test_stream_sample_scale(self):
+        # float chunks in [-1, 1] track like 16 bit PCM w/ sample_scale:
+        audio = self._get_test_audio().astype(numpy.int16)
+        float_audio = audio.astype(numpy.float32) / 32768
+        stream = raptstream.RaptStream(8000)
+        expected = stream.process(audio) + stream.finish()
+        for chunk in [float_audio, numpy.column_stack((float_audio,
+                                                       float_audio))]:
+            stream = raptstream.RaptStream(8000, sample_scale=32768)
+            output = stream.process(chunk[:3000])
+            output.extend(stream.process(chunk[3000:]))
+            output.extend(stream.finish())
+            numpy.testing.assert_allclose(expected, output, rtol=1e-6)
+
+    def test_stream_finished(self):
+        stream = raptstream.RaptStream(8000)
+        self.assertEqual([], stream.finish())
+        self.assertEqual([], stream.finish())
+        with self.assertRaises(ValueError):
+            stream.process(numpy.zeros(10))
+
+    @patch('pyrapt.pyrapt._get_rms_ratio')
+    def test_viterbi_matches_full_dp(self, mock_rms_ratio):
+        mock_rms_ratio.return_value = 1.2
+        state = numpy.random.RandomState(3)
+        nccf_results = []
+        for i in xrange(0, 40):
+            lags = sorted(state.choice(range(20, 200), 3, replace=False))
+            nccf_results.append([(int(lag), state.uniform(0.3, 1.0))
+                                 for lag in lags])
+        stream = raptstream.RaptStream(4000, max_latency=None)
+        lags = []
+        for i, candidates in enumerate(nccf_results):
+            stream._add_frame(candidates, i, stream.params)
+            lags.extend(stream._commit_frames(False))
+        lags.extend(stream._commit_frames(True))
+        expected = pyrapt._determine_state_per_frame(nccf_results,
+                                                     stream.params, 4000)
+        self.assertEqual(expected, lags)
+
+    def test_rapt_blocks(self):
+        audio = numpy.tile(self._get_test_audio(), 3).astype(numpy.int16)
+        wav_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        wav_file.close()
+        try:
+            wavfile.write(wav_file.name, 8000,
+                          numpy.column_stack((audio, audio)))
+            results = list(raptstream.rapt_blocks(wav_file.name,
+                                                  block_duration=0.5))
+        finally:
+            os.remove(wav_file.name)
+        # one list per block plus the frames left at the end:
+        self.assertEqual(7, len(results))
+        stream = raptstream.RaptStream(8000, max_latency=None)
+        expected = stream.process(audio) + stream.finish()
+        self.assertEqual(299, len(expected))
+        self.assertEqual(expected, sum(results, []))
+        # most frames are decided w/ the block that completes them:
+        self.assertGreater(len(results[1]), 40)
+
+    def test_rapt_blocks_float_wav(self):
+        # blocks of a float wav are scaled the same way rapt scales it:
+        audio = numpy.tile(self._get_test_audio(), 3).astype(numpy.float32)
+        wav_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        wav_file.close()
+        try:
+            wavfile.write(wav_file.name, 8000, audio / 32768)
+            results = sum(raptstream.rapt_blocks(wav_file.name,
+                                                 block_duration=0.5,
+                                                 max_latency=None), [])
+            expected = pyrapt.rapt(wav_file.name)
+        finally:
+            os.remove(wav_file.name)
+        self.assertEqual(299, len(results))
+        self.assertGreater(sum(freq > 0.0 for freq in results), 100)
+        self.assertEqual(expected, results)
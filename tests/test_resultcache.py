@@ -0,0 +1,133 @@
+"""
+Unit tests for the RPC server's result cache
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from mock import patch
+
+from scipy.io import wavfile
+
+from server import resultcache
+from tests import pulsetrain
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.wav_path = os.path.join(self.temp_dir, 'a.wav')
+        wavfile.write(self.wav_path, 8000,
+                      pulsetrain.get_pulse_train(800, seed=1))
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _fake_rapt(self, wavfile_path, **kwargs):
+        self.calls.append((wavfile_path, kwargs))
+        return [100.0] * (len(self.calls) + 9)
+
+    def test_get_results(self):
+        cache = resultcache.ResultCache()
+        results = cache.get_results(self._fake_rapt, self.wav_path,
+                                    transition_cost=0.5)
+        self.assertEqual([100.0] * 10, results)
+        self.assertEqual(results, cache.get_results(self._fake_rapt,
+                                                    self.wav_path,
+                                                    transition_cost=0.5))
+        self.assertEqual(1, len(self.calls))
+        # results are copies, so callers can't change the cached ones:
+        results.append(0.0)
+        self.assertEqual(10, len(cache.get_results(self._fake_rapt,
+                                                   self.wav_path,
+                                                   transition_cost=0.5)))
+        # the same file contents under another name are a hit too, but the
+        # effective param set isn't the same here:
+        other_path = os.path.join(self.temp_dir, 'b.wav')
+        shutil.copy(self.wav_path, other_path)
+        cache.get_results(self._fake_rapt, other_path, transition_cost=0.5,
+                          workers=2)
+        cache.get_results(self._fake_rapt, other_path, transition_cost=0.6)
+        self.assertEqual(2, len(self.calls))
+        stats = cache.get_stats()
+        self.assertEqual(3, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(2, stats['entries'])
+
+    def test_default_params_in_key(self):
+        cache = resultcache.ResultCache()
+        self.assertEqual(
+            cache.get_key(self._fake_rapt, self.wav_path, {}),
+            cache.get_key(self._fake_rapt, self.wav_path,
+                          {'transition_cost': 0.005}))
+
+    def test_max_bytes(self):
+        cache = resultcache.ResultCache(max_bytes=200)
+        for cost in [0.1, 0.2, 0.3]:
+            cache.get_results(self._fake_rapt, self.wav_path,
+                              transition_cost=cost)
+        self.assertLessEqual(cache.get_stats()['bytes'], 200)
+        self.assertLess(cache.get_stats()['entries'], 3)
+        cache.get_results(self._fake_rapt, self.wav_path,
+                          transition_cost=0.3)
+        self.assertEqual(3, len(self.calls))
+
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        cache = resultcache.ResultCache(cache_dir=cache_dir)
+        results = cache.get_results(self._fake_rapt, self.wav_path)
+        # a new cache (e.g. after a restart) reads the results back:
+        cache = resultcache.ResultCache(cache_dir=cache_dir)
+        self.assertEqual(results, cache.get_results(self._fake_rapt,
+                                                    self.wav_path))
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(1, cache.get_stats()['disk_hits'])
+        self.assertEqual(1, cache.get_stats()['entries'])
+
+    def test_audio_in_memory(self):
+        cache = resultcache.ResultCache()
+        wav_data = open(self.wav_path, 'rb').read()
+        cache.get_results(self._fake_rapt, bytearray(wav_data))
+        cache.get_results(self._fake_rapt, buffer(wav_data))
+        self.assertEqual(1, len(self.calls))
+        audio = wavfile.read(self.wav_path)
+        cache.get_results(self._fake_rapt, audio)
+        cache.get_results(self._fake_rapt, (audio[0], audio[1].tostring()))
+        self.assertEqual(2, len(self.calls))
+        cache.get_results(self._fake_rapt, (16000, audio[1]))
+        self.assertEqual(3, len(self.calls))
+
+    def test_max_disk_bytes(self):
+        # results only kept on disk, room for 2 of them there:
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        cache = resultcache.ResultCache(max_bytes=0, cache_dir=cache_dir,
+                                        max_disk_bytes=230)
+        for cost in [0.1, 0.2, 0.1, 0.3]:
+            cache.get_results(self._fake_rapt, self.wav_path,
+                              transition_cost=cost)
+        self.assertEqual(3, len(self.calls))
+        # 0.2 was the least recently used when 0.3 was added:
+        self.assertEqual(2, cache.get_stats()['disk_entries'])
+        self.assertEqual(98 + 116, cache.get_stats()['disk_bytes'])
+        self.assertEqual(2, len(os.listdir(cache_dir)))
+        cache.get_results(self._fake_rapt, self.wav_path,
+                          transition_cost=0.1)
+        self.assertEqual(3, len(self.calls))
+        cache.get_results(self._fake_rapt, self.wav_path,
+                          transition_cost=0.2)
+        self.assertEqual(4, len(self.calls))
+        # a new cache picks up the files already there:
+        cache = resultcache.ResultCache(cache_dir=cache_dir,
+                                        max_disk_bytes=230)
+        self.assertEqual(2, cache.get_stats()['disk_entries'])
+        self.assertLessEqual(cache.get_stats()['disk_bytes'], 230)
+
+    def test_algorithm_hash_in_key(self):
+        # results of other versions of the pyrapt code aren't used:
+        cache = resultcache.ResultCache()
+        key = cache.get_key(self._fake_rapt, self.wav_path, {})
+        with patch('server.resultcache._ALGORITHM_HASH', 'other'):
+            self.assertNotEqual(key, cache.get_key(self._fake_rapt,
+                                                   self.wav_path, {}))
@@ -1,10 +1,15 @@
 """
 Unit tests for utility methods that read and process incoming audio data
 """
+import collections
+import io
+import struct
 from unittest import TestCase
 from mock import patch
 
 import numpy
+from scipy import signal
+from scipy.io import wavfile
 
 from pyrapt import pyrapt
 from pyrapt import raptparams
@@ -62,8 +67,9 @@ class TestUtilityMethods(TestCase):
         self.assertEqual(None, params.sample_rate_ratio)
         self.assertEqual(None, params.original_audio)
 
+    @patch('pyrapt.pyrapt._get_rms_ratios')
     @patch('numpy.hanning')
-    def test_calculate_params_all_params(self, mock_hanning):
+    def test_calculate_params_all_params(self, mock_hanning, mock_rms_ratios):
         params = raptparams.Raptparams()
         self.assertEqual(None, params.original_audio)
         self.assertEqual(None, params.samples_per_frame)
@@ -78,9 +84,12 @@ class TestUtilityMethods(TestCase):
         self.assertEqual(1323, params.hanning_window_length)
         self.assertEqual([1, 2, 3, 4, 5], params.hanning_window_vals)
         self.assertEqual(441, params.rms_offset)
+        mock_rms_ratios.assert_called_once_with(params, 15)
 
+    @patch('pyrapt.pyrapt._get_rms_ratios')
     @patch('numpy.hanning')
-    def test_calculate_params_firstpass_only(self, mock_hanning):
+    def test_calculate_params_firstpass_only(self, mock_hanning,
+                                             mock_rms_ratios):
         params = raptparams.Raptparams()
         params.is_two_pass_nccf = False
         params.frame_step_size = .008
@@ -96,6 +105,7 @@ class TestUtilityMethods(TestCase):
         self.assertEqual(1326, params.hanning_window_length)
         self.assertEqual([1, 2, 3, 4, 5], params.hanning_window_vals)
         self.assertEqual(530, params.rms_offset)
+        mock_rms_ratios.assert_called_once_with(params, 19)
 
     def test_non_dict_input_kwrags(self):
         not_a_dict = 'foo'
@@ -103,13 +113,23 @@ class TestUtilityMethods(TestCase):
         self.assertEqual(500, params.maximum_allowed_freq)
         self.assertEqual(0.01, params.frame_step_size)
 
+    def test_setup_params_dtype(self):
+        for dtype in ['float32', numpy.float64, numpy.dtype('<f4')]:
+            params = pyrapt._setup_rapt_params({'dtype': dtype})
+            self.assertEqual(dtype, params.dtype)
+        for dtype in ['float16', numpy.int16, 'int64', 'not a type']:
+            with self.assertRaises(ValueError):
+                pyrapt._setup_rapt_params({'dtype': dtype})
+        with self.assertRaises(ValueError):
+            pyrapt.rapt((8000, numpy.zeros(8000)), dtype='float16')
+
     def test_null_input_error(self):
         with self.assertRaises(IOError):
             pyrapt._get_audio_data('')
 
     @patch('scipy.io.wavfile.read')
     def test_read_data_simple(self, mock_wavfile_read):
-        mock_wavfile_read.return_value = 100, numpy.full(5, 1)
+        mock_wavfile_read.return_value = 100, numpy.full(5, 1, dtype=int)
         sample_rate, audio_sample = pyrapt._get_audio_data('test.wav')
         mock_wavfile_read.called_once_with('test.wav')
         self.assertEqual(100, sample_rate)
@@ -124,6 +144,150 @@ class TestUtilityMethods(TestCase):
         self.assertTrue(numpy.array_equal(numpy.array([0, 1, 4]), audio_sample))
         self.assertTrue(200, sample_rate)
 
+    @patch('pyrapt.pyrapt._AUDIO_BLOCK_SIZE', 2)
+    @patch('scipy.io.wavfile.read')
+    def test_read_data_mono_conversion_in_blocks(self, mock_wavfile_read):
+        mock_sample = numpy.array([[1, -1], [2, 1], [3, 5], [-2, -3],
+                                   [7, 8]])
+        mock_wavfile_read.return_value = 200, mock_sample
+        sample_rate, audio_sample = pyrapt._get_audio_data('test.wav')
+        mock_wavfile_read.assert_called_once_with('test.wav', mmap=True)
+        self.assertEqual([0, 1, 4, -2, 7], audio_sample.tolist())
+
+    @patch('scipy.io.wavfile.read')
+    def test_read_float_data(self, mock_wavfile_read):
+        # float samples in [-1, 1] are scaled to the 16 bit range, and stereo
+        # float samples keep their precision when mixed down:
+        mock_sample = numpy.array([[0.5, -0.25], [0.001, 0.002],
+                                   [-1.0, -1.0]], dtype=numpy.float32)
+        mock_wavfile_read.return_value = 200, mock_sample
+        audio_sample = pyrapt._get_audio_data('test.wav')[1]
+        self.assertEqual(numpy.float32, audio_sample.dtype)
+        numpy.testing.assert_allclose([4096.0, 49.152, -32768.0],
+                                      audio_sample, rtol=1e-6)
+        mock_wavfile_read.return_value = 200, mock_sample[:, 0]
+        audio_sample = pyrapt._get_audio_data('test.wav')[1]
+        numpy.testing.assert_allclose([16384.0, 32.768, -32768.0],
+                                      audio_sample, rtol=1e-6)
+        # the scale comes from the format, not the samples, so quiet &
+        # slightly clipped float samples are scaled the same way:
+        params = raptparams.Raptparams()
+        mock_wavfile_read.return_value = 200, mock_sample[:, 1] * 4.5
+        audio_sample = pyrapt._get_audio_data('test.wav', params)[1]
+        numpy.testing.assert_allclose([-36864.0, 294.912, -147456.0],
+                                      audio_sample, rtol=1e-6)
+        # an explicit scale takes precedence:
+        params.sample_scale = 2
+        audio_sample = pyrapt._get_audio_data('test.wav', params)[1]
+        numpy.testing.assert_allclose([-2.25, 0.018, -9.0], audio_sample,
+                                      rtol=1e-6)
+        # arrays are only scaled by an explicit scale:
+        audio = (200, mock_sample)
+        numpy.testing.assert_allclose([0.125, 0.0015, -1.0],
+                                      pyrapt._get_audio_data(audio)[1],
+                                      rtol=1e-6)
+        params.sample_scale = 32768
+        audio_sample = pyrapt._get_audio_data(audio, params)[1]
+        numpy.testing.assert_allclose([4096.0, 49.152, -32768.0],
+                                      audio_sample, rtol=1e-6)
+        audio = (200, numpy.array([1, -3], dtype=numpy.int16))
+        self.assertEqual([1, -3], pyrapt._get_audio_data(audio)[1].tolist())
+        params.sample_scale = 0.5
+        self.assertEqual([0.5, -1.5],
+                         pyrapt._get_audio_data(audio, params)[1].tolist())
+
+    @patch('scipy.io.wavfile.read')
+    def test_read_data_region(self, mock_wavfile_read):
+        mock_wavfile_read.return_value = 100, numpy.arange(1000)
+        params = raptparams.Raptparams()
+        params.start_time = 2.0
+        params.end_time = 4.0
+        sample_rate, audio_sample = pyrapt._get_audio_data('test.wav',
+                                                           params)
+        # 2 seconds of audio, plus the margin for the last frames' rms
+        # windows past the end of the region:
+        self.assertEqual(200, audio_sample[0])
+        self.assertEqual(205, len(audio_sample))
+        self.assertEqual(200, params.region_length)
+        # region runs past the end of the audio:
+        params.start_time = 9.5
+        params.end_time = 12.0
+        sample_rate, audio_sample = pyrapt._get_audio_data('test.wav',
+                                                           params)
+        self.assertEqual(range(950, 1000), audio_sample.tolist())
+        self.assertEqual(50, params.region_length)
+        # w/o a region the whole file is read:
+        params = raptparams.Raptparams()
+        sample_rate, audio_sample = pyrapt._get_audio_data('test.wav',
+                                                           params)
+        self.assertEqual(1000, len(audio_sample))
+        self.assertEqual(None, params.region_length)
+
+    def test_region_errors(self):
+        audio = (100, numpy.arange(1000))
+        params = raptparams.Raptparams()
+        for start_time, end_time in [(10.0, None), (12.0, 15.0),
+                                     (4.0, 4.0), (5.0, 2.0), (None, 0.0)]:
+            params.start_time = start_time
+            params.end_time = end_time
+            with self.assertRaises(ValueError):
+                pyrapt._get_audio_data(audio, params)
+        # an end_time past the end of the audio stops at its end:
+        params.start_time = 9.0
+        params.end_time = 60.0
+        self.assertEqual(range(900, 1000),
+                         pyrapt._get_audio_data(audio, params)[1].tolist())
+        self.assertEqual(100, params.region_length)
+
+    def test_read_wav_data(self):
+        audio = numpy.random.RandomState(3).randint(-999, 999, (300, 2))
+        for samples in [audio.astype(numpy.int16),
+                        audio[:, 0].astype(numpy.int16),
+                        audio.astype(numpy.float32) / 1000]:
+            wav_file = io.BytesIO()
+            wavfile.write(wav_file, 8000, samples)
+            wav_data = wav_file.getvalue()
+            for data in [bytearray(wav_data), buffer(wav_data),
+                         memoryview(wav_data)]:
+                sample_rate, audio_sample = pyrapt._read_audio(data)
+                self.assertEqual(8000, sample_rate)
+                self.assertEqual(samples.dtype, audio_sample.dtype)
+                self.assertTrue(numpy.array_equal(samples, audio_sample))
+            # samples are a view of the wav data, not a copy:
+            wav_data = bytearray(wav_data)
+            audio_sample = pyrapt._read_audio(wav_data)[1]
+            wav_data[-1] = 7
+            self.assertEqual(7, audio_sample.ravel().view(numpy.uint8)[-1])
+
+    def test_read_wav_data_errors(self):
+        with self.assertRaises(ValueError):
+            pyrapt._read_audio(bytearray('not a wav file' * 4))
+        # 24 bit PCM:
+        wav_data = ('RIFF' + struct.pack('<I', 42) + 'WAVEfmt ' +
+                    struct.pack('<IHHIIHH', 16, 1, 1, 8000, 24000, 3, 24) +
+                    'data' + struct.pack('<I', 6) + '\0' * 6)
+        with self.assertRaises(ValueError):
+            pyrapt._read_audio(buffer(wav_data))
+
+    def test_read_pcm_bytes(self):
+        samples = numpy.arange(-50, 50, dtype='<i2')
+        sample_rate, audio_sample = pyrapt._read_audio(
+            (16000, samples.tostring() + '\0'))
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual(range(-50, 50), audio_sample.tolist())
+        self.assertEqual(samples.tolist(), pyrapt._get_audio_data(
+            (16000, bytearray(samples.tostring())))[1].tolist())
+
+    def test_get_region_results(self):
+        params = raptparams.Raptparams()
+        params.samples_per_frame = 10
+        results = range(25)
+        self.assertEqual(results, pyrapt._get_region_results(results, params))
+        params.region_length = 200
+        self.assertEqual(range(19),
+                         pyrapt._get_region_results(results, params))
+        self.assertEqual(None, pyrapt._get_region_results(None, params))
+
     def test_basic_downsampling_calc(self):
         assert pyrapt._calculate_downsampling_rate(48000, 500) == 2000
 
@@ -147,3 +311,98 @@ class TestUtilityMethods(TestCase):
         input_array = numpy.array([1, 2, 3])
         with self.assertRaises(ValueError):
             pyrapt._downsample_audio((0, input_array), 10)
+
+    def test_decimate_audio(self):
+        audio = numpy.random.RandomState(0).randn(1000)
+        filter = pyrapt._get_lowpass_filter(7)
+        expected = signal.lfilter(filter, 1, audio)[::7]
+        decimated, history = pyrapt._decimate_audio(audio, filter, 7)
+        self.assertEqual(143, len(decimated))
+        self.assertTrue(numpy.allclose(expected, decimated))
+        self.assertTrue(numpy.array_equal(audio[-140:], history))
+
+    def test_decimate_audio_in_blocks(self):
+        audio = numpy.random.RandomState(1).randn(1000)
+        filter = pyrapt._get_lowpass_filter(7)
+        expected = pyrapt._decimate_audio(audio, filter, 7)[0]
+        results = []
+        history = None
+        for start, end in [(0, 3), (3, 50), (50, 51), (51, 600), (600, 1000)]:
+            decimated, history = pyrapt._decimate_audio(
+                audio[start:end], filter, 7, -start % 7, history)
+            results.append(decimated)
+        self.assertTrue(numpy.allclose(expected, numpy.concatenate(results)))
+
+    def test_filtered_downsampling_rate(self):
+        audio = (44100, numpy.ones(4410))
+        downsampled = pyrapt._get_downsampled_audio(audio, 500, True)
+        self.assertEqual(44100.0 / 22, downsampled[0])
+        self.assertEqual(201, len(downsampled[1]))
+
+    def test_filtered_downsampling_aliasing(self):
+        times = numpy.arange(44100) / 44100.0
+        # a 200 Hz tone is kept, lined up w/ the original samples:
+        tone = 1000.0 * numpy.sin(2 * numpy.pi * 200.0 * times)
+        downsampled = pyrapt._get_downsampled_audio((44100, tone), 500,
+                                                    True)[1]
+        self.assertTrue(numpy.allclose(tone[::22][20:-20],
+                                       downsampled[20:-20], atol=10.0))
+        # a tone above the decimated Nyquist frequency (~1002 Hz) is
+        # filtered out rather than aliased:
+        tone = 1000.0 * numpy.sin(2 * numpy.pi * 1500.0 * times)
+        downsampled = pyrapt._get_downsampled_audio((44100, tone), 500,
+                                                    True)[1]
+        self.assertLess(numpy.abs(downsampled[20:-20]).max(), 10.0)
+        self.assertEqual(441, len(pyrapt._get_lowpass_filter(22)))
+        self.assertEqual([1.0], pyrapt._get_lowpass_filter(1).tolist())
+
+    def test_get_rapt_plan(self):
+        params = raptparams.Raptparams()
+        with patch('pyrapt.pyrapt._plan_cache', collections.OrderedDict()):
+            plan = pyrapt._get_rapt_plan(44100, params)
+            self.assertEqual(441, plan.samples_per_frame)
+            self.assertEqual(1323, len(plan.hanning_window_vals))
+            self.assertEqual(44100.0 / 22, plan.downsample_rate)
+            self.assertEqual(22, plan.downsampling[1])
+            self.assertEqual(2, len(plan.nccf_params))
+            with self.assertRaises(ValueError):
+                plan.hanning_window_vals[0] = 1.0
+            # same rate & params reuse the plan, other values don't:
+            self.assertIs(plan, pyrapt._get_rapt_plan(44100, params))
+            params.minimum_allowed_freq = 60
+            self.assertIsNot(plan, pyrapt._get_rapt_plan(44100, params))
+            self.assertIsNot(plan, pyrapt._get_rapt_plan(16000,
+                             raptparams.Raptparams()))
+
+    def test_rapt_plan_cache_size(self):
+        params = raptparams.Raptparams()
+        with patch('pyrapt.pyrapt._plan_cache', collections.OrderedDict()):
+            with patch('pyrapt.pyrapt._PLAN_CACHE_SIZE', 2):
+                plan = pyrapt._get_rapt_plan(8000, params)
+                pyrapt._get_rapt_plan(16000, params)
+                self.assertIs(plan, pyrapt._get_rapt_plan(8000, params))
+                pyrapt._get_rapt_plan(22050, params)
+                # 16000 was least recently used, so it was dropped:
+                self.assertEqual([8000, 22050],
+                                 [key[0] for key in pyrapt._plan_cache])
+
+    def test_calculate_params_w_plan(self):
+        audio = (44100, numpy.ones(7000))
+        down_audio = (2004.5, numpy.ones(318))
+        expected = raptparams.Raptparams()
+        pyrapt._calculate_params(expected, audio, down_audio)
+        params = raptparams.Raptparams()
+        params.plan = pyrapt._get_rapt_plan(44100, params)
+        with patch('numpy.hanning') as mock_hanning:
+            pyrapt._calculate_params(params, audio, down_audio)
+            self.assertEqual(0, mock_hanning.call_count)
+        self.assertEqual(expected.samples_per_frame, params.samples_per_frame)
+        self.assertEqual(expected.rms_offset, params.rms_offset)
+        self.assertTrue(numpy.array_equal(expected.rms_ratios,
+                                          params.rms_ratios))
+        nccf_params = pyrapt._get_nccf_params(audio, params, False)
+        self.assertEqual(882, nccf_params.longest_lag_per_frame)
+        self.assertEqual(15, nccf_params.max_frame_count)
+        # the plan's own nccf params are left as they were:
+        self.assertEqual(None, params.plan.nccf_params[(44100, False)]
+                         .max_frame_count)
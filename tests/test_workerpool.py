@@ -0,0 +1,84 @@
+"""
+Unit tests for the RPC server's pool of analysis worker processes
+"""
+import threading
+import time
+from unittest import TestCase
+
+from pyrapt import pyrapt
+from server import workerpool
+
+
+class TestAnalysisPool(TestCase):
+
+    def setUp(self):
+        self.pool = workerpool.AnalysisPool(workers=1, queue_depth=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_run(self):
+        self.assertEqual(5, self.pool.run(max, (2, 5)))
+        self.assertEqual(2004, self.pool.run(
+            pyrapt._calculate_downsampling_rate, (44100,),
+            {'maximum_f0': 500}))
+        self.assertEqual(0, self.pool.get_stats()['pending'])
+
+    def test_run_error(self):
+        with self.assertRaises(ValueError):
+            self.pool.run(pyrapt._calculate_downsampling_rate, (500, 500))
+        self.assertEqual(0, self.pool.get_stats()['pending'])
+
+    def test_busy(self):
+        first = self.pool.submit(time.sleep, (0.3,))
+        second = self.pool.submit(time.sleep, (0.01,))
+        # one running & one queued fill up the pool:
+        with self.assertRaises(workerpool.ServerBusyError):
+            self.pool.submit(time.sleep, (0.01,))
+        self.assertEqual(2, self.pool.get_stats()['pending'])
+        self.pool.get_result(first)
+        self.pool.get_result(second)
+        self.assertEqual(5, self.pool.run(max, (2, 5)))
+
+    def test_timeout(self):
+        with self.assertRaises(workerpool.AnalysisTimeoutError):
+            self.pool.run(time.sleep, (0.3,), timeout=0.05)
+        # the analysis holds its place until it's done:
+        self.assertEqual(1, self.pool.get_stats()['pending'])
+        time.sleep(0.5)
+        self.assertEqual(0, self.pool.get_stats()['pending'])
+
+    def test_request_timeouts(self):
+        # queued requests each wait as long as their own timeout:
+        first = self.pool.submit(time.sleep, (0.2,))
+        second = self.pool.submit(max, (2, 5))
+        with self.assertRaises(workerpool.AnalysisTimeoutError):
+            self.pool.get_result(first, 0.05)
+        self.assertEqual(5, self.pool.get_result(second, 5.0))
+        self.assertEqual(0, self.pool.get_stats()['pending'])
+
+    def test_failed_tasks_free_their_place(self):
+        # results, errors & args that can't be pickled fail in the pool
+        # itself rather than in the analysis:
+        for _ in xrange(3):
+            for function, args in [(threading.Lock, ()),
+                                   (_raise_unpicklable_error, ()),
+                                   (max, (threading.Lock(), 1))]:
+                with self.assertRaises(Exception) as context:
+                    self.pool.run(function, args)
+                self.assertNotIsInstance(context.exception,
+                                         workerpool.ServerBusyError)
+        self.assertEqual(0, self.pool.get_stats()['pending'])
+        self.assertEqual(5, self.pool.run(max, (2, 5)))
+
+
+class _UnpicklableError(Exception):
+    def __init__(self):
+        Exception.__init__(self, threading.Lock())
+
+    def __reduce__(self):
+        raise TypeError('cannot pickle this error')
+
+
+def _raise_unpicklable_error():
+    raise _UnpicklableError()